@@ -0,0 +1,193 @@
+"""
+离线性能基准
+python TMP/cli.py bench [fetch|probe|pipeline|all] [--repeat N] [--seed S] [--channels N] [--latency 秒] [--bandwidth 字节/秒]
+                          [--no-etag] [--challenge]
+在本地假源（fake_fleet.py）上测量：
+- fetch：抓取吞吐，首轮完整下载，第二轮带 If-None-Match 的条件请求（304）；
+- probe：zubo 连接探测吞吐，并按端点类型核对判定（HTTP 流保留，裸TCP、黑洞、已关闭端口移除）；
+- pipeline：各任务端到端运行，脚本中的线上源地址改写到假源，在临时目录中运行，不影响仓库里的输出和缓存。
+内容由随机种子确定，每项重复 N 次取中位数；pipeline 同时核对各次输出是否一致。
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import os
+import statistics
+import tempfile
+import time
+
+import http_client
+from fake_fleet import FakeFleet, FleetConfig
+from host_timeouts import HostTimeouts, FETCH_LATENCY_FILE
+
+# 端到端基准的任务及其源类型（依赖 Selenium、cloudscraper 的任务未安装依赖时跳过）
+PIPELINE_TASKS = [
+    ("main", "txt"),
+    ("my1", "txt"),
+    ("rihou", "txt"),
+    ("zubo", "txt"),
+    ("hw", "txt"),
+    ("jqcy", "txt"),
+    ("m3utotxt", "m3u"),
+    ("jsontxt", "json"),
+    ("my2", "txt"),
+]
+
+# 抓取基准使用的源数量
+FETCH_SOURCES = 12
+
+
+@contextlib.contextmanager
+def _scratch_dir():
+    """在临时目录中运行，缓存、延迟样本和输出文件不落到仓库里"""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="bench-") as path:
+        os.makedirs(os.path.join(path, "TMP"))
+        os.chdir(path)
+        previous = http_client.use_host_timeouts(HostTimeouts(FETCH_LATENCY_FILE))
+        try:
+            yield path
+        finally:
+            http_client.use_host_timeouts(previous)
+            os.chdir(cwd)
+
+
+def _median(values):
+    return statistics.median(values) if values else 0.0
+
+
+def bench_fetch(fleet: FakeFleet, repeat: int):
+    urls = [fleet.source_url(kind, f"fetch-{i}") for i in range(FETCH_SOURCES) for kind in ("txt", "m3u", "json")]
+    cold, conditional = [], []
+    total_bytes = 0
+    not_modified = 0
+    with _scratch_dir():
+        for _ in range(repeat):
+            http_client.TRANSFER_STATS.clear()
+            start = time.perf_counter()
+            total_bytes = sum(len(http_client.fetch(url).content) for url in urls)
+            cold.append(time.perf_counter() - start)
+
+            etags = {url: http_client.TRANSFER_STATS[url]["etag"] for url in urls}
+            start = time.perf_counter()
+            not_modified = 0
+            for url in urls:
+                headers = {"If-None-Match": etags[url]} if etags[url] else {}
+                not_modified += http_client.fetch(url, headers=headers).status_code == 304
+            conditional.append(time.perf_counter() - start)
+
+    cold_s, conditional_s = _median(cold), _median(conditional)
+    print(f"fetch: {len(urls)} 个源，共 {total_bytes / 1e6:.2f} MB")
+    print(f"  完整下载  {cold_s * 1000:8.1f}ms  {len(urls) / cold_s:8.1f} 请求/s  {total_bytes / cold_s / 1e6:8.1f} MB/s")
+    print(f"  条件请求  {conditional_s * 1000:8.1f}ms  {len(urls) / conditional_s:8.1f} 请求/s  304 {not_modified}/{len(urls)}")
+    return {"cold": cold_s, "conditional": conditional_s, "bytes": total_bytes}
+
+
+def bench_probe(fleet: FakeFleet, repeat: int):
+    import zubo
+
+    text, _ = fleet.render("txt", "probe")
+    lines = [line for line in text.splitlines() if "#genre#" not in line]
+    expected = [line for line in lines if fleet.endpoint_kind(int(line.split(":")[2].split("/")[0])) == "http"]
+    endpoints = len({line.split("/")[2] for line in lines})
+    timings = []
+    mismatched = 0
+    with _scratch_dir(), contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            processor = zubo.TVSourceProcessor()
+            start = time.perf_counter()
+            result = processor.test_connections(lines)
+            timings.append(time.perf_counter() - start)
+            mismatched += result != expected
+
+    seconds = _median(timings)
+    print(f"probe: {len(lines)} 行，{endpoints} 个端点 {', '.join(f'{k} {len(v)}' for k, v in fleet.endpoints.items())}")
+    print(f"  {seconds * 1000:8.1f}ms  {len(lines) / seconds:8.1f} 行/s  保留 {len(expected)} 行，"
+          f"判定{'全部正确' if not mismatched else f'有 {mismatched} 次与预期不符'}")
+    return {"seconds": seconds, "mismatched": mismatched}
+
+
+def _outputs(path):
+    """临时目录中各输出文件的摘要和行数"""
+    outputs = {}
+    for root, dirs, files in os.walk(path):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in files:
+            if name.endswith(".txt"):
+                with open(os.path.join(root, name), 'rb') as f:
+                    data = f.read()
+                outputs[os.path.relpath(os.path.join(root, name), path)] = (hashlib.sha256(data).hexdigest(), data.count(b"\n") + 1)
+    return outputs
+
+
+def bench_pipeline(fleet: FakeFleet, repeat: int, tasks=None):
+    import cli
+
+    print(f"pipeline: {'任务':<10}{'耗时(ms)':>10}  输出")
+    results = {}
+    for task, kind in PIPELINE_TASKS:
+        if tasks and task not in tasks:
+            continue
+        timings = []
+        digests = set()
+        outputs = {}
+        error = None
+        for _ in range(repeat):
+            http_client.set_url_rewriter(fleet.rewriter(kind))
+            with _scratch_dir() as path, contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                try:
+                    cli.run(task, [])
+                except SystemExit as e:
+                    if e.code not in (0, None):
+                        error = f"退出码 {e.code}"
+                except ImportError as e:
+                    error = f"缺少依赖 {e.name}"
+                timings.append(time.perf_counter() - start)
+                outputs = _outputs(path)
+            http_client.set_url_rewriter(None)
+            if error:
+                break
+            digests.add(tuple(sorted(outputs.items())))
+        if error:
+            print(f"          {task:<10}{'-':>10}  跳过（{error}）")
+            continue
+        seconds = _median(timings)
+        summary = ", ".join(f"{name} {count}行" for name, (_, count) in sorted(outputs.items())) or "无"
+        stable = "" if len(digests) == 1 else f"（{len(digests)} 次输出不一致）"
+        print(f"          {task:<10}{seconds * 1000:>10.1f}  {summary}{stable}")
+        results[task] = {"seconds": seconds, "outputs": outputs, "stable": len(digests) == 1}
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="cli.py bench", description="在本地假源上运行性能基准")
+    parser.add_argument("suite", nargs="?", choices=["fetch", "probe", "pipeline", "all"], default="all")
+    parser.add_argument("tasks", nargs="*", help="pipeline 只运行这些任务")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--channels", type=int, default=2000, help="每个源的频道数")
+    parser.add_argument("--latency", type=float, default=0.0, help="源响应延迟（秒）")
+    parser.add_argument("--bandwidth", type=int, default=0, help="源带宽（字节/秒），0 不限速")
+    parser.add_argument("--no-etag", action="store_true", help="源不返回 ETag，条件请求全部完整下载")
+    parser.add_argument("--challenge", action="store_true", help="源返回 Cloudflare 挑战页")
+    parser.add_argument("--saturated", type=int, default=0, help="udpxy 状态页报告客户端已满的 HTTP 端点数")
+    args = parser.parse_args(argv)
+
+    config = FleetConfig(seed=args.seed, channels=args.channels, latency=args.latency, bandwidth=args.bandwidth,
+                         etag=not args.no_etag, challenge=args.challenge, saturated=args.saturated)
+    with FakeFleet(config) as fleet:
+        print(f"假源: {fleet.base_url}（种子 {args.seed}，每源 {args.channels} 个频道，"
+              f"延迟 {args.latency}s，带宽 {args.bandwidth or '不限'}）")
+        if args.suite in ("fetch", "all"):
+            bench_fetch(fleet, args.repeat)
+        if args.suite in ("probe", "all"):
+            bench_probe(fleet, args.repeat)
+        if args.suite in ("pipeline", "all"):
+            bench_pipeline(fleet, args.repeat, args.tasks)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+规范化输出顺序
+设置环境变量 CANONICAL_ORDER=1 后，各脚本在写出前把频道行排成与上游顺序、线程完成顺序无关的规范顺序：
+分组按首次出现的顺序，分组内按规范化的频道名（NFKC、忽略大小写和空白、数字按数值比较，
+CCTV2 排在 CCTV10 之前），同名频道按各脚本提供的排序值（如实测分辨率、代理空闲度，越小越靠前），
+最后以 URL 和整行兜底，顺序完全确定。
+上游只是调整了行的先后时输出字节不变，提交的 .txt 的 diff 只反映频道的实际增删改。
+"""
+
+import os
+import re
+import unicodedata
+
+DIGITS = re.compile(r'(\d+)')
+
+WHITESPACE = re.compile(r'\s+')
+
+
+def enabled():
+    return os.environ.get("CANONICAL_ORDER", "").lower() in ("1", "true", "yes")
+
+
+def name_key(name: str):
+    """频道名的排序键：规范化后切成 (文本, 数值) 段，数值段按数值比较"""
+    text = WHITESPACE.sub("", unicodedata.normalize("NFKC", name).casefold())
+    parts = DIGITS.split(text)
+    # split 的结果文本段与数字段交替，首尾总是文本段
+    return tuple((parts[i], int(parts[i + 1]) if i + 1 < len(parts) else -1) for i in range(0, len(parts), 2))
+
+
+def line_key(line: str, rank=None):
+    name, _, url = line.partition(",")
+    return (name_key(name), rank(line) if rank is not None else 0, url.strip(), line)
+
+
+def sort_lines(lines, rank=None):
+    return sorted(lines, key=lambda line: line_key(line, rank))
+
+
+def canonical_lines(lines, rank=None, group_of=None):
+    """
+    把行排成规范顺序
+
+    Args:
+        lines: 输出行，可以带 "分组,#genre#" 行（同名分组合并到首次出现的位置）
+        rank: 可选，line -> 排序值，同名频道按其升序排列
+        group_of: 可选，line -> 分组名，用于不带 #genre# 行的平铺输出（输出仍为平铺）
+
+    Returns:
+        排序后的行列表
+    """
+    sections = {}
+    order = []
+    current = None
+    for line in lines:
+        if "#genre#" in line:
+            current = line.split(",", 1)[0].strip()
+            if current not in sections:
+                sections[current] = (line, [])
+                order.append(current)
+            continue
+        group = group_of(line) if group_of is not None else current
+        if group not in sections:
+            sections[group] = (None, [])
+            order.append(group)
+        sections[group][1].append(line)
+
+    result = []
+    # 出现在任何 #genre# 行之前的行保持在最前面
+    if None in sections:
+        order.remove(None)
+        order.insert(0, None)
+    for group in order:
+        header, members = sections[group]
+        if header is not None and group_of is None:
+            result.append(header)
+        result.extend(sort_lines(members, rank))
+    return result
+
+
+def canonical_order(lines, rank=None, group_of=None):
+    """启用规范顺序时返回排序后的行，否则原样返回"""
+    if not enabled():
+        return lines
+    return canonical_lines(lines, rank, group_of)
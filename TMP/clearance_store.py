@@ -0,0 +1,102 @@
+"""
+Cloudflare 通行凭证持久化
+按主机保存 cloudscraper 通过挑战后得到的 cookie（含 cf_clearance）及对应的 User-Agent
+（cf_clearance 与 UA 绑定），跨URL、跨运行复用直到过期。
+只有在已保存的 cookie 被拒绝时才需要重新求解挑战。
+"""
+
+import json
+import os
+import time
+
+# 凭证持久化文件
+CLEARANCE_FILE = os.path.join(".cache", "cf_clearance.json")
+
+# cookie 未声明过期时间时的默认有效期（秒）
+DEFAULT_TTL = 6 * 3600
+
+
+def _host_matches(cookie_domain: str, host: str):
+    domain = (cookie_domain or "").lstrip(".").lower()
+    return not domain or host == domain or host.endswith("." + domain)
+
+
+class ClearanceStore:
+    def __init__(self, path: str = CLEARANCE_FILE):
+        self.path = path
+        self.entries = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        """原子写入，先丢弃已过期的条目"""
+        now = time.time()
+        self.entries = {host: e for host, e in self.entries.items() if e.get("expires", 0) > now}
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"  凭证保存失败: {e}")
+
+    def get(self, host: str):
+        """返回未过期的凭证，没有则返回 None"""
+        entry = self.entries.get(host.lower())
+        if entry and entry.get("expires", 0) > time.time():
+            return entry
+        return None
+
+    def apply(self, session, host: str):
+        """把已保存的 cookie 和 UA 装入会话，成功返回 True"""
+        entry = self.get(host)
+        if entry is None:
+            return False
+        for cookie in entry["cookies"]:
+            session.cookies.set(
+                cookie["name"], cookie["value"],
+                domain=cookie.get("domain", ""), path=cookie.get("path", "/"),
+                expires=cookie.get("expires"), secure=cookie.get("secure", False),
+            )
+        if entry.get("user_agent"):
+            session.headers['User-Agent'] = entry["user_agent"]
+        return True
+
+    def update(self, session, host: str):
+        """保存会话中属于该主机的 cookie"""
+        host = host.lower()
+        cookies = []
+        expiries = []
+        clearance_expiry = None
+        for cookie in session.cookies:
+            if not _host_matches(cookie.domain, host):
+                continue
+            cookies.append({
+                "name": cookie.name,
+                "value": cookie.value,
+                "domain": cookie.domain,
+                "path": cookie.path,
+                "expires": cookie.expires,
+                "secure": bool(cookie.secure),
+            })
+            if cookie.expires:
+                expiries.append(cookie.expires)
+                if cookie.name == "cf_clearance":
+                    clearance_expiry = cookie.expires
+        if not cookies:
+            return
+        self.entries[host] = {
+            "cookies": cookies,
+            "user_agent": session.headers.get('User-Agent'),
+            "expires": clearance_expiry or (min(expiries) if expiries else time.time() + DEFAULT_TTL),
+        }
+
+    def invalidate(self, host: str):
+        self.entries.pop(host.lower(), None)
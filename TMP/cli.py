@@ -0,0 +1,194 @@
+"""
+统一命令行入口
+    python TMP/cli.py <任务> [参数...]      运行一个任务（参数原样传给该任务）
+    python TMP/cli.py --profile <任务> ...  运行并分阶段剖析，结果写到 profile/<任务>/（见 profiling.py）
+    python TMP/cli.py startup [任务...]     用 -X importtime 测量各任务的冷启动导入耗时
+    python TMP/cli.py daemon [--once] [--serve] [任务...]  常驻模式，按源的变化频率调度各任务（见 daemon.py）
+    python TMP/cli.py serve [--port 端口] [--bind 地址]    在内存中提供输出文件（见 playlist_server.py）
+    python TMP/cli.py bench [fetch|probe|pipeline|all] [--repeat N] ...  在本地假源上运行性能基准（见 bench.py）
+每个子命令只导入对应的脚本；Selenium、cloudscraper、requests 等重依赖由脚本在首次使用时导入，
+不需要它们的任务不承担其导入开销。
+"""
+
+import argparse
+import contextlib
+import importlib
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+
+TMP_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(TMP_DIR)
+
+# 任务名 -> (模块, 入口函数, 说明)
+COMMANDS = {
+    "main": ("main", "main", "smt 源 → smt.txt"),
+    "my1": ("my1", "main", "hacktool 源 → my1.txt"),
+    "rihou": ("rihou", "main", "rihou 源 → rihou.txt"),
+    "zubo": ("zubo", "main", "组播源连通性检测 → zubo.txt"),
+    "ttest": ("ttest", "main", "Selenium 抓取 → ttest.txt"),
+    "hw": ("hw", "main", "分段过滤 → TMP/s.txt"),
+    "m3utotxt": ("m3utotxt", "main", "M3U 转 TXT → TMP/temp.txt"),
+    "jsontxt": ("jsontxt", "main", "JSON 源解析 → TMP/jsontxt.txt"),
+    "my2": ("my2", "main", "Cloudflare 保护源 → my3.txt"),
+    "jqcy": ("jqcy", "fetch_and_save", "jqcy 源 → jqcy.txt"),
+}
+
+# 启动测量时检查是否被提前导入的重依赖
+HEAVY_MODULES = ("selenium", "cloudscraper", "requests", "multiprocessing", "asyncio")
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)')
+
+
+def _setup_path():
+    for path in (ROOT_DIR, TMP_DIR):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+
+@contextlib.contextmanager
+def _replay_workdir(command: str):
+    """回放快照时在 snapshots/replay/<任务>/ 中运行，输出文件和 .cache 状态不落到仓库里"""
+    import http_client
+    import snapshots
+    from host_timeouts import FETCH_LATENCY_FILE, HostTimeouts
+    from url_index import OUTPUT_PRIORITY
+
+    cwd = os.getcwd()
+    path = os.path.join(snapshots.REPLAY_DIR, command)
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(os.path.join(path, "TMP"))
+    # 已提交的输出参与跨输出去重，复制进来使回放的结果与真实运行一致
+    for name in OUTPUT_PRIORITY:
+        if os.path.exists(os.path.join(ROOT_DIR, name)):
+            shutil.copyfile(os.path.join(ROOT_DIR, name), os.path.join(path, name))
+    print(f"回放: 输出和状态写到 {path}")
+    os.chdir(path)
+    previous = http_client.use_host_timeouts(HostTimeouts(FETCH_LATENCY_FILE))
+    try:
+        yield path
+    finally:
+        http_client.use_host_timeouts(previous)
+        os.chdir(cwd)
+
+
+def run(command: str, args: list):
+    """导入任务模块并调用其入口，sys.argv 只保留该任务自己的参数"""
+    module_name, entry, _ = COMMANDS[command]
+    _setup_path()
+    sys.argv = [f"{os.path.basename(__file__)} {command}"] + args
+    module = importlib.import_module(module_name)
+    import profiling
+    import snapshots
+    workdir = _replay_workdir(command) if snapshots.replaying() else contextlib.nullcontext()
+    profiling.start(command)
+    try:
+        with workdir:
+            return getattr(module, entry)()
+    finally:
+        profiling.finish()
+        snapshots.finish()
+
+
+def measure_startup(command: str):
+    """在新进程中以 -X importtime 导入任务模块，返回 (总耗时毫秒, 导入耗时毫秒, 最重的导入, 已导入的重依赖)"""
+    module_name = COMMANDS[command][0]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([TMP_DIR, ROOT_DIR]))
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+        cwd=ROOT_DIR, env=env, capture_output=True, text=True,
+    )
+    wall = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "导入失败")
+
+    total = 0
+    pending = []
+    imported = set()
+    for line in proc.stderr.splitlines():
+        m = IMPORTTIME_LINE.match(line)
+        if not m:
+            continue
+        cumulative, depth, name = int(m.group(2)), len(m.group(3)), m.group(4)
+        imported.add(name.split(".")[0])
+        if depth == 1:
+            # importtime 按后序输出（依赖先于模块本身），每层缩进两个空格
+            if name == module_name:
+                total = cumulative
+                break
+            pending = []
+        elif depth == 3:
+            pending.append((cumulative, name))
+    children = sorted(pending, reverse=True)
+    heavy = [name for name in HEAVY_MODULES if name in imported]
+    return wall, total / 1000, children[:3], heavy
+
+
+def startup(commands: list):
+    print(f"{'任务':<10}{'进程(ms)':>10}{'导入(ms)':>10}  最重的直接依赖 / 启动时已导入的重依赖")
+    for command in commands or COMMANDS:
+        try:
+            wall, total, children, heavy = measure_startup(command)
+        except RuntimeError as e:
+            print(f"{command:<10}{'-':>10}{'-':>10}  {e}")
+            continue
+        top = ", ".join(f"{name} {cumulative / 1000:.1f}" for cumulative, name in children)
+        print(f"{command:<10}{wall:>10.1f}{total:>10.1f}  {top} / {', '.join(heavy) or '无'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="直播源任务统一入口",
+        epilog="\n".join(f"  {name:<10}{desc}" for name, (_, _, desc) in COMMANDS.items()),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("command", choices=list(COMMANDS) + ["startup", "daemon", "serve", "bench"],
+                        help="任务名，startup 测量冷启动，daemon 常驻调度，serve 播放列表服务，bench 离线性能基准")
+    parser.add_argument("--profile", action="store_true", help="分阶段剖析（cProfile + 调用栈采样），等同于 PROFILE=1")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="传给任务的参数（startup/daemon 时为任务列表）")
+    args = parser.parse_args()
+    if args.command in COMMANDS and "--profile" in args.args:
+        args.args.remove("--profile")
+        args.profile = True
+    if args.profile:
+        os.environ.setdefault("PROFILE", "1")
+
+    if args.command == "serve":
+        _setup_path()
+        import playlist_server
+        serve_parser = argparse.ArgumentParser(prog=f"{os.path.basename(__file__)} serve")
+        serve_parser.add_argument("--port", type=int, default=playlist_server.DEFAULT_PORT)
+        serve_parser.add_argument("--bind", default=playlist_server.DEFAULT_BIND)
+        serve_args = serve_parser.parse_args(args.args)
+        playlist_server.serve_forever(ROOT_DIR, serve_args.bind, serve_args.port)
+        return
+
+    if args.command == "bench":
+        _setup_path()
+        import bench
+        bench.main(args.args)
+        return
+
+    if args.command in ("startup", "daemon"):
+        once = "--once" in args.args
+        serve = "--serve" in args.args
+        names = [name for name in args.args if name not in ("--once", "--serve")]
+        unknown = [name for name in names if name not in COMMANDS]
+        if unknown:
+            parser.error(f"未知任务: {', '.join(unknown)}")
+        if args.command == "startup":
+            startup(names)
+        else:
+            _setup_path()
+            import daemon
+            daemon.run_forever(names or list(COMMANDS), once=once, serve=serve)
+        return
+    run(args.command, args.args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+列式批量过滤
+与 line_filter.filter_chunk（即 remove_excluded_sections + remove_genre_lines_and_deduplicate）等价的
+列式实现：全部行装入一个 Arrow 字符串数组，genre 行识别、分区排除关键词、内容关键词、空行判断、
+URL 提取都用向量化内核一次处理整列，分区排除状态用累加和向前填充，
+URL 去重用字典编码（编码按首次出现的顺序分配）取每个编码的首个位置，不再逐行执行 Python 代码。
+主机黑名单只对去重后的不同 authority 各判断一次。
+没有安装 pyarrow 时退回 NumPy 字符串内核做关键词和空行判断，URL 提取与去重仍逐行进行。
+
+与逐行实现保持一致的细节：
+- 空行按 Python str.strip() 的空白字符集合判断，正则中的 \\s 也展开为同一集合；
+- 内容关键词匹配前的小写转换：Arrow 使用简单大小写映射，与 str.lower() 只在含 İ（U+0130）
+  或 Σ（U+03A3，词尾变为 ς）的行上可能不同，这些行改用 str.lower() 逐行判断。
+"""
+
+import re
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = pc = None
+
+# Python str.strip() / 正则 \s 视为空白的全部字符（即 str.isspace() 为真的字符）
+PY_WHITESPACE = "\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f \x85\xa0\u1680\u2000\u2001\u2002\u2003\u2004\u2005\u2006\u2007\u2008\u2009\u200a\u2028\u2029\u202f\u205f\u3000"
+
+# 小写转换可能与 str.lower() 不同的字符
+SPECIAL_LOWER = ("İ", "Σ")
+
+_WS_CLASS = "".join(f"\\x{{{ord(c):x}}}" for c in PY_WHITESPACE)
+
+# 与 line_filter.URL_PATTERN、host_blocklist.AUTHORITY_PATTERN 等价的 RE2 写法
+URL_PATTERN = f"(?P<url>https?://[^,{_WS_CLASS}]+)"
+AUTHORITY_PATTERN = f"://(?P<authority>[^/,?#{_WS_CLASS}]*)"
+
+PY_URL_PATTERN = re.compile(r'(https?://[^\s,]+)')
+
+
+def available():
+    """列式过滤需要 NumPy，pyarrow 可选"""
+    return np is not None
+
+
+def _any_substring(array, keywords):
+    """任一关键词是 array 元素的子串（向量化），返回 NumPy 布尔数组；多个关键词合并为一次扫描"""
+    keywords = list(keywords)
+    if not keywords:
+        return np.zeros(len(array), dtype=bool)
+    if len(keywords) == 1:
+        mask = pc.match_substring(array, keywords[0])
+    else:
+        mask = pc.match_substring_regex(array, "|".join(re.escape(keyword) for keyword in keywords))
+    return mask.to_numpy(zero_copy_only=False)
+
+
+def _section_excluded(is_genre, genre_excluded, excluded: bool):
+    """每行所在分区是否被排除：分区编号为 genre 行的累加和，首个 genre 行之前沿用传入的状态"""
+    section = np.cumsum(is_genre)
+    states = np.empty(int(is_genre.sum()) + 1, dtype=bool)
+    states[0] = excluded
+    states[1:] = genre_excluded[is_genre]
+    return states[section]
+
+
+def _blank(array):
+    return pc.equal(pc.utf8_length(pc.utf8_trim(array, PY_WHITESPACE)), 0).to_numpy(zero_copy_only=False)
+
+
+def _content_filtered(array, lines, rows, content_keywords):
+    """rows 行中命中内容关键词（忽略大小写）的行"""
+    subset = array.take(pa.array(rows))
+    lowered = pc.utf8_lower(subset)
+    mask = _any_substring(lowered, content_keywords)
+    special = _any_substring(subset, SPECIAL_LOWER)
+    for position in np.flatnonzero(special):
+        line_lower = lines[rows[position]].lower()
+        mask[position] = any(keyword in line_lower for keyword in content_keywords)
+    return mask
+
+
+def _blocked(array, rows, blocklist):
+    """rows 行中第一个URL的主机被屏蔽的行，每个不同的 authority 只判断一次"""
+    if not blocklist.trie and not blocklist.networks:
+        return np.zeros(len(rows), dtype=bool)
+    authorities = pc.struct_field(pc.extract_regex(array.take(pa.array(rows)), AUTHORITY_PATTERN), "authority")
+    encoded = pc.dictionary_encode(authorities)
+    verdicts = np.array([blocklist.blocks_line("://" + authority) for authority in encoded.dictionary.to_pylist()]
+                        + [False], dtype=bool)
+    codes = encoded.indices.fill_null(len(encoded.dictionary)).to_numpy(zero_copy_only=False)
+    return verdicts[codes]
+
+
+def _first_urls(array, rows):
+    """rows 行中保留的位置：没有URL的行全部保留，有URL的行保留每个URL首次出现的一行"""
+    urls = pc.struct_field(pc.extract_regex(array.take(pa.array(rows)), URL_PATTERN), "url")
+    encoded = pc.dictionary_encode(urls)
+    codes = encoded.indices.fill_null(-1).to_numpy(zero_copy_only=False)
+    has_url = encoded.indices.is_valid().to_numpy(zero_copy_only=False)
+    keep = ~has_url
+    _, first = np.unique(codes[has_url], return_index=True)
+    keep[np.flatnonzero(has_url)[first]] = True
+    return keep
+
+
+def filter_lines(lines, exclude_keywords, content_keywords, excluded: bool = False, blocklist=None):
+    """
+    列式过滤，结果与 filter_chunk 一致
+
+    Args:
+        lines: 行列表
+        exclude_keywords: 分区排除关键词
+        content_keywords: 内容过滤关键词（需已转小写）
+        excluded: 开始时是否处于被排除的分区
+        blocklist: HostBlocklist，URL主机被屏蔽的行计入内容过滤
+
+    Returns:
+        (result, kept, filtered_count)：去重后的行、分区排除后保留的行数、被内容关键词或主机黑名单过滤的行数
+    """
+    if pa is None:
+        return _filter_lines_numpy(lines, exclude_keywords, content_keywords, excluded, blocklist)
+    if not lines:
+        return [], 0, 0
+    array = pa.array(lines, type=pa.large_string())
+    is_genre = pc.match_substring(array, "#genre#").to_numpy(zero_copy_only=False)
+    genre_excluded = np.zeros(len(lines), dtype=bool)
+    genre_rows = np.flatnonzero(is_genre)
+    if len(genre_rows) and exclude_keywords:
+        genre_excluded[genre_rows] = _any_substring(array.take(pa.array(genre_rows)), exclude_keywords)
+    row_excluded = _section_excluded(is_genre, genre_excluded, excluded)
+    kept = int((~row_excluded).sum())
+
+    candidates = ~is_genre & ~row_excluded & ~_blank(array)
+    rows = np.flatnonzero(candidates)
+    filtered = np.zeros(len(rows), dtype=bool)
+    if content_keywords and len(rows):
+        filtered |= _content_filtered(array, lines, rows, content_keywords)
+    if blocklist is not None and len(rows):
+        filtered[~filtered] = _blocked(array, rows[~filtered], blocklist)
+    rows = rows[~filtered]
+    if len(rows):
+        rows = rows[_first_urls(array, rows)]
+    return [lines[i] for i in rows], kept, int(filtered.sum())
+
+
+def _filter_lines_numpy(lines, exclude_keywords, content_keywords, excluded, blocklist):
+    """没有 pyarrow 时：关键词、空行用 NumPy 字符串内核，URL 提取与去重逐行进行"""
+    if not lines:
+        return [], 0, 0
+    array = np.array(lines, dtype=np.dtypes.StringDType())
+    is_genre = np.strings.find(array, "#genre#") >= 0
+    genre_excluded = np.zeros(len(lines), dtype=bool)
+    for keyword in exclude_keywords:
+        genre_excluded |= is_genre & (np.strings.find(array, keyword) >= 0)
+    row_excluded = _section_excluded(is_genre, genre_excluded, excluded)
+    kept = int((~row_excluded).sum())
+
+    candidates = ~is_genre & ~row_excluded & (np.strings.str_len(np.strings.strip(array)) > 0)
+    filtered = np.zeros(len(lines), dtype=bool)
+    if content_keywords:
+        # np.strings.lower 按字符映射，特殊字符所在的行同样逐行判断
+        lowered = np.strings.lower(array)
+        for keyword in content_keywords:
+            filtered |= candidates & (np.strings.find(lowered, keyword) >= 0)
+        special = np.zeros(len(lines), dtype=bool)
+        for char in SPECIAL_LOWER:
+            special |= candidates & (np.strings.find(array, char) >= 0)
+        for i in np.flatnonzero(special):
+            line_lower = lines[i].lower()
+            filtered[i] = any(keyword in line_lower for keyword in content_keywords)
+
+    result = []
+    seen_urls = set()
+    filtered_count = int(filtered.sum())
+    for i in np.flatnonzero(candidates & ~filtered):
+        line = lines[i]
+        if blocklist is not None and blocklist.blocks_line(line):
+            filtered_count += 1
+            continue
+        m = PY_URL_PATTERN.search(line)
+        if m:
+            if m.group(1) in seen_urls:
+                continue
+            seen_urls.add(m.group(1))
+        result.append(line)
+    return result, kept, filtered_count
@@ -0,0 +1,125 @@
+"""
+自适应并发控制（AIMD）
+连接探测的在途上限在运行时调整：每完成一个窗口的探测，若超时比例明显高于此前观察到的基线
+（说明并发过高导致自身拥塞），上限减半；否则加性增长。出现本机资源错误（文件描述符、
+临时端口耗尽等）时立即减半，并且这些目标会重新排队，不会被误判为不可用。
+上限的天花板由本机文件描述符余量和临时端口范围决定。
+"""
+
+import errno
+import os
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# 并发下限
+MIN_LIMIT = 4
+
+# 并发硬上限（探测基于线程）
+HARD_MAX_LIMIT = 512
+
+# 每个调整窗口包含的完成数
+WINDOW = 32
+
+# 每个窗口的加性增长量
+ADDITIVE_STEP = 8
+
+# 乘性减小系数
+DECREASE_FACTOR = 0.5
+
+# 超时比例高出基线多少时视为拥塞
+TIMEOUT_TOLERANCE = 0.15
+
+# 为其它用途保留的文件描述符数
+FD_RESERVE = 64
+
+# 表示本机资源不足的错误码
+LOCAL_ERRNOS = {
+    errno.EMFILE, errno.ENFILE, errno.EADDRNOTAVAIL, errno.ENOBUFS, errno.ENOMEM,
+}
+
+# 表示连接超时的错误码
+TIMEOUT_ERRNOS = {errno.ETIMEDOUT, errno.EAGAIN, errno.EWOULDBLOCK, errno.EINPROGRESS}
+
+
+def fd_headroom():
+    """还能打开的文件描述符数"""
+    if resource is None:
+        return HARD_MAX_LIMIT
+    try:
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft == resource.RLIM_INFINITY:
+            return HARD_MAX_LIMIT
+        try:
+            used = len(os.listdir("/proc/self/fd"))
+        except OSError:
+            used = 32
+        return max(MIN_LIMIT, soft - used - FD_RESERVE)
+    except (OSError, ValueError):
+        return HARD_MAX_LIMIT
+
+
+def ephemeral_port_headroom():
+    """临时端口范围的四分之一（关闭的连接会在 TIME_WAIT 中占用端口）"""
+    try:
+        with open("/proc/sys/net/ipv4/ip_local_port_range", 'r') as f:
+            low, high = map(int, f.read().split())
+        return max(MIN_LIMIT, (high - low) // 4)
+    except (OSError, ValueError):
+        return HARD_MAX_LIMIT
+
+
+def classify_errno(code: int):
+    """把 connect_ex 的返回码归类为 ok / timeout / local / fail"""
+    if code == 0:
+        return "ok"
+    if code in TIMEOUT_ERRNOS:
+        return "timeout"
+    if code in LOCAL_ERRNOS:
+        return "local"
+    return "fail"
+
+
+class AIMDLimiter:
+    def __init__(self, initial: int, minimum: int = MIN_LIMIT, maximum: int = None, reserve: int = 0):
+        """reserve: 同时进行、不受本控制器调度的其它连接数（如路径检查），从本机资源决定的天花板中扣除"""
+        if maximum is None:
+            maximum = min(HARD_MAX_LIMIT, fd_headroom(), ephemeral_port_headroom()) - reserve
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.limit = max(self.minimum, min(initial, self.maximum))
+        self.peak = self.limit
+        self.baseline = None
+        self._window_done = 0
+        self._window_timeouts = 0
+
+    def _decrease(self):
+        self.limit = max(self.minimum, int(self.limit * DECREASE_FACTOR))
+        self._window_done = 0
+        self._window_timeouts = 0
+
+    def on_result(self, outcome: str):
+        """记录一个探测结果并按需调整上限"""
+        if outcome == "local":
+            self._decrease()
+            return
+        self._window_done += 1
+        if outcome == "timeout":
+            self._window_timeouts += 1
+        if self._window_done < WINDOW:
+            return
+
+        rate = self._window_timeouts / self._window_done
+        self._window_done = 0
+        self._window_timeouts = 0
+        if self.baseline is None:
+            self.baseline = rate
+        if rate > self.baseline + TIMEOUT_TOLERANCE:
+            self._decrease()
+        else:
+            # 基线取较低的超时比例，并缓慢跟随目标集合本身的变化
+            self.baseline = min(rate, self.baseline * 0.9 + rate * 0.1)
+            self.limit = min(self.maximum, self.limit + ADDITIVE_STEP)
+            self.peak = max(self.peak, self.limit)
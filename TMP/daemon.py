@@ -0,0 +1,243 @@
+"""
+常驻调度模式
+python TMP/cli.py daemon [任务...] 在一个长期运行的进程中反复执行各任务：
+HTTP 会话与连接池、延迟样本、Cloudflare 会话、组播端点判定等都留在进程内，不再每次冷启动。
+每个源按观察到的变化频率安排检查：检查时带上 ETag/Last-Modified 发起条件请求，内容未变
+（304 或摘要相同）则检查间隔拉长，变化则缩短；只有某个源发生变化，或距上次运行达到任务的
+最长刷新间隔时才重跑任务。检查时下载到的新内容直接交给随后的任务运行，不重复下载；
+经 cloudscraper 抓取的任务不检查源（普通会话会被 Cloudflare 挑战拦截），只按最长刷新间隔重跑。组播端点按存活状态的波动性复用判定（见 liveness.py），
+输出文件只在内容变化时重写（write_if_changed）。
+加 --serve 时同时启动播放列表服务，每轮任务完成后立即发布新内容。
+"""
+
+import json
+import os
+import time
+import traceback
+
+import http_client
+import liveness
+
+# 调度状态持久化文件（重启常驻进程后沿用已学到的间隔）
+SCHEDULE_FILE = os.path.join(".cache", "daemon_schedule.json")
+
+# 源检查间隔（秒）：初始值与原定时任务一致，按变化情况在上下限之间调整
+INITIAL_SOURCE_INTERVAL = 3 * 3600
+MIN_SOURCE_INTERVAL = 600
+MAX_SOURCE_INTERVAL = 24 * 3600
+
+# 源未变化时间隔乘以该值，变化时乘以 SHRINK_FACTOR
+GROWTH_FACTOR = 1.5
+SHRINK_FACTOR = 0.5
+
+# 任务的最长刷新间隔（秒），超过后即使源未变化也重跑；
+# 组播探测结果随端点存活状态变化，ttest 的源经由浏览器获取无法做条件请求
+TASK_MAX_INTERVAL = {
+    "zubo": 3600,
+    "ttest": 3 * 3600,
+    "my2": 6 * 3600,
+}
+DEFAULT_TASK_MAX_INTERVAL = 12 * 3600
+
+# 源需经 cloudscraper 获取的任务，不做源检查
+UNCHECKED_TASKS = ("my2",)
+
+# 条件请求超时（秒）
+CHECK_TIMEOUT = 30
+
+# 两次调度之间的最短休眠（秒）
+MIN_SLEEP = 5
+
+
+class SourceSchedule:
+    def __init__(self, path: str = SCHEDULE_FILE):
+        self.path = path
+        data = self._load()
+        self.sources = data.get("sources", {})  # {url: {"etag", "last_modified", "digest", "interval", "next_check", "changes", "checks"}}
+        self.tasks = data.get("tasks", {})      # {任务: {"sources": [url], "last_run": 时间}}
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"sources": self.sources, "tasks": self.tasks}, f, ensure_ascii=False, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"  调度状态保存失败: {e}")
+
+    def _adapt(self, entry, changed: bool, now: float):
+        entry["checks"] = entry.get("checks", 0) + 1
+        if changed:
+            entry["changes"] = entry.get("changes", 0) + 1
+            entry["interval"] = max(MIN_SOURCE_INTERVAL, entry["interval"] * SHRINK_FACTOR)
+        else:
+            entry["interval"] = min(MAX_SOURCE_INTERVAL, entry["interval"] * GROWTH_FACTOR)
+        entry["next_check"] = now + entry["interval"]
+
+    def observe(self, url: str, stats: dict, now: float = None):
+        """任务运行后记录源的校验头和摘要，与上次相比判断是否变化并调整检查间隔"""
+        if not 200 <= stats.get("status", 200) < 300:
+            return
+        now = time.time() if now is None else now
+        entry = self.sources.get(url)
+        if entry is None:
+            entry = self.sources[url] = {"interval": INITIAL_SOURCE_INTERVAL, "next_check": now + INITIAL_SOURCE_INTERVAL}
+        else:
+            self._adapt(entry, entry.get("digest") != stats["digest"], now)
+        entry.update(etag=stats.get("etag"), last_modified=stats.get("last_modified"), digest=stats["digest"])
+
+    def due(self, url: str, now: float):
+        entry = self.sources.get(url)
+        return entry is None or now >= entry["next_check"]
+
+    def check(self, url: str, now: float = None):
+        """
+        条件请求检查源是否变化：返回 True（变化）、False（未变化，间隔拉长）或 None（检查失败）。
+        变化时不更新摘要，响应交给随后的任务运行（http_client.hand_over），由它记录新内容并缩短间隔。
+        """
+        now = time.time() if now is None else now
+        entry = self.sources.get(url)
+        if entry is None:
+            return True
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        try:
+            response = http_client.get_session().get(url, headers=headers, timeout=CHECK_TIMEOUT)
+        except Exception as e:
+            print(f"  检查失败: {url} ({e})")
+            entry["next_check"] = now + MIN_SOURCE_INTERVAL
+            return None
+        if response.status_code == 304:
+            changed = False
+        elif response.ok:
+            changed = http_client.content_digest(response.content) != entry.get("digest")
+            if changed:
+                http_client.hand_over(url, response)
+        else:
+            print(f"  检查失败: {url} (HTTP {response.status_code})")
+            entry["next_check"] = now + MIN_SOURCE_INTERVAL
+            return None
+        if not changed:
+            self._adapt(entry, False, now)
+        return changed
+
+    def next_wake(self, names):
+        """下一个需要检查的源或需要刷新的任务的时间"""
+        times = []
+        for name in names:
+            task = self.tasks.get(name)
+            if task is None:
+                return time.time()
+            times.append(task["last_run"] + TASK_MAX_INTERVAL.get(name, DEFAULT_TASK_MAX_INTERVAL))
+            times.extend(self.sources[url]["next_check"] for url in task["sources"] if url in self.sources)
+        return min(times) if times else time.time() + MAX_SOURCE_INTERVAL
+
+
+def run_task(name: str):
+    """在当前进程中运行一个任务，返回 (是否成功, 本次抓取的源统计)"""
+    import cli
+
+    http_client.TRANSFER_STATS.clear()
+    ok = True
+    try:
+        cli.run(name, [])
+    except SystemExit as e:
+        ok = e.code in (0, None)
+    except Exception:
+        traceback.print_exc()
+        ok = False
+    http_client.clear_prefetched()
+    http_client.get_host_timeouts().save()
+    return ok, dict(http_client.TRANSFER_STATS)
+
+
+def due_reason(schedule: SourceSchedule, name: str, now: float):
+    """任务需要运行的原因，不需要运行时返回 None"""
+    task = schedule.tasks.get(name)
+    if task is None:
+        return "首次运行"
+    if now - task["last_run"] >= TASK_MAX_INTERVAL.get(name, DEFAULT_TASK_MAX_INTERVAL):
+        return "到达最长刷新间隔"
+    if name in UNCHECKED_TASKS:
+        return None
+    for url in task["sources"]:
+        if schedule.due(url, now) and schedule.check(url, now):
+            return f"源已变化: {url}"
+    return None
+
+
+def run_pass(schedule: SourceSchedule, names):
+    """执行一轮调度，返回本轮运行的任务数"""
+    ran = 0
+    for name in names:
+        reason = due_reason(schedule, name, time.time())
+        if reason is None:
+            continue
+        print(f"\n[{time.strftime('%Y-%m-%d %H:%M:%S')}] 运行 {name}（{reason}）")
+        start = time.time()
+        ok, stats = run_task(name)
+        now = time.time()
+        for url, source_stats in stats.items():
+            schedule.observe(url, source_stats, now)
+        task = schedule.tasks.setdefault(name, {"sources": []})
+        task["last_run"] = now
+        if stats:
+            task["sources"] = list(stats)
+        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {name} {'完成' if ok else '失败'}，耗时 {now - start:.1f}s")
+        ran += 1
+    schedule.save()
+    return ran
+
+
+def describe(schedule: SourceSchedule, names):
+    now = time.time()
+    for name in names:
+        task = schedule.tasks.get(name)
+        if task is None:
+            continue
+        for url in task["sources"]:
+            entry = schedule.sources.get(url)
+            if entry is not None:
+                print(f"  {name:<10}{url[:60]}  间隔 {entry['interval'] / 60:.0f}min，"
+                      f"{max(0, entry['next_check'] - now) / 60:.0f}min 后检查，变化 {entry.get('changes', 0)}/{entry.get('checks', 0)}")
+
+
+def run_forever(names, once: bool = False, serve: bool = False):
+    """常驻运行：按调度反复执行任务，Ctrl+C 退出"""
+    liveness.enable()
+    schedule = SourceSchedule()
+    print(f"常驻模式: {', '.join(names)}")
+    store = server = None
+    if serve:
+        import playlist_server
+        store = playlist_server.PlaylistStore(os.getcwd())
+        store.reload()
+        server = playlist_server.start_server(store)
+    try:
+        while True:
+            if run_pass(schedule, names) and store is not None:
+                print(f"播放列表服务: 更新 {store.reload()} 个文件")
+            describe(schedule, names)
+            if once:
+                return
+            sleep = max(MIN_SLEEP, schedule.next_wake(names) - time.time())
+            print(f"下次调度: {sleep / 60:.1f}min 后")
+            time.sleep(sleep)
+    except KeyboardInterrupt:
+        print("\n退出常驻模式")
+    finally:
+        schedule.save()
+        if server is not None:
+            server.shutdown()
@@ -0,0 +1,293 @@
+"""
+节目单（XMLTV EPG）裁剪
+设置环境变量 EPG=1 后，m3utotxt、my2 在写出播放列表的同时生成只含本输出频道的节目单
+epg/<输出名>.xml.gz。节目单来源为 M3U 头部的 x-tvg-url / url-tvg，以及环境变量 EPG_SOURCES
+追加的地址或本地文件（逗号分隔，.gz 按文件头自动识别）。
+完整的 XMLTV 常有几百 MB，这里用 iterparse 流式解析：每个 <channel>/<programme> 处理完立即清除，
+内存只与单个元素和保留的频道数有关。频道按 tvg-id 匹配，没有 tvg-id 或不一致时按规范化的
+tvg-name / 频道名匹配 display-name；节目只保留已匹配频道的，同一频道只取首个提供它的来源。
+输出的 gzip 不含时间戳，内容未变化时不重写文件。
+python TMP/epg.py -s <XMLTV地址或文件> ... <播放列表.txt|.m3u> [-o 输出] 可单独为已有输出生成节目单。
+"""
+
+import argparse
+import contextlib
+import gzip
+import hashlib
+import io
+import os
+import re
+import shutil
+import time
+import xml.etree.ElementTree as ET
+
+import http_client
+import snapshots
+from canonical import name_key
+from profiling import profiled
+
+# 节目单输出目录（相对仓库根目录）
+EPG_DIR = "epg"
+
+# 抓取节目单的超时（秒），按单次读取计，大文件持续传输不受影响
+FETCH_TIMEOUT = 60
+
+# 流式读取的块大小（字节）
+READ_SIZE = 1 << 16
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+XML_HEADER = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+              '<!DOCTYPE tv SYSTEM "xmltv.dtd">\n'
+              '<tv generator-info-name="mynew-epg">\n')
+
+EXTINF_ATTR = re.compile(r'([\w-]+)="([^"]*)"')
+
+TVG_URL = re.compile(r'(?:x-tvg-url|url-tvg)="([^"]+)"')
+
+
+def enabled():
+    return os.environ.get("EPG", "").lower() in ("1", "true", "yes")
+
+
+def extinf_attrs(line: str):
+    """#EXTINF 行的属性（tvg-id、tvg-name、group-title 等）"""
+    return dict(EXTINF_ATTR.findall(line))
+
+
+def tvg_urls(m3u_text: str):
+    """M3U 头部声明的节目单地址"""
+    for line in m3u_text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if not line.startswith("#EXTM3U"):
+            return []
+        return [url.strip() for match in TVG_URL.findall(line) for url in match.split(",") if url.strip()]
+    return []
+
+
+def env_sources():
+    return [source.strip() for source in os.environ.get("EPG_SOURCES", "").split(",") if source.strip()]
+
+
+def guide_path(output: str):
+    return os.path.join(EPG_DIR, os.path.splitext(os.path.basename(output))[0] + ".xml.gz")
+
+
+class GuideChannels:
+    """输出中的频道：按 tvg-id 和规范化名称匹配节目单中的 <channel>"""
+
+    def __init__(self):
+        self.ids = set()
+        self.names = set()
+
+    def add(self, name: str, tvg_id: str = "", tvg_name: str = ""):
+        if tvg_id:
+            self.ids.add(tvg_id)
+        for value in (tvg_name, name):
+            if value:
+                self.names.add(name_key(value))
+
+    def matches(self, channel: ET.Element):
+        if channel.get("id") in self.ids:
+            return True
+        return any(name_key(node.text or "") in self.names for node in channel.iter("display-name"))
+
+
+@contextlib.contextmanager
+def open_source(source: str):
+    """打开本地文件或地址，得到二进制流（gzip 内容自动解压）；退出时关闭各层流和连接"""
+    with contextlib.ExitStack() as stack:
+        if os.path.exists(source):
+            stream = stack.enter_context(open(source, 'rb'))
+        else:
+            response = stack.enter_context(http_client.get_session().get(
+                http_client.resolve_url(source), stream=True, timeout=FETCH_TIMEOUT))
+            response.raise_for_status()
+            response.raw.decode_content = True
+            # 读到末尾时不自动关闭，gzip 解压会在成员结束后再读一次
+            response.raw.auto_close = False
+            stream = stack.enter_context(io.BufferedReader(response.raw, READ_SIZE))
+        # GzipFile 关闭时不会关闭传入的流，由 ExitStack 逐层关闭
+        if stream.peek(2)[:2] == GZIP_MAGIC:
+            stream = stack.enter_context(gzip.GzipFile(fileobj=stream, mode='rb'))
+        yield stream
+
+
+def _serialize(elem: ET.Element):
+    elem.tail = None
+    return ET.tostring(elem, encoding="unicode") + "\n"
+
+
+def _scan_source(stream, wanted: GuideChannels, owner: dict, emitted: set, index: int, channels: list, programmes):
+    """
+    流式扫描一个来源，保留匹配的频道，节目写入 programmes；返回 (频道数, 节目数)，读取中断时保留已读到的部分
+    owner 记录每个频道 id 归属的来源，emitted 记录已写出 <channel> 的频道 id（均跨来源共用）
+    """
+    kept_channels = kept_programmes = 0
+    depth = 0
+    root = None
+    try:
+        for event, elem in ET.iterparse(stream, events=("start", "end")):
+            if event == "start":
+                if root is None:
+                    root = elem
+                depth += 1
+                continue
+            depth -= 1
+            if depth != 1:
+                continue
+            if elem.tag == "channel":
+                channel_id = elem.get("id")
+                # 节目先于频道声明出现时频道已被本来源认领，声明仍需写出
+                if (channel_id and owner.get(channel_id, index) == index and channel_id not in emitted
+                        and wanted.matches(elem)):
+                    owner[channel_id] = index
+                    emitted.add(channel_id)
+                    channels.append(_serialize(elem))
+                    kept_channels += 1
+            elif elem.tag == "programme":
+                channel_id = elem.get("channel")
+                # 个别来源把节目放在频道声明之前，按 tvg-id 直接认领
+                if channel_id not in owner and channel_id in wanted.ids:
+                    owner[channel_id] = index
+                if owner.get(channel_id) == index:
+                    programmes.write(_serialize(elem))
+                    kept_programmes += 1
+            # 已处理的顶层元素立即释放，内存不随文件大小增长
+            elem.clear()
+            root.clear()
+    except Exception as e:
+        # 截断或损坏的文件保留已读到的部分
+        print(f"  节目单读取中断: {e}")
+    return kept_channels, kept_programmes
+
+
+def _same_file(path_a: str, path_b: str):
+    digests = []
+    for path in (path_a, path_b):
+        digest = hashlib.sha256()
+        try:
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(READ_SIZE), b""):
+                    digest.update(block)
+        except OSError:
+            return False
+        digests.append(digest.digest())
+    return digests[0] == digests[1]
+
+
+@profiled("epg")
+def write_guide(output_path: str, wanted: GuideChannels, sources: list):
+    """
+    从各来源裁剪出 wanted 中的频道及其节目，写成 gzip 压缩的 XMLTV
+
+    Args:
+        output_path: 输出文件（.xml.gz）
+        wanted: 输出中的频道
+        sources: XMLTV 地址或本地文件，靠前的优先
+
+    Returns:
+        (保留的频道数, 保留的节目数, 是否写入)
+    """
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    owner = {}
+    emitted = set()
+    channels = []
+    total_programmes = 0
+    # 节目先写入临时文件（频道必须在节目之前，而后面的来源还可能补充频道）
+    programmes_path = f"{output_path}.{os.getpid()}.programmes"
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    try:
+        with open(programmes_path, 'w', encoding='utf-8') as programmes:
+            for index, source in enumerate(sources):
+                if snapshots.replaying() and not os.path.exists(source):
+                    print(f"  节目单跳过(回放模式不访问网络): {source}")
+                    continue
+                start = time.time()
+                try:
+                    with open_source(source) as stream:
+                        kept_channels, kept_programmes = _scan_source(stream, wanted, owner, emitted, index, channels, programmes)
+                except Exception as e:
+                    print(f"  节目单读取失败: {source} ({e})")
+                    continue
+                total_programmes += kept_programmes
+                print(f"  节目单: {source[:70]} 保留 {kept_channels} 个频道、{kept_programmes} 个节目，"
+                      f"耗时 {time.time() - start:.1f}s")
+
+        with open(tmp_path, 'wb') as raw, gzip.GzipFile(filename="", mode='wb', fileobj=raw, mtime=0) as out:
+            out.write(XML_HEADER.encode('utf-8'))
+            out.write("".join(channels).encode('utf-8'))
+            with open(programmes_path, 'rb') as programmes:
+                shutil.copyfileobj(programmes, out, READ_SIZE)
+            out.write(b"</tv>\n")
+        if _same_file(tmp_path, output_path):
+            os.remove(tmp_path)
+            return len(channels), total_programmes, False
+        os.replace(tmp_path, output_path)
+        return len(channels), total_programmes, True
+    finally:
+        for path in (programmes_path, tmp_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def build_guide(path: str, entries, sources: list):
+    """按 (频道名, tvg-id, tvg-name) 列表生成节目单并输出统计"""
+    wanted = GuideChannels()
+    for name, tvg_id, tvg_name in entries:
+        wanted.add(name, tvg_id, tvg_name)
+    channels, programmes, changed = write_guide(path, wanted, sources)
+    print(f"节目单: {path}（{channels} 个频道有节目单，{programmes} 个节目"
+          f"{'' if changed else '，内容未变化，未重写'}）")
+
+
+def build_for_output(output: str, entries, playlist_sources=()):
+    """
+    启用时为一个播放列表输出生成节目单
+
+    Args:
+        output: 播放列表输出文件，节目单写到 epg/<输出名>.xml.gz
+        entries: 可迭代的 (频道名, tvg-id, tvg-name)
+        playlist_sources: 从 M3U 头部取得的节目单地址
+    """
+    if not enabled():
+        return
+    sources = list(dict.fromkeys(list(playlist_sources) + env_sources()))
+    if not sources:
+        print("节目单: 没有可用的 XMLTV 来源（M3U 未声明 x-tvg-url，EPG_SOURCES 未设置）")
+        return
+    build_guide(guide_path(output), entries, sources)
+
+
+def playlist_entries(path: str):
+    """读取已有的 TXT 或 M3U 输出，返回 (频道名, tvg-id, tvg-name) 和 M3U 头部的节目单地址"""
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    entries = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("#EXTINF"):
+            attrs = extinf_attrs(line)
+            entries.append((line.rsplit(",", 1)[-1].strip(), attrs.get("tvg-id", ""), attrs.get("tvg-name", "")))
+        elif line and not line.startswith("#") and "#genre#" not in line and "," in line:
+            entries.append((line.split(",", 1)[0].strip(), "", ""))
+    return entries, tvg_urls(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按播放列表中的频道裁剪 XMLTV 节目单")
+    parser.add_argument("playlist", help="播放列表（TXT 或 M3U）")
+    parser.add_argument("-s", "--source", action="append", default=[], help="XMLTV 地址或本地文件，可重复")
+    parser.add_argument("-o", "--output", help="输出文件，默认 epg/<播放列表名>.xml.gz")
+    args = parser.parse_args()
+    entries, playlist_sources = playlist_entries(args.playlist)
+    sources = list(dict.fromkeys(args.source + playlist_sources + env_sources()))
+    if not sources:
+        parser.error("没有 XMLTV 来源，请用 -s 指定")
+    build_guide(args.output or guide_path(args.playlist), entries, sources)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+"""
+本地假源与假端点（离线性能测试用）
+FakeFleet 在 127.0.0.1 上启动：
+- 一个 HTTP 源服务器，按URL确定性地生成 TXT（#genre# 分段）、M3U（group-title）、JSON 播放列表
+  和 HLS 主播放列表，可配置响应延迟、带宽、是否支持 ETag/304，以及返回 Cloudflare 风格的挑战页；
+- 若干端点供连接探测：返回数据的 HTTP 流端点（/status 为 udpxy 状态页）、TCP 可以连接
+  但任何路径都返回 404 的监听端口、接受队列已满的黑洞端口（SYN 被丢弃，连接超时）和已关闭的端口（连接被拒绝）。
+生成内容只由随机种子和URL决定，同样的配置每次得到同样的数据。
+http_client.set_url_rewriter(fleet.rewriter(类型)) 可把脚本里写死的线上源地址改写到本地假源。
+独立运行：python TMP/fake_fleet.py（打印各类地址后持续服务，Ctrl+C 退出）。
+"""
+
+import hashlib
+import json
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlsplit
+
+GROUPS = ["央视频道", "卫视频道", "地方频道", "数字频道", "港澳台", "国际频道"]
+
+RESOLUTIONS = [(640, 360), (1280, 720), (1920, 1080), (3840, 2160)]
+
+CHALLENGE_PAGE = (
+    "<!DOCTYPE html><html><head><title>Just a moment...</title></head>"
+    "<body><div id=\"cf-challenge\">Checking your browser before accessing. cloudflare</div></body></html>"
+)
+
+# HTTP 流端点返回的数据量（字节）
+STREAM_BYTES = 4096
+
+
+class FleetConfig:
+    def __init__(self, seed: int = 1, channels: int = 2000, latency: float = 0.0, bandwidth: int = 0,
+                 etag: bool = True, challenge: bool = False, http_endpoints: int = 8, tcp_listeners: int = 2,
+                 blackholed: int = 2, closed: int = 2, saturated: int = 0):
+        self.seed = seed
+        self.channels = channels          # 每个源的频道数
+        self.latency = latency            # 响应前等待（秒）
+        self.bandwidth = bandwidth        # 每秒字节数，0 表示不限速
+        self.etag = etag                  # 是否返回 ETag 并支持 If-None-Match
+        self.challenge = challenge        # 源地址是否返回 Cloudflare 挑战页
+        self.http_endpoints = http_endpoints
+        self.tcp_listeners = tcp_listeners
+        self.blackholed = blackholed
+        self.closed = closed
+        self.saturated = saturated        # 前几个 HTTP 端点的 udpxy 状态页报告客户端已满
+
+
+# udpxy 状态页（与 udpxy 的 /status 表格结构相同）
+UDPXY_STATUS_PAGE = (
+    "<html><head><title>udpxy status</title></head><body>"
+    "<table><tr><th>Server Process ID</th><th>Accepting clients on</th><th>Multicast address</th>"
+    "<th>Active clients</th></tr><tr><td>1</td><td>127.0.0.1:{port}</td><td>lo</td><td>{clients}</td></tr></table>"
+    "</body></html>"
+)
+
+
+class _StreamHandler(BaseHTTPRequestHandler):
+    """HTTP 流端点：/status 返回 udpxy 状态页，其余路径返回固定长度的数据"""
+    protocol_version = "HTTP/1.1"
+    clients = 0  # 状态页报告的活动客户端数
+
+    def do_GET(self):
+        if self.path == "/status":
+            body = UDPXY_STATUS_PAGE.format(port=self.server.server_address[1], clients=self.clients).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "video/mp2t")
+        self.send_header("Content-Length", str(STREAM_BYTES))
+        self.end_headers()
+        self.wfile.write(b"\x47" * STREAM_BYTES)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeFleet:
+    def __init__(self, config: FleetConfig = None):
+        self.config = config or FleetConfig()
+        self.servers = []
+        self.sockets = []
+        self.endpoints = {"http": [], "tcp": [], "blackhole": [], "closed": []}
+        self.source_server = None
+        self.requests = 0
+        self.not_modified = 0
+
+    # ---------- 启停 ----------
+
+    def _serve(self, handler):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.servers.append(server)
+        return server
+
+    def _listener(self, backlog: int):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(("127.0.0.1", 0))
+        sock.listen(backlog)
+        self.sockets.append(sock)
+        return sock
+
+    def _tcp_listener(self):
+        """接受连接后对任何请求回 404 并关闭：TCP 探测通过，路径检查判为不可用"""
+        sock = self._listener(128)
+
+        def accept_loop():
+            while True:
+                try:
+                    conn, _ = sock.accept()
+                except OSError:
+                    return
+                try:
+                    conn.settimeout(1)
+                    conn.recv(4096)
+                    conn.sendall(b"HTTP/1.0 404 Not Found\r\nContent-Length: 0\r\n\r\n")
+                except OSError:
+                    pass
+                finally:
+                    conn.close()
+
+        threading.Thread(target=accept_loop, daemon=True).start()
+        return sock.getsockname()[1]
+
+    def _blackhole(self):
+        """接受队列填满且从不 accept 的监听端口，新的 SYN 被内核丢弃"""
+        sock = self._listener(0)
+        port = sock.getsockname()[1]
+        for _ in range(4):
+            filler = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            filler.setblocking(False)
+            filler.connect_ex(("127.0.0.1", port))
+            self.sockets.append(filler)
+        time.sleep(0.05)
+        return port
+
+    def _closed_port(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        return port
+
+    def _stream_handler(self, index: int):
+        """第 index 个 HTTP 端点：已满的报告 udpxy 默认上限个客户端，其余报告 0～2 个"""
+        clients = 3 if index < self.config.saturated else index % 3
+        return type("_StreamEndpoint", (_StreamHandler,), {"clients": clients})
+
+    def start(self):
+        config = self.config
+        self.source_server = self._serve(self._make_source_handler())
+        self.endpoints["http"] = [self._serve(self._stream_handler(i)).server_address[1] for i in range(config.http_endpoints)]
+        self.endpoints["tcp"] = [self._tcp_listener() for _ in range(config.tcp_listeners)]
+        self.endpoints["blackhole"] = [self._blackhole() for _ in range(config.blackholed)]
+        self.endpoints["closed"] = [self._closed_port() for _ in range(config.closed)]
+        return self
+
+    def stop(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        for sock in self.sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+        self.servers = []
+        self.sockets = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ---------- 地址 ----------
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.source_server.server_address[1]}"
+
+    def source_url(self, kind: str, name: str):
+        """kind 为 txt / m3u / json，name 决定生成的内容"""
+        return f"{self.base_url}/{kind}?src={quote(name, safe='')}"
+
+    def rewriter(self, kind: str):
+        """把任意源URL改写为同名的本地假源"""
+        return lambda url: self.source_url(kind, url)
+
+    def endpoint_kind(self, port: int):
+        for kind, ports in self.endpoints.items():
+            if port in ports:
+                return kind
+        return None
+
+    # ---------- 内容生成 ----------
+
+    def _rng(self, name: str):
+        digest = hashlib.sha256(f"{self.config.seed}:{name}".encode('utf-8')).digest()
+        return random.Random(int.from_bytes(digest[:8], "big"))
+
+    def _endpoint_url(self, rng, index: int):
+        """按固定比例分配端点：多数为可用的 HTTP 流，其余为裸TCP、黑洞和已关闭端口"""
+        roll = rng.random()
+        if roll < 0.7 or not (self.endpoints["tcp"] or self.endpoints["blackhole"] or self.endpoints["closed"]):
+            pool = self.endpoints["http"]
+        elif roll < 0.8 and self.endpoints["tcp"]:
+            pool = self.endpoints["tcp"]
+        elif roll < 0.9 and self.endpoints["blackhole"]:
+            pool = self.endpoints["blackhole"]
+        else:
+            pool = self.endpoints["closed"] or self.endpoints["http"]
+        port = pool[index % len(pool)]
+        return f"http://127.0.0.1:{port}/udp/239.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}:5000"
+
+    def _channels(self, name: str):
+        rng = self._rng(name)
+        channels = []
+        for i in range(self.config.channels):
+            group = GROUPS[rng.randrange(len(GROUPS))] if i else GROUPS[0]
+            channels.append((group, f"频道{rng.randrange(1, 500)}", self._endpoint_url(rng, i)))
+        channels.sort(key=lambda c: GROUPS.index(c[0]))
+        return channels
+
+    def render(self, kind: str, name: str):
+        if kind == "txt":
+            lines = []
+            current = None
+            for group, title, url in self._channels(name):
+                if group != current:
+                    lines.append(f"{group},#genre#")
+                    current = group
+                lines.append(f"{title},{url}")
+            return "\n".join(lines) + "\n", "text/plain; charset=utf-8"
+        if kind == "m3u":
+            lines = ["#EXTM3U"]
+            for group, title, url in self._channels(name):
+                lines.append(f'#EXTINF:-1 tvg-name="{title}" group-title="{group}",{title}')
+                lines.append(url)
+            return "\n".join(lines) + "\n", "audio/x-mpegurl"
+        if kind == "json":
+            rng = self._rng(name)
+            items = []
+            for i in range(self.config.channels):
+                width, height = RESOLUTIONS[rng.randrange(len(RESOLUTIONS))]
+                items.append({
+                    "title": f"频道{i}",
+                    "url": f"{self.base_url}/hls/{i}.m3u8?src={quote(name, safe='')}",
+                    "quality": f"{height}p" if rng.random() < 0.8 else "unknown",
+                })
+            return json.dumps(items, ensure_ascii=False), "application/json"
+        if kind == "hls":
+            rng = self._rng(name)
+            top = rng.randrange(len(RESOLUTIONS))
+            lines = ["#EXTM3U"]
+            for width, height in RESOLUTIONS[:top + 1]:
+                lines.append(f"#EXT-X-STREAM-INF:BANDWIDTH={width * height * 2},RESOLUTION={width}x{height}")
+                lines.append(f"{height}.m3u8")
+            return "\n".join(lines) + "\n", "application/vnd.apple.mpegurl"
+        return None, None
+
+    def _make_source_handler(self):
+        fleet = self
+
+        class SourceHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                fleet.requests += 1
+                config = fleet.config
+                parts = urlsplit(self.path)
+                name = parse_qs(parts.query).get("src", [""])[0]
+                if parts.path.startswith("/hls/"):
+                    kind, name = "hls", parts.path + name
+                else:
+                    kind = parts.path.strip("/")
+                if config.latency:
+                    time.sleep(config.latency)
+
+                if config.challenge and kind != "hls":
+                    body = CHALLENGE_PAGE.encode('utf-8')
+                    self.send_response(503)
+                    self.send_header("Server", "cloudflare")
+                    self.send_header("Content-Type", "text/html; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+
+                text, content_type = fleet.render(kind, name)
+                if text is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = text.encode('utf-8')
+                etag = f'"{hashlib.sha1(body).hexdigest()}"'
+                if config.etag and self.headers.get("If-None-Match") == etag:
+                    fleet.not_modified += 1
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                if config.etag:
+                    self.send_header("ETag", etag)
+                self.end_headers()
+                self._write(body, config.bandwidth)
+
+            def _write(self, body: bytes, bandwidth: int):
+                if not bandwidth:
+                    self.wfile.write(body)
+                    return
+                # 按 100ms 切片限速
+                step = max(1, bandwidth // 10)
+                for offset in range(0, len(body), step):
+                    self.wfile.write(body[offset:offset + step])
+                    time.sleep(0.1)
+
+            def log_message(self, format, *args):
+                pass
+
+        return SourceHandler
+
+
+def main():
+    with FakeFleet() as fleet:
+        for kind in ("txt", "m3u", "json"):
+            print(f"{kind:<5}{fleet.source_url(kind, 'demo')}")
+        for kind, ports in fleet.endpoints.items():
+            print(f"{kind:<10}{', '.join(map(str, ports))}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
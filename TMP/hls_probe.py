@@ -0,0 +1,204 @@
+"""
+HLS 主播放列表批量探测
+只读取每个 .m3u8 的开头（主播放列表通常只有几 KB，读取量有上限），解析 EXT-X-STREAM-INF 的
+RESOLUTION 和 BANDWIDTH，得到实测的最高分辨率和码率；不解码媒体、不为每条流启动 ffprobe。
+一批URL在线程池中经共享HTTP客户端并发探测，结果按URL缓存到 .cache/hls_probe.json，在TTL内跨运行复用。
+超时、429/5xx 以及超时被运行时限收紧后的失败不能说明地址不可用，记为未测量（不缓存），
+调用方按没有实测结果处理。
+"""
+
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import http_client
+from run_deadline import PRIORITY_LOW
+from profiling import profiled
+
+# 探测结果缓存文件
+HLS_CACHE_FILE = os.path.join(".cache", "hls_probe.json")
+
+# 成功结果的缓存时间（秒）
+CACHE_TTL = 24 * 3600
+
+# 失败结果的缓存时间（秒）
+NEGATIVE_TTL = 2 * 3600
+
+# 每个播放列表最多读取的字节数
+MAX_PLAYLIST_BYTES = 64 * 1024
+
+# 单个探测超时（秒）
+PROBE_TIMEOUT = 8
+
+# 同时进行的探测数
+PROBE_CONCURRENCY = 32
+
+# 视为暂时性失败的 HTTP 状态码（另外所有 5xx 也是）
+TRANSIENT_STATUS = (408, 429)
+
+STREAM_INF_PATTERN = re.compile(r'#EXT-X-STREAM-INF:(.*)')
+RESOLUTION_PATTERN = re.compile(r'RESOLUTION=(\d+)x(\d+)')
+BANDWIDTH_PATTERN = re.compile(r'(?<![-A-Z])BANDWIDTH=(\d+)')
+
+
+def is_hls_url(url: str):
+    return url.startswith(("http://", "https://")) and ".m3u8" in url.lower()
+
+
+def parse_master_playlist(text: str):
+    """
+    解析播放列表
+
+    Returns:
+        {"ok": True, "kind": "master"/"media", "variants": 变体数, "width", "height", "bandwidth"}，
+        取分辨率最高（同分辨率取码率最高）的变体；媒体播放列表没有分辨率信息，宽高码率为 None
+    """
+    best = None
+    variants = 0
+    for m in STREAM_INF_PATTERN.finditer(text):
+        attrs = m.group(1)
+        variants += 1
+        resolution = RESOLUTION_PATTERN.search(attrs)
+        bandwidth = BANDWIDTH_PATTERN.search(attrs)
+        width, height = (int(resolution.group(1)), int(resolution.group(2))) if resolution else (None, None)
+        candidate = (height or 0, int(bandwidth.group(1)) if bandwidth else 0, width)
+        if best is None or candidate[:2] > best[:2]:
+            best = candidate
+    if best is None:
+        return {"ok": True, "kind": "media", "variants": 0, "width": None, "height": None, "bandwidth": None}
+    height, bandwidth, width = best
+    return {"ok": True, "kind": "master", "variants": variants,
+            "width": width, "height": height or None, "bandwidth": bandwidth or None}
+
+
+def _is_timeout(error: Exception):
+    # 读取响应体时的超时会被包装成 ConnectionError，只能从消息判断
+    return isinstance(error, TimeoutError) or "Timeout" in type(error).__name__ or "timed out" in str(error)
+
+
+def probe_playlist(url: str, timeout: float = PROBE_TIMEOUT):
+    """
+    读取播放列表开头并解析；不可用或不是 HLS 播放列表时返回 {"ok": False}，
+    暂时性失败（超时、429/5xx）另带 "transient": True
+    """
+    try:
+        response = http_client.get_session().get(url, stream=True, timeout=timeout)
+        try:
+            status = response.status_code
+            if status >= 400:
+                return {"ok": False, "error": f"HTTP {status}", "transient": status >= 500 or status in TRANSIENT_STATUS}
+            data = b""
+            for chunk in response.iter_content(8192):
+                data += chunk
+                if len(data) >= MAX_PLAYLIST_BYTES:
+                    break
+        finally:
+            response.close()
+    except Exception as e:
+        return {"ok": False, "error": type(e).__name__, "transient": _is_timeout(e)}
+    text = data[:MAX_PLAYLIST_BYTES].decode('utf-8', errors='ignore')
+    if "#EXTM3U" not in text[:1024]:
+        return {"ok": False, "error": "not-hls"}
+    return parse_master_playlist(text)
+
+
+class HLSProbeCache:
+    def __init__(self, path: str = HLS_CACHE_FILE):
+        self.path = path
+        self.entries = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        now = time.time()
+        self.entries = {url: e for url, e in self.entries.items() if e["expires"] > now}
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"  HLS探测缓存保存失败: {e}")
+
+    def get(self, url: str):
+        entry = self.entries.get(url)
+        if entry and entry["expires"] > time.time():
+            return entry["result"]
+        return None
+
+    def put(self, url: str, result: dict):
+        ttl = CACHE_TTL if result.get("ok") else NEGATIVE_TTL
+        self.entries[url] = {"result": result, "expires": time.time() + ttl}
+
+
+def _probe_one(url, deadline):
+    """探测一个URL，临近运行时限时返回 None"""
+    if deadline is not None and not deadline.allows(PRIORITY_LOW):
+        return None
+    timeout = PROBE_TIMEOUT if deadline is None else deadline.clamp_timeout(PROBE_TIMEOUT)
+    result = probe_playlist(url, timeout)
+    if not result["ok"] and timeout < PROBE_TIMEOUT:
+        # 超时被运行时限收紧，失败不能说明地址不可用
+        result["transient"] = True
+    return result
+
+
+@profiled("hls_probe")
+def probe_urls(urls, cache: HLSProbeCache = None, deadline=None):
+    """
+    探测一批URL（非 .m3u8 地址跳过）
+
+    Returns:
+        (results, stats)：results 为 {url: 结果}，临近运行时限未探测和暂时性失败（未测量）的URL不在其中；
+        stats 为 {"probed": 探测数, "cached": 缓存命中数, "unmeasured": 暂时性失败数, "seconds": 耗时}
+    """
+    results = {}
+    pending = []
+    for url in dict.fromkeys(urls):
+        if not is_hls_url(url):
+            continue
+        cached = cache.get(url) if cache is not None else None
+        if cached is not None:
+            results[url] = cached
+        else:
+            pending.append(url)
+
+    start = time.time()
+    probed = unmeasured = 0
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(PROBE_CONCURRENCY, len(pending))) as executor:
+            for url, result in zip(pending, executor.map(lambda url: _probe_one(url, deadline), pending)):
+                if result is None:
+                    continue
+                probed += 1
+                if result.get("transient"):
+                    unmeasured += 1
+                    continue
+                results[url] = result
+                if cache is not None:
+                    cache.put(url, result)
+    stats = {"probed": probed, "cached": len(results) - probed + unmeasured, "unmeasured": unmeasured,
+             "seconds": time.time() - start}
+    return results, stats
+
+
+def parse_quality(quality: str):
+    """把 "1080p"、"720P" 之类的质量标签转为高度，无法识别时返回 None"""
+    m = re.fullmatch(r'\s*(\d{3,4})[pP]?\s*', quality or "")
+    return int(m.group(1)) if m else None
+
+
+def quality_key(result):
+    """排序键：实测高度优先，其次码率（未知的排在最后）"""
+    if not result or not result.get("ok"):
+        return (0, 0)
+    return (result.get("height") or 0, result.get("bandwidth") or 0)
@@ -0,0 +1,125 @@
+"""
+按主机过滤URL的黑名单
+每行只解析一次URL主机名：域名按反转标签存入字典树做后缀匹配（屏蔽 example.com 同时屏蔽
+*.example.com），IP 和 CIDR 按前缀长度分表查找。与在整行上做子串匹配相比，
+不会误伤频道名中恰好包含关键词的行，且单行代价与黑名单长度无关；同一主机的判定结果会被缓存。
+"""
+
+import hashlib
+import ipaddress
+import re
+
+from profiling import profiled
+
+# 提取URL的 authority 部分（[用户@]主机[:端口]）
+AUTHORITY_PATTERN = re.compile(r'://([^/\s,?#]*)')
+
+_END = ""
+
+
+def host_of(authority: str):
+    """从 authority 中去掉用户信息和端口，IPv6 去掉方括号"""
+    if "@" in authority:
+        authority = authority.rpartition("@")[2]
+    if authority.startswith("["):
+        return authority[1:authority.find("]")]
+    return authority.partition(":")[0]
+
+
+class HostBlocklist:
+    def __init__(self, entries=()):
+        self.trie = {}
+        self.networks = {}  # {(IP版本, 前缀长度): {网络地址整数}}
+        self.cache = {}  # 主机（或 authority）-> 是否屏蔽
+        self.entries = set()
+        for entry in entries:
+            self.add(entry)
+
+    def add(self, entry: str):
+        """添加一个域名、IP 或 CIDR"""
+        entry = entry.strip().lower().rstrip(".")
+        if not entry:
+            return
+        self.cache.clear()
+        self.entries.add(entry)
+        try:
+            network = ipaddress.ip_network(entry.strip("[]"), strict=False)
+        except ValueError:
+            node = self.trie
+            for label in reversed(entry.lstrip("*.").split(".")):
+                node = node.setdefault(label, {})
+            node[_END] = True
+            return
+        key = (network.version, network.prefixlen)
+        self.networks.setdefault(key, set()).add(int(network.network_address))
+
+    def fingerprint(self):
+        """黑名单内容的摘要，用于缓存键"""
+        return hashlib.blake2b("\n".join(sorted(self.entries)).encode('utf-8'), digest_size=16).hexdigest()
+
+    def _match_ip(self, address):
+        value = int(address)
+        bits = address.max_prefixlen
+        for (version, prefixlen), networks in self.networks.items():
+            if version != address.version:
+                continue
+            shift = bits - prefixlen
+            if (value >> shift) << shift in networks:
+                return True
+        return False
+
+    def _match_domain(self, host: str):
+        node = self.trie
+        for label in reversed(host.split(".")):
+            node = node.get(label)
+            if node is None:
+                return False
+            if _END in node:
+                return True
+        return False
+
+    def blocks_host(self, host: str):
+        """主机是否被屏蔽（结果缓存）"""
+        host = host.lower().rstrip(".")
+        blocked = self.cache.get(host)
+        if blocked is None:
+            try:
+                blocked = self._match_ip(ipaddress.ip_address(host))
+            except ValueError:
+                blocked = self._match_domain(host)
+            self.cache[host] = blocked
+        return blocked
+
+    def blocks_line(self, line: str):
+        """行中第一个URL的主机是否被屏蔽，没有URL的行不屏蔽"""
+        if not self.trie and not self.networks:
+            return False
+        m = AUTHORITY_PATTERN.search(line)
+        if not m:
+            return False
+        authority = m.group(1)
+        blocked = self.cache.get(authority)
+        if blocked is None:
+            blocked = self.blocks_host(host_of(authority))
+            self.cache[authority] = blocked
+        return blocked
+
+
+# 所有流水线共用的屏蔽主机（盗源/失效聚合站），各脚本可在此基础上追加自己的列表
+SHARED_BLOCKED_HOSTS = ["iill.top", "cfss.cc"]
+
+
+def build_blocklist(extra=()):
+    """共用列表 + 脚本自己的列表"""
+    return HostBlocklist(list(SHARED_BLOCKED_HOSTS) + list(extra))
+
+
+@profiled("blocklist")
+def drop_blocked(lines: list, blocklist: HostBlocklist = None):
+    """删除URL主机被屏蔽的行"""
+    if blocklist is None:
+        blocklist = build_blocklist()
+    result = [line for line in lines if not blocklist.blocks_line(line)]
+    if len(result) != len(lines):
+        print(f"主机屏蔽: {len(lines) - len(result)} 行被过滤")
+    return result
@@ -0,0 +1,80 @@
+"""
+按主机学习的自适应超时
+记录每个主机最近若干次成功请求的延迟（持久化到 .cache 目录，跨运行保留），
+超时取 p99 × 系数，并限制在 [下限, 默认超时] 之间；样本不足的新主机直接使用默认超时。
+存活主机通常在几百毫秒内响应，这样不可用的主机不再每次耗满默认超时。
+"""
+
+import json
+import os
+import threading
+
+# 连接探测的延迟样本文件
+PROBE_LATENCY_FILE = os.path.join(".cache", "host_latency_probe.json")
+
+# HTTP 抓取的延迟样本文件
+FETCH_LATENCY_FILE = os.path.join(".cache", "host_latency_fetch.json")
+
+# 每个主机保留的样本数
+MAX_SAMPLES = 50
+
+# 样本数达到该值才使用学习到的超时
+MIN_SAMPLES = 5
+
+# 超时 = p99 × 该系数
+TIMEOUT_MULTIPLIER = 4.0
+
+# 学习到的超时下限（秒）
+MIN_TIMEOUT = 0.5
+
+
+def percentile(values, q: float):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class HostTimeouts:
+    def __init__(self, path: str = PROBE_LATENCY_FILE):
+        self.path = path
+        self.samples = self._load()
+        self.lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with self.lock:
+                data = json.dumps(self.samples)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"  延迟样本保存失败: {e}")
+
+    def record(self, host: str, latency: float):
+        """记录一次成功请求的延迟"""
+        with self.lock:
+            samples = self.samples.setdefault(host, [])
+            samples.append(round(latency, 4))
+            if len(samples) > MAX_SAMPLES:
+                del samples[:len(samples) - MAX_SAMPLES]
+
+    def timeout_for(self, host: str, default: float, minimum: float = MIN_TIMEOUT):
+        """按历史延迟计算超时，样本不足时返回默认超时"""
+        samples = self.samples.get(host)
+        if not samples or len(samples) < MIN_SAMPLES:
+            return default
+        learned = percentile(samples, 0.99) * TIMEOUT_MULTIPLIER
+        return max(minimum, min(default, learned))
+
+    def learned_count(self):
+        return sum(1 for samples in self.samples.values() if len(samples) >= MIN_SAMPLES)
@@ -0,0 +1,189 @@
+"""
+共享HTTP客户端
+所有抓取脚本共用一个 requests.Session：按主机缓存连接池并保持长连接（同一主机的后续请求
+复用已建立的 TCP/TLS 连接，免去重复握手），统一协商 gzip/deflate/br 压缩，
+并按源统计线上传输字节数与解码后字节数。
+requests 在首次创建会话时才导入，不发请求的任务（如只用 Selenium 的脚本）不承担其导入开销。
+"""
+
+import atexit
+import hashlib
+import time
+from urllib.parse import urlsplit
+
+import snapshots
+from host_timeouts import HostTimeouts, FETCH_LATENCY_FILE
+
+# 缓存的主机连接池数量
+POOL_CONNECTIONS = 16
+
+# 每个主机连接池保持的最大连接数
+POOL_MAXSIZE = 10
+
+# 按主机学习到的抓取超时下限（秒）
+FETCH_MIN_TIMEOUT = 5
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Connection': 'keep-alive',
+}
+
+
+def _accept_encoding():
+    """只声明本机能解码的压缩格式（br 需要 brotli 或 brotlicffi）"""
+    encodings = ["gzip", "deflate"]
+    try:
+        import brotli  # noqa: F401
+        encodings.append("br")
+    except ImportError:
+        try:
+            import brotlicffi  # noqa: F401
+            encodings.append("br")
+        except ImportError:
+            pass
+    return ", ".join(encodings)
+
+
+_session = None
+_host_timeouts = None
+
+# 请求地址改写（离线测试时把线上源指向本地假源，见 fake_fleet.py）；统计仍按原地址记录
+_url_rewriter = None
+
+# 每个源的传输统计 {url: {"wire": 线上字节, "decoded": 解码后字节, "encoding": 压缩格式,
+#                          "status", "etag"/"last_modified": 缓存校验头, "digest": 响应体摘要}}
+TRANSFER_STATS = {}
+
+# 已下载、尚未被任务使用的响应（常驻模式检查源时取得），下一次 fetch 同一地址时直接返回
+_prefetched = {}
+
+
+def mount_adapters(session):
+    """给会话挂载按主机缓存的连接池"""
+    from requests.adapters import HTTPAdapter
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def resize_pools(session):
+    """
+    调整会话已挂载适配器的连接池大小，不替换适配器本身
+    cloudscraper 的适配器带有自定义 TLS 上下文（在 init_poolmanager 中传入），替换成普通 HTTPAdapter 会失效
+    """
+    for adapter in session.adapters.values():
+        if not hasattr(adapter, "init_poolmanager"):
+            continue
+        adapter.poolmanager.clear()
+        adapter._pool_connections = POOL_CONNECTIONS
+        adapter._pool_maxsize = POOL_MAXSIZE
+        adapter.init_poolmanager(POOL_CONNECTIONS, POOL_MAXSIZE, block=adapter._pool_block)
+    return session
+
+
+def set_url_rewriter(func):
+    """设置请求地址改写函数，传 None 取消"""
+    global _url_rewriter
+    _url_rewriter = func
+
+
+def resolve_url(url: str):
+    """实际请求的地址"""
+    return _url_rewriter(url) if _url_rewriter is not None else url
+
+
+def get_session():
+    """获取共享会话（首次调用时创建）"""
+    global _session
+    if _session is None:
+        import requests
+        session = requests.Session()
+        session.headers.update(DEFAULT_HEADERS)
+        session.headers['Accept-Encoding'] = _accept_encoding()
+        _session = mount_adapters(session)
+    return _session
+
+
+def content_digest(content: bytes):
+    """响应体摘要，用于判断内容是否变化"""
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+
+def record_transfer(url: str, response):
+    """记录一次响应的线上字节数、解码后字节数，以及用于判断内容是否变化的校验头和摘要"""
+    decoded = len(response.content)
+    try:
+        wire = response.raw.tell() or decoded
+    except Exception:
+        wire = decoded
+    TRANSFER_STATS[url] = {
+        "wire": wire,
+        "decoded": decoded,
+        "encoding": response.headers.get('Content-Encoding', 'identity'),
+        "status": response.status_code,
+        "etag": response.headers.get('ETag'),
+        "last_modified": response.headers.get('Last-Modified'),
+        "digest": content_digest(response.content),
+    }
+
+
+def get_host_timeouts():
+    """抓取延迟样本（首次调用时加载，进程退出时保存）"""
+    global _host_timeouts
+    if _host_timeouts is None:
+        _host_timeouts = HostTimeouts(FETCH_LATENCY_FILE)
+        atexit.register(_host_timeouts.save)
+    return _host_timeouts
+
+
+def use_host_timeouts(host_timeouts):
+    """替换抓取延迟样本（基准测试在临时目录中使用独立的样本），返回原来的对象"""
+    global _host_timeouts
+    previous, _host_timeouts = _host_timeouts, host_timeouts
+    return previous
+
+
+def hand_over(url: str, response):
+    """保存已完整读取的响应，下一次 fetch(url) 直接返回它而不再请求（只用一次）"""
+    _prefetched[url] = response
+
+
+def clear_prefetched():
+    _prefetched.clear()
+
+
+def fetch(url: str, timeout: float = 30, session=None, **kwargs):
+    """
+    通过共享会话发起GET请求并读取完整响应体，超时按该主机的历史延迟收紧；已有 hand_over 的响应时直接使用。
+    录制模式下保存响应内容，回放模式下不访问网络，直接返回录制的响应（见 snapshots.py）
+    """
+    if snapshots.replaying():
+        response = snapshots.replay_response(url)
+        record_transfer(url, response)
+        return response
+    response = _prefetched.pop(url, None)
+    if response is not None:
+        record_transfer(url, response)
+        snapshots.record_response(url, response)
+        return response
+    session = session or get_session()
+    host = urlsplit(url).hostname or url
+    host_timeouts = get_host_timeouts()
+    start = time.time()
+    response = session.get(resolve_url(url), timeout=host_timeouts.timeout_for(host, timeout, FETCH_MIN_TIMEOUT), **kwargs)
+    record_transfer(url, response)
+    snapshots.record_response(url, response)
+    if response.ok:
+        host_timeouts.record(host, time.time() - start)
+    return response
+
+
+def report():
+    """打印各源的传输统计"""
+    if not TRANSFER_STATS:
+        return
+    print("传输统计:")
+    for url, stats in TRANSFER_STATS.items():
+        ratio = stats["wire"] / stats["decoded"] * 100 if stats["decoded"] else 100
+        print(f"  {url[:70]}  线上 {stats['wire']} 字节 / 解码 {stats['decoded']} 字节 ({ratio:.1f}%, {stats['encoding']})")
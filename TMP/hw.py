@@ -8,25 +8,39 @@
 
 import os
 import re
-import requests
+import http_client
+from source_health import SourceHealth
+from run_deadline import RunDeadline, fetch_in_priority_order
+from url_index import claim_lines
+from host_blocklist import drop_blocked
+from incremental_output import write_if_changed
+from profiling import profiled
+from canonical import canonical_order
 from typing import List, Optional
 
 class WebContentFilter:
     def __init__(self, tmp_dir: str = "TMP"):
         self.tmp_dir = tmp_dir
+        self.health = SourceHealth()
+        self.deadline = RunDeadline()
         os.makedirs(tmp_dir, exist_ok=True)
         
+    @profiled("fetch")
     def fetch_url_content(self, url: str) -> Optional[str]:
         """获取单个URL的内容"""
+        if not self.health.admit(url):
+            return None
         try:
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
+            with self.health.guard(url):
+                response = http_client.fetch(url, timeout=self.deadline.clamp_timeout(self.health.timeout_for(url, 10)))
+                response.raise_for_status()
             response.encoding = response.apparent_encoding
             return response.text
         except Exception as e:
             print(f"获取URL {url} 失败: {e}")
             return None
     
+    @profiled("exclude")
     def filter_segments(self, content: str, exclude_words: List[str]) -> str:
         """过滤包含指定关键词的#genren#段"""
         if not exclude_words:
@@ -52,6 +66,7 @@ class WebContentFilter:
                 
         return ''.join(filtered_segments)
     
+    @profiled("filter")
     def filter_lines(self, content: str, exclude_words: List[str]) -> str:
         """过滤包含指定关键词的行"""
         if not exclude_words:
@@ -74,17 +89,19 @@ class WebContentFilter:
         exclude_segment_words = exclude_segment_words or []
         exclude_line_words = exclude_line_words or []
         
-        all_content = []
-        
-        for url in urls:
+        def fetch(url):
             print(f"正在处理: {url}")
             content = self.fetch_url_content(url)
-            if content:
-                # 先过滤段
-                filtered_content = self.filter_segments(content, exclude_segment_words)
-                # 再过滤行
-                filtered_content = self.filter_lines(filtered_content, exclude_line_words)
-                all_content.append(filtered_content)
+            if not content:
+                return None
+            # 先过滤段
+            filtered_content = self.filter_segments(content, exclude_segment_words)
+            # 再过滤行
+            return self.filter_lines(filtered_content, exclude_line_words)
+        
+        all_content = fetch_in_priority_order(urls, fetch, self.health, self.deadline)
+        self.health.save()
+        http_client.report()
                 
         # 合并所有内容
         final_content = '\n'.join(all_content)
@@ -93,17 +110,25 @@ class WebContentFilter:
         lines = final_content.split('\n')
         filtered_lines = [line for line in lines if '#genre#' not in line]
         
+        # 主机黑名单 + 跨输出去重
+        filtered_lines = drop_blocked(filtered_lines)
+        output_path = os.path.join(self.tmp_dir, output_file)
+        filtered_lines = claim_lines(output_path.replace(os.sep, '/'), filtered_lines)
+        
+        # 规范顺序（启用时）
+        filtered_lines = canonical_order(filtered_lines)
+        
         # 添加指定第一行
         filtered_lines.insert(0, "hycg,#genre#")
         
         # 保存结果
-        output_path = os.path.join(self.tmp_dir, output_file)
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write('\n'.join(filtered_lines))
-            
-        print(f"处理完成，结果已保存到: {output_path}")
+        if write_if_changed(output_path, '\n'.join(filtered_lines)):
+            print(f"处理完成，结果已保存到: {output_path}")
+        else:
+            print(f"处理完成，内容未变化: {output_path}")
 
-if __name__ == "__main__":
+
+def main():
     # 示例配置
     urls = [
         "https://raw.githubusercontent.com/bj123sd/hycg/refs/heads/main/tv.txt",
@@ -125,3 +150,7 @@ if __name__ == "__main__":
         exclude_segment_words=exclude_segment_words,
         exclude_line_words=exclude_line_words
     )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+增量输出与探测断点
+OrderedLineWriter 按原始顺序增量写出：某行自身及其之前所有行的判定都已知时立即写出并刷新，
+运行中途被终止也能留下一个有效的前缀文件（<输出>.part）。
+ProbeCheckpoint 把每个探测结果追加到断点文件，被终止的运行重新启动时直接复用未过期的结果，
+不再重复探测已完成的目标；正常完成后删除断点文件。
+write_if_changed 只在内容变化时重写输出文件（先写临时文件再替换，读者不会看到写了一半的文件）。
+"""
+
+import json
+import os
+import time
+
+# 断点结果的有效期（秒），超过后重新探测（环境变量 CHECKPOINT_MAX_AGE 可覆盖，
+# 定时任务应设为大于调度间隔加作业时限，否则下一次运行时断点总已过期）
+try:
+    CHECKPOINT_MAX_AGE = int(os.environ.get("CHECKPOINT_MAX_AGE") or 2 * 3600)
+except ValueError:
+    CHECKPOINT_MAX_AGE = 2 * 3600
+
+_UNDECIDED = object()
+
+
+def write_if_changed(path: str, content: str):
+    """内容与现有文件不同时才写入，返回是否写入"""
+    data = content.encode('utf-8')
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    except OSError:
+        pass
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return True
+
+
+class OrderedLineWriter:
+    def __init__(self, path: str, first_line: str, lines: list):
+        self.path = path
+        self.lines = lines
+        self.decisions = [_UNDECIDED] * len(lines)
+        self.next_index = 0
+        self.written = 0
+        self.file = open(path, 'w', encoding='utf-8')
+        self.file.write(first_line)
+
+    def decide(self, index: int, keep: bool):
+        """记录第 index 行是否保留，并写出所有已可写出的行"""
+        self.decisions[index] = keep
+        self._advance()
+
+    def decide_many(self, indexes, keep: bool):
+        for index in indexes:
+            self.decisions[index] = keep
+        self._advance()
+
+    def _advance(self):
+        start = self.next_index
+        while self.next_index < len(self.lines) and self.decisions[self.next_index] is not _UNDECIDED:
+            if self.decisions[self.next_index]:
+                self.file.write('\n' + self.lines[self.next_index])
+                self.written += 1
+            self.next_index += 1
+        if self.next_index != start:
+            self.file.flush()
+
+    def close(self, keep_undecided: bool = True):
+        """把尚未判定的行按 keep_undecided 处理后关闭文件"""
+        for index in range(self.next_index, len(self.lines)):
+            if self.decisions[index] is _UNDECIDED:
+                self.decisions[index] = keep_undecided
+        self._advance()
+        self.file.close()
+
+    def discard(self):
+        """正常完成后删除中间文件"""
+        if not self.file.closed:
+            self.file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class ProbeCheckpoint:
+    def __init__(self, path: str):
+        self.path = path
+        self.results = self._load()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def _load(self):
+        """读取未过期的断点结果，忽略被截断的最后一行"""
+        results = {}
+        cutoff = time.time() - CHECKPOINT_MAX_AGE
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if record.get("t", 0) >= cutoff:
+                        results[record["key"]] = record["result"]
+        except OSError:
+            pass
+        return results
+
+    def record(self, key: str, result):
+        self.results[key] = result
+        self.file.write(json.dumps({"key": key, "result": result, "t": time.time()}, ensure_ascii=False) + '\n')
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+    def clear(self):
+        """运行正常完成后删除断点文件"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
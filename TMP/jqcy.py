@@ -1,13 +1,27 @@
-import requests
+import http_client
+from source_health import SourceHealth
+from run_deadline import RunDeadline
+from url_index import claim_lines
+from host_blocklist import drop_blocked
+from incremental_output import write_if_changed
+from profiling import profiled
+from canonical import canonical_order
 
+@profiled("run")
 def fetch_and_save():
+    import requests
     url = "http://nas.jqcykj.com:88"
     output_file = "jqcy.txt"
     
+    health = SourceHealth()
+    if not health.admit(url):
+        return
+    
     try:
         # 获取原始字节数据
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
+        with health.guard(url):
+            response = http_client.fetch(url, timeout=RunDeadline().clamp_timeout(health.timeout_for(url, 10)))
+            response.raise_for_status()
         
         # ---------- 智能编码检测 ----------
         # 1. 优先使用 requests 基于 chardet 的 apparent_encoding
@@ -27,18 +41,24 @@ def fetch_and_save():
         # 过滤包含 '#genre#' 的行（不区分大小写）
         filtered_lines = [line for line in lines if '#genre#' not in line.lower()]
         
-        # 写入文件（UTF-8 编码以兼容大多数编辑器）
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write("jqcy,#genre#\n")
-            for line in filtered_lines:
-                f.write(line + '\n')
+        # 主机黑名单 + 跨输出去重
+        filtered_lines = drop_blocked(filtered_lines)
+        filtered_lines = claim_lines(output_file, filtered_lines)
+        filtered_lines = canonical_order(filtered_lines)
         
-        print(f"✅ 成功保存到 {output_file}，共写入 {len(filtered_lines) + 1} 行。")
+        # 写入文件（UTF-8 编码以兼容大多数编辑器）
+        if write_if_changed(output_file, "jqcy,#genre#\n" + "".join(line + '\n' for line in filtered_lines)):
+            print(f"✅ 成功保存到 {output_file}，共写入 {len(filtered_lines) + 1} 行。")
+        else:
+            print(f"✅ 内容未变化，{output_file} 未重写（{len(filtered_lines) + 1} 行）。")
         
     except requests.exceptions.RequestException as e:
         print(f"❌ 网络请求失败: {e}")
     except Exception as e:
         print(f"❌ 发生错误: {e}")
+    finally:
+        health.save()
+        http_client.report()
 
 if __name__ == "__main__":
     fetch_and_save()
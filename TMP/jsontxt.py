@@ -2,15 +2,26 @@
 # -*- coding: utf-8 -*-
 """
 JSON URL解析器 - 从配置的URL获取JSON，提取1080p质量的条目并保存为txt
+HLS 流按实测的主播放列表分辨率过滤并按分辨率、码率排序，无法实测的沿用上游 quality 字段
 """
 
+import contextlib
+import itertools
 import json
 import os
 from pathlib import Path
-from urllib.request import urlopen, Request
-from urllib.error import URLError, HTTPError
 import time
 
+import http_client
+from source_health import SourceHealth
+from run_deadline import RunDeadline, fetch_in_priority_order
+from url_index import claim_lines
+from host_blocklist import drop_blocked
+from incremental_output import write_if_changed
+from profiling import profiled
+from canonical import canonical_order
+from hls_probe import HLSProbeCache, probe_urls, parse_quality, quality_key
+
 
 # ==================== URL配置 ====================
 # 在这里添加或修改JSON数据源的URL
@@ -27,47 +38,55 @@ DEFAULT_OUTPUT = "TMP/jsontxt.txt"
 DEFAULT_QUALITY = "1080p"
 
 
-def fetch_json_from_url(url, timeout=30):
+@profiled("fetch")
+def fetch_json_from_url(url, timeout=30, health=None):
     """
     从URL获取JSON数据
     
     Args:
         url: JSON数据的URL地址
         timeout: 请求超时时间（秒）
+        health: 源健康状态（SourceHealth），为None时不做熔断判断
     
     Returns:
         解析后的JSON数据（列表）
     """
     print(f"  正在获取: {url[:70]}...")
     
-    request = Request(url, headers={'User-Agent': 'Mozilla/5.0'})
+    if health is not None:
+        if not health.admit(url):
+            return []
+        timeout = health.timeout_for(url, timeout)
+    
+    import requests
     
     try:
-        with urlopen(request, timeout=timeout) as response:
-            data = json.loads(response.read().decode('utf-8'))
-            return data if isinstance(data, list) else [data]
-    except HTTPError as e:
-        print(f"    HTTP错误 {e.code}: {e.reason}")
-        return []
-    except URLError as e:
-        print(f"    URL错误: {e.reason}")
-        return []
+        with health.guard(url) if health is not None else contextlib.nullcontext():
+            response = http_client.fetch(url, timeout=timeout)
+            response.raise_for_status()
+            data = json.loads(response.content.decode('utf-8'))
+        return data if isinstance(data, list) else [data]
+    except requests.exceptions.HTTPError as e:
+        print(f"    HTTP错误 {e.response.status_code}: {e.response.reason}")
+    except requests.exceptions.RequestException as e:
+        print(f"    URL错误: {e}")
     except json.JSONDecodeError as e:
         print(f"    JSON解析错误: {e}")
-        return []
     except Exception as e:
         print(f"    未知错误: {e}")
-        return []
+    return []
 
 
-def parse_json_to_txt(urls, output_path, quality_filter='1080p'):
+@profiled("parse")
+def parse_json_to_txt(urls, output_path, quality_filter='1080p', probe=True):
     """
     从多个URL获取JSON并解析为txt格式
     
     Args:
         urls: URL列表
         output_path: 输出txt文件路径
-        quality_filter: 质量过滤条件（默认1080p）
+        quality_filter: 质量过滤条件（默认1080p），实测时表示最低分辨率高度
+        probe: 是否探测 HLS 主播放列表，按实测分辨率过滤和排序
     
     Returns:
         过滤后的条目数和总条目数
@@ -78,32 +97,72 @@ def parse_json_to_txt(urls, output_path, quality_filter='1080p'):
     output_dir = Path(output_path).parent
     output_dir.mkdir(parents=True, exist_ok=True)
     
-    # 从每个URL获取数据
-    for i, url in enumerate(urls, 1):
-        print(f"[{i}/{len(urls)}] 获取JSON数据...")
-        data = fetch_json_from_url(url)
+    # 从每个URL获取数据（熔断中的源排在最后，临近运行时限时跳过）
+    health = SourceHealth()
+    deadline = RunDeadline()
+    fetched = itertools.count(1)  # 按实际抓取顺序编号
+
+    def fetch(url):
+        print(f"[{next(fetched)}/{len(urls)}] 获取JSON数据...")
+        data = fetch_json_from_url(url, timeout=deadline.clamp_timeout(30), health=health)
         if data:
-            all_items.extend(data)
             print(f"    成功获取 {len(data)} 条")
         time.sleep(0.3)  # 避免请求过快
+        return data
+
+    for data in fetch_in_priority_order(urls, fetch, health, deadline):
+        all_items.extend(data)
+    health.save()
+    http_client.report()
     
     print(f"\n总共获取 {len(all_items)} 条数据，开始过滤 {quality_filter}...")
     
-    # 过滤并写入txt文件
-    count = 0
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write("未整理,#genre#\n")
-        for item in all_items:
-            title = item.get('title', '')
-            url = item.get('url', '')
-            quality = item.get('quality', '')
-            
-            # 只保留指定质量的内容
-            if quality == quality_filter and title and url:
-                f.write(f"{title},{url}\n")
-                count += 1
-    
-    return count, len(all_items)
+    candidates = [(item.get('title', ''), item.get('url', ''), item.get('quality', '')) for item in all_items]
+    candidates = [(title, url, quality) for title, url, quality in candidates if title and url]
+    
+    # 实测 HLS 主播放列表的分辨率和码率（带缓存）
+    min_height = parse_quality(quality_filter) if probe else None
+    measured = {}
+    if min_height is not None:
+        cache = HLSProbeCache()
+        measured, stats = probe_urls([url for _, url, _ in candidates], cache, deadline)
+        cache.save()
+        print(f"HLS探测: 新探测 {stats['probed']} 条（{stats['unmeasured']} 条超时或暂时性错误，按未测量处理），"
+              f"缓存命中 {stats['cached']} 条，耗时 {stats['seconds']:.1f}s")
+    
+    # 过滤：有实测分辨率的按实测结果，确定不可用的丢弃，其余（含超时等未测量的）沿用上游 quality 字段
+    ranked = []
+    dead = 0
+    for position, (title, url, quality) in enumerate(candidates):
+        result = measured.get(url)
+        if result is not None and not result.get("ok"):
+            dead += 1
+            continue
+        if result is not None and result.get("height"):
+            keep = result["height"] >= min_height
+        else:
+            keep = quality == quality_filter
+        if keep:
+            ranked.append((quality_key(result), position, f"{title},{url}"))
+    if measured:
+        print(f"实测过滤: {dead} 条不可用，{sum(1 for r in measured.values() if r.get('height'))} 条有实测分辨率")
+    
+    # 排序：实测分辨率、码率从高到低，相同时保持原顺序
+    ranked.sort(key=lambda entry: (-entry[0][0], -entry[0][1], entry[1]))
+    lines = [line for _, _, line in ranked]
+    
+    # 主机黑名单 + 跨输出去重
+    lines = drop_blocked(lines)
+    lines = claim_lines(Path(output_path).as_posix(), lines)
+    
+    # 规范顺序（启用时）：按频道名排列，同名的实测分辨率、码率高的在前
+    ranks = {line: (-height, -bandwidth) for (height, bandwidth), _, line in ranked}
+    lines = canonical_order(lines, rank=lambda line: ranks.get(line, (0, 0)))
+    
+    # 写入txt文件
+    write_if_changed(output_path, "未整理,#genre#\n" + "".join(line + "\n" for line in lines))
+    
+    return len(lines), len(all_items)
 
 
 def main():
@@ -113,6 +172,7 @@ def main():
     parser = argparse.ArgumentParser(description='从配置URL获取JSON并解析为txt（仅保留1080p）')
     parser.add_argument('-o', '--output', default=DEFAULT_OUTPUT, help=f'输出txt文件路径（默认: {DEFAULT_OUTPUT}）')
     parser.add_argument('-q', '--quality', default=DEFAULT_QUALITY, help=f'质量过滤条件（默认: {DEFAULT_QUALITY}）')
+    parser.add_argument('--no-probe', action='store_true', help='不探测HLS主播放列表，只按上游 quality 字段过滤')
     
     args = parser.parse_args()
     
@@ -131,7 +191,7 @@ def main():
     print(f"="*60 + "\n")
     
     try:
-        count, total = parse_json_to_txt(urls, args.output, args.quality)
+        count, total = parse_json_to_txt(urls, args.output, args.quality, probe=not args.no_probe)
         print(f"\n" + "="*60)
         print(f"解析完成！")
         print(f"  - 总获取数据: {total} 条")
@@ -0,0 +1,209 @@
+"""
+多进程分块过滤（大输入的列式过滤见 columnar_filter.py，由 batch_filter 按输入规模选择）
+与 TVSourceProcessor.remove_excluded_sections + remove_genre_lines_and_deduplicate 等价的并行实现：
+输入按分区切块（切点尽量落在 #genre# 行上，否则把切点前最近一个分区的排除状态传给子进程），
+各块在进程池中完成分区排除、genre行删除、内容关键词过滤和块内去重，
+最后按块顺序合并去重集合，保留首次出现的行，输出与串行路径完全一致。
+"""
+
+import os
+import re
+
+from profiling import profiled
+
+# 输入行数达到该值才启用并行过滤
+PARALLEL_MIN_LINES = 200000
+
+# 并行进程数，环境变量 FILTER_WORKERS 可覆盖（1 表示禁用并行）
+try:
+    FILTER_WORKERS = int(os.environ.get("FILTER_WORKERS") or 0) or (os.cpu_count() or 1)
+except ValueError:
+    FILTER_WORKERS = os.cpu_count() or 1
+
+# 安装了 pyarrow 时，输入行数达到该值启用列式过滤（见 columnar_filter.py）
+COLUMNAR_MIN_LINES = 50000
+
+# 批量过滤引擎，环境变量 FILTER_ENGINE 可指定：
+# auto（默认，多核且行数达到 PARALLEL_MIN_LINES 用多进程，否则有 pyarrow 时用列式）、columnar、process
+FILTER_ENGINE = os.environ.get("FILTER_ENGINE", "auto").lower()
+
+URL_PATTERN = re.compile(r'(https?://[^\s,]+)')
+
+
+def should_parallelize(line_count: int):
+    return FILTER_WORKERS > 1 and line_count >= PARALLEL_MIN_LINES
+
+
+def _has_module(name: str):
+    import importlib.util
+    return importlib.util.find_spec(name) is not None
+
+
+def batch_engine(line_count: int):
+    """大输入使用的批量过滤引擎："columnar"、"process"，或 None（逐行过滤）"""
+    if FILTER_ENGINE == "columnar":
+        # 强制列式时没有 pyarrow 也可以用 NumPy 内核
+        return "columnar" if _has_module("numpy") else None
+    if should_parallelize(line_count):
+        return "process"
+    if FILTER_ENGINE == "auto" and line_count >= COLUMNAR_MIN_LINES and _has_module("pyarrow") and _has_module("numpy"):
+        return "columnar"
+    return None
+
+
+def filter_chunk(lines, exclude_keywords, content_keywords, excluded=False, blocklist=None):
+    """
+    过滤一段连续的行
+
+    Args:
+        lines: 行列表
+        exclude_keywords: 分区排除关键词
+        content_keywords: 内容过滤关键词（需已转小写）
+        excluded: 该段开始时是否处于被排除的分区
+        blocklist: HostBlocklist，URL主机被屏蔽的行计入内容过滤
+
+    Returns:
+        (entries, kept, filtered_count)：entries 为块内去重后的 (url或None, 行) 列表，
+        kept 为分区排除后保留的行数，filtered_count 为被内容关键词或主机黑名单过滤的行数
+    """
+    entries = []
+    seen_urls = set()
+    kept = 0
+    filtered_count = 0
+    search = URL_PATTERN.search
+    for line in lines:
+        if "#genre#" in line:
+            excluded = any(keyword in line for keyword in exclude_keywords)
+            if not excluded:
+                kept += 1
+            continue
+        if excluded:
+            continue
+        kept += 1
+        if not line.strip():
+            continue
+        if content_keywords:
+            line_lower = line.lower()
+            if any(keyword in line_lower for keyword in content_keywords):
+                filtered_count += 1
+                continue
+        if blocklist is not None and blocklist.blocks_line(line):
+            filtered_count += 1
+            continue
+        url_match = search(line)
+        if url_match:
+            url = url_match.group(1)
+            if url in seen_urls:
+                continue
+            seen_urls.add(url)
+            entries.append((url, line))
+        else:
+            entries.append((None, line))
+    return entries, kept, filtered_count
+
+
+def _filter_chunk_task(args):
+    """子进程入口：块以单个字符串传入，减少进程间序列化开销"""
+    text, exclude_keywords, content_keywords, excluded, blocklist = args
+    entries, kept, filtered_count = filter_chunk(text.split("\n"), exclude_keywords, content_keywords, excluded, blocklist)
+    return [url for url, _ in entries], "\n".join(line for _, line in entries), kept, filtered_count
+
+
+def split_chunks(lines, chunk_size: int):
+    """切分为 (起, 止) 区间，切点优先取 chunk_size 之后最近的 #genre# 行"""
+    bounds = [0]
+    pos = chunk_size
+    while pos < len(lines):
+        cut = pos
+        limit = min(len(lines), pos + chunk_size)
+        while cut < limit and "#genre#" not in lines[cut]:
+            cut += 1
+        if cut >= limit:
+            # 超大分区内找不到 genre 行，直接切开
+            cut = pos
+        bounds.append(cut)
+        pos = cut + chunk_size
+    bounds.append(len(lines))
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1) if bounds[i] < bounds[i + 1]]
+
+
+def _excluded_before(lines, start: int, exclude_keywords, excluded=False):
+    """位置 start 之前最近一个 genre 行决定的排除状态，之前没有 genre 行时为 excluded"""
+    for i in range(start - 1, -1, -1):
+        if "#genre#" in lines[i]:
+            return any(keyword in lines[i] for keyword in exclude_keywords)
+    return excluded
+
+
+def merge_entries(chunk_entries):
+    """按块顺序合并，保留每个URL首次出现的行"""
+    result = []
+    seen_urls = set()
+    for entries in chunk_entries:
+        for url, line in entries:
+            if url is None:
+                result.append(line)
+            elif url not in seen_urls:
+                seen_urls.add(url)
+                result.append(line)
+    return result
+
+
+def parallel_chunks(lines, exclude_keywords, content_keywords, excluded=False, blocklist=None, workers: int = None):
+    """
+    多进程分块过滤（content_keywords 需已转小写）
+
+    Returns:
+        (chunk_entries, kept, filtered_count)：chunk_entries 为各块块内去重后的 (url或None, 行) 列表
+    """
+    # 只有超大输入才走到这里，进程池（multiprocessing）按需导入
+    from concurrent.futures import ProcessPoolExecutor
+    workers = workers or FILTER_WORKERS
+    chunk_size = max(1, -(-len(lines) // (workers * 4)))
+    tasks = [
+        ("\n".join(lines[start:end]), exclude_keywords, content_keywords,
+         _excluded_before(lines, start, exclude_keywords, excluded), blocklist)
+        for start, end in split_chunks(lines, chunk_size)
+    ]
+    print(f"并行过滤: {len(lines)} 行，{len(tasks)} 块，{workers} 进程")
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(_filter_chunk_task, tasks))
+
+    chunk_entries = [list(zip(urls, text.split("\n") if urls else [])) for urls, text, _, _ in results]
+    return chunk_entries, sum(kept for _, _, kept, _ in results), sum(count for _, _, _, count in results)
+
+
+@profiled("parallel_filter")
+def parallel_filter(lines, exclude_keywords, content_keywords=None, workers: int = None, blocklist=None):
+    """并行执行分区排除 + 去重，返回最终行列表"""
+    content_keywords = [keyword.lower() for keyword in (content_keywords or [])]
+    chunk_entries, kept, filtered_count = parallel_chunks(lines, exclude_keywords, content_keywords,
+                                                          blocklist=blocklist, workers=workers)
+    result = merge_entries(chunk_entries)
+    print(f"排除后: {kept} 行")
+    if content_keywords or blocklist is not None:
+        print(f"内容过滤: {filtered_count} 行被过滤")
+    print(f"去重后: {len(result)} 行")
+    return result
+
+
+@profiled("columnar_filter")
+def columnar_filter(lines, exclude_keywords, content_keywords=None, blocklist=None):
+    """列式执行分区排除 + 去重，返回最终行列表"""
+    from columnar_filter import filter_lines, pa
+    content_keywords = [keyword.lower() for keyword in (content_keywords or [])]
+    print(f"列式过滤: {len(lines)} 行（{'pyarrow' if pa is not None else 'NumPy'}）")
+    result, kept, filtered_count = filter_lines(lines, exclude_keywords, content_keywords, False, blocklist)
+    print(f"排除后: {kept} 行")
+    if content_keywords or blocklist is not None:
+        print(f"内容过滤: {filtered_count} 行被过滤")
+    print(f"去重后: {len(result)} 行")
+    return result
+
+
+def batch_filter(lines, exclude_keywords, content_keywords=None, blocklist=None):
+    """按 batch_engine 选择列式或多进程过滤，结果与串行路径一致"""
+    if batch_engine(len(lines)) == "columnar":
+        return columnar_filter(lines, exclude_keywords, content_keywords, blocklist)
+    return parallel_filter(lines, exclude_keywords, content_keywords, blocklist=blocklist)
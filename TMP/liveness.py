@@ -0,0 +1,63 @@
+"""
+端点存活状态缓存（常驻模式）
+常驻进程中连续多轮探测同一批端点，多数端点的状态长期不变。这里按端点记录最近一次判定和
+连续相同判定的次数：状态越稳定，复用判定的时间越长（最短间隔 × 2^(连续次数-1)，有上限）；
+新端点和状态刚翻转的端点连续次数为 0，每一轮都重新探测。
+只在常驻模式下启用（enable），单次运行的脚本照常探测全部端点。
+"""
+
+import time
+
+# 复用判定的最短间隔（秒）
+MIN_REPROBE_INTERVAL = 600
+
+# 复用判定的最长间隔（秒）
+MAX_REPROBE_INTERVAL = 6 * 3600
+
+_cache = None
+
+
+class LivenessCache:
+    def __init__(self):
+        self.entries = {}  # {端点: {"ok": 判定, "failed": 不可用路径, "checked": 探测时间, "streak": 连续相同判定次数}}
+
+    def interval(self, key: str):
+        entry = self.entries.get(key)
+        if entry is None or entry["streak"] == 0:
+            return 0
+        return min(MAX_REPROBE_INTERVAL, MIN_REPROBE_INTERVAL * 2 ** (entry["streak"] - 1))
+
+    def fresh(self, key: str, now: float = None):
+        """判定仍在复用期内时返回 (ok, failed)，否则返回 None"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        now = time.time() if now is None else now
+        if now - entry["checked"] >= self.interval(key):
+            return None
+        return entry["ok"], entry["failed"]
+
+    def record(self, key: str, ok: bool, failed):
+        entry = self.entries.get(key)
+        if entry is not None and entry["ok"] == ok:
+            streak = entry["streak"] + 1
+        else:
+            streak = 0
+        self.entries[key] = {"ok": ok, "failed": list(failed), "checked": time.time(), "streak": streak}
+
+    def volatile_count(self):
+        """新端点或刚发生状态翻转（连续次数为 0）的端点数"""
+        return sum(1 for entry in self.entries.values() if entry["streak"] == 0)
+
+
+def enable():
+    """启用进程内的存活状态缓存（常驻模式调用）"""
+    global _cache
+    if _cache is None:
+        _cache = LivenessCache()
+    return _cache
+
+
+def get_cache():
+    """常驻模式下返回缓存，否则返回 None"""
+    return _cache
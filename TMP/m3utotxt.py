@@ -1,7 +1,17 @@
-import requests
 from urllib.parse import urlparse
+import http_client
+from source_health import SourceHealth
+from run_deadline import RunDeadline, source_priority
+from url_index import claim_lines
+from host_blocklist import build_blocklist
+from incremental_output import write_if_changed
+from profiling import profiled
+from canonical import canonical_order
+import shards
+import epg
 
-def convert_m3u_to_txt(urls, exclude_chars=None, output_file="TMP/temp.txt"):
+@profiled("convert")
+def convert_m3u_to_txt(urls, exclude_chars=None, output_file="TMP/temp.txt", blocked_hosts=None):
     """
     将指定URL列表中的M3U内容转换为TXT格式并保存到文件
     
@@ -9,21 +19,36 @@ def convert_m3u_to_txt(urls, exclude_chars=None, output_file="TMP/temp.txt"):
         urls (list): M3U文件的URL列表
         exclude_chars (list): 需要排除的字符列表，包含这些字符的行会被过滤掉
         output_file (str): 输出文件路径，默认为"TMP/hw.txt"
+        blocked_hosts (list): 需要屏蔽的URL主机（域名含子域名，IP/CIDR），在共用黑名单基础上追加
     """
     output = []
     group_set = set()
+    line_groups = {}  # {频道行: 分组名}，用于分片输出（同一分组的频道可能不相邻）
+    line_tvg = {}  # {频道行: (tvg-id, tvg-name)}，用于节目单
+    epg_sources = []  # M3U 头部声明的节目单地址
     
     # 默认排除字符为空列表
     if exclude_chars is None:
         exclude_chars = []
+    blocklist = build_blocklist(blocked_hosts or [])
+    
+    health = SourceHealth()
+    deadline = RunDeadline()
     
     for url in urls:
+        if not health.admit(url):
+            continue
+        if not deadline.allows(source_priority(health, url)):
+            print(f"跳过(临近运行时限): {url}")
+            continue
         try:
             # 获取M3U文件内容
-            response = requests.get(url)
-            response.raise_for_status()  # 检查请求是否成功
-            content = response.text
+            with health.guard(url):
+                response = http_client.fetch(url, timeout=deadline.clamp_timeout(health.timeout_for(url, 30)))
+                response.raise_for_status()  # 检查请求是否成功
+                content = response.text
             lines = content.split('\n')
+            epg_sources.extend(epg.tvg_urls(content))
             
             for i in range(len(lines)):
                 line = lines[i].strip()
@@ -33,6 +58,7 @@ def convert_m3u_to_txt(urls, exclude_chars=None, output_file="TMP/temp.txt"):
                     group_match = re.search(r'group-title="([^"]+)"', line)
                     name_start = line.rfind(',') + 1
                     name = line[name_start:] if name_start < len(line) else ""
+                    attrs = epg.extinf_attrs(line)
                     
                     group_name = group_match.group(1) if group_match else '未分类'
                     
@@ -62,25 +88,45 @@ def convert_m3u_to_txt(urls, exclude_chars=None, output_file="TMP/temp.txt"):
                                     url_should_exclude = True
                                     break
                             
+                            if not url_should_exclude and blocklist.blocks_line(next_line):
+                                url_should_exclude = True
+                            
                             if not url_should_exclude:
                                 output.append(f"{name},{next_line}")
+                                line_groups.setdefault(output[-1], group_name)
+                                line_tvg.setdefault(output[-1], (attrs.get('tvg-id', ''), attrs.get('tvg-name', '')))
                             i += 1  # 跳过已处理的URL行
                             
         except Exception as e:
             print(f"处理URL {url} 时出错: {e}")
+    health.save()
+    http_client.report()
+    
+    # 跨输出去重
+    output = claim_lines(output_file, output)
     
-    # 确保输出目录存在
-    import os
-    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    # 规范顺序（启用时）：分组按首次出现顺序，组内按频道名
+    output = canonical_order(output)
     
-    # 写入文件
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write('\n'.join(output))
+    # 写入文件（内容未变化时不重写，目录不存在时自动创建）
+    if write_if_changed(output_file, '\n'.join(output)):
+        print(f"转换完成，结果已保存到 {output_file}")
+    else:
+        print(f"转换完成，内容未变化: {output_file}")
     
-    print(f"转换完成，结果已保存到 {output_file}")
+    # 节目单（启用时）：只保留输出中的频道
+    epg.build_for_output(output_file, [(line.split(',', 1)[0], *line_tvg.get(line, ('', '')))
+                                       for line in output if "#genre#" not in line], epg_sources)
+    if shards.enabled():
+        grouped = {}
+        for line in output:
+            if "#genre#" not in line:
+                grouped.setdefault(line_groups.get(line, '未分类'), []).append(line)
+        shards.write_shards(output_file, list(grouped.items()))
+
 
 # 示例用法
-if __name__ == "__main__":
+def main():
     # 替换为你需要处理的M3U URL列表
     m3u_urls = [
         #"https://raw.githubusercontent.com/xJEYDAin/iptv-scraper/refs/heads/master/output/all_merged.m3u", 
@@ -92,6 +138,14 @@ if __name__ == "__main__":
     ]
     
     # 需要排除的字符列表
-    exclude_chars = ["wns.live","cloudfront.net","stevosure123","visionplus.id","google","ads.deviceid"]
+    exclude_chars = ["stevosure123","ads.deviceid"]
     
-    convert_m3u_to_txt(m3u_urls, exclude_chars)
+    # 需要屏蔽的URL主机（按域名后缀匹配，不会误伤名称中含有这些词的频道）
+    blocked_hosts = ["wns.live","cloudfront.net","visionplus.id",
+                     "google.com","googlevideo.com","googleapis.com","googleusercontent.com"]
+    
+    convert_m3u_to_txt(m3u_urls, exclude_chars, blocked_hosts=blocked_hosts)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,16 @@
-import requests
 import os
 import sys
+import http_client
+from source_health import SourceHealth
+from run_deadline import RunDeadline, fetch_in_priority_order
+from url_index import claim_lines
+from line_filter import batch_engine, batch_filter
+import stage_cache
+from host_blocklist import build_blocklist
+from incremental_output import write_if_changed
+from shards import write_grouped_output
+from profiling import profiled
+from canonical import canonical_order
 
 # 全局排除关键词定义
 EXCLUDE_KEYWORDS = ["成人", "激情", "虎牙", "体育", "熊猫", "提示","记录","解说","春晚","直播","更新","赛事","SPORTS","电视剧","优质个源","明星","主题片","戏曲","游戏","MTV","收音机","悍刀","家人","音乐"]
@@ -8,18 +18,25 @@ EXCLUDE_KEYWORDS = ["成人", "激情", "虎牙", "体育", "熊猫", "提示","
 class TVSourceProcessor:
     def __init__(self):
         self.all_lines = []
+        self.source_lines = []  # 每个源的行，按拼接顺序，用于阶段缓存
+        self.blocklist = build_blocklist()
+        self.health = SourceHealth()
+        self.deadline = RunDeadline()
         
     def fetch_url_content(self, url: str):
         """直接获取URL内容，强制转换为UTF-8"""
+        print(f"获取: {url}")
+        if not self.health.admit(url):
+            return []
         try:
-            print(f"获取: {url}")
             
             # 发送HTTP请求，设置超时和请求头
             headers = {
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
             }
-            response = requests.get(url, headers=headers, timeout=30)
-            response.raise_for_status()
+            with self.health.guard(url):
+                response = http_client.fetch(url, headers=headers, timeout=self.deadline.clamp_timeout(self.health.timeout_for(url, 30)))
+                response.raise_for_status()
             
             # 直接使用原始字节数据，强制转换为UTF-8
             content_bytes = response.content
@@ -55,16 +72,22 @@ class TVSourceProcessor:
             print(f"  失败: {e}")
             return []
 
+    @profiled("fetch")
     def fetch_multiple_urls(self, urls: list):
         """获取多个URL内容"""
         self.all_lines = []
-        for url in urls:
-            lines = self.fetch_url_content(url)
-            if lines:
-                self.all_lines.extend(lines)
+        self.source_lines = []
+        for lines in fetch_in_priority_order(urls, self.fetch_url_content, self.health, self.deadline):
+            self.all_lines.extend(lines)
+            self.source_lines.append(lines)
+        self.health.save()
+        http_client.report()
+        if self.deadline.enabled:
+            print(self.deadline.describe())
         print(f"总计: {len(self.all_lines)} 行")
         return len(self.all_lines) > 0
 
+    @profiled("exclude")
     def remove_excluded_sections(self):
         """排除指定区域"""
         if not self.all_lines:
@@ -83,16 +106,21 @@ class TVSourceProcessor:
         print(f"排除后: {len(result)} 行")
         return result
 
+    @profiled("dedupe")
     def remove_genre_lines_and_deduplicate(self, lines: list):
         """删除genre行并去重"""
         import re
         result = []
         seen_urls = set()
+        blocked_count = 0
         for line in lines:
             if "#genre#" in line:
                 continue
             if not line.strip():
                 continue
+            if self.blocklist.blocks_line(line):
+                blocked_count += 1
+                continue
             # 提取URL去重
             url_match = re.search(r'(https?://[^\s,]+)', line)
             if url_match:
@@ -102,9 +130,12 @@ class TVSourceProcessor:
                     result.append(line)
             else:
                 result.append(line)
+        if blocked_count:
+            print(f"主机屏蔽: {blocked_count} 行被过滤")
         print(f"去重后: {len(result)} 行")
         return result
 
+    @profiled("save")
     def save_to_file(self, lines: list, filename: str, first_line: str):
         """强制使用UTF-8编码保存到文件"""
         try:
@@ -123,11 +154,10 @@ class TVSourceProcessor:
                     str_lines.append(str(line))
             
             # 使用UTF-8编码保存
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write('\n'.join(str_lines))
+            changed = write_if_changed(filename, '\n'.join(str_lines))
             
             file_size = os.path.getsize(filename)
-            print(f"保存: {filename} ({len(str_lines)}行, {file_size}字节)")
+            print(f"保存: {filename} ({len(str_lines)}行, {file_size}字节{'' if changed else '，内容未变化，未重写'})")
             print(f"编码: UTF-8")
             return True
         except Exception as e:
@@ -148,20 +178,33 @@ class TVSourceProcessor:
             print("无内容可处理")
             return False
         
-        # 2. 排除处理
-        filtered = self.remove_excluded_sections()
-        if not filtered:
-            print("排除后无内容")
-            return False
+        # 未变化的源复用缓存的过滤结果；大输入使用列式或多进程批量过滤，结果与串行路径一致
+        if stage_cache.enabled():
+            final = stage_cache.filter_sources(self.source_lines, EXCLUDE_KEYWORDS, [], blocklist=self.blocklist)
+        elif batch_engine(len(self.all_lines)):
+            final = batch_filter(self.all_lines, EXCLUDE_KEYWORDS, [], blocklist=self.blocklist)
+        else:
+            # 2. 排除处理
+            filtered = self.remove_excluded_sections()
+            if not filtered:
+                print("排除后无内容")
+                return False
         
-        # 3. 去重处理
-        final = self.remove_genre_lines_and_deduplicate(filtered)
+            # 3. 去重处理
+            final = self.remove_genre_lines_and_deduplicate(filtered)
         if not final:
             print("去重后无内容")
             return False
         
-        # 4. 保存文件
+        # 4. 跨输出去重
+        final = claim_lines("my1.txt", final)
+        
+        # 5. 保存文件
+        # 规范顺序（启用时），上游调整行序不改变输出
+        final = canonical_order(final)
+
         if self.save_to_file(final, "my1.txt", "hacktool,#genre#"):
+            write_grouped_output("my1.txt", self.all_lines, final, "hacktool")
             print("处理完成")
             return True
         else:
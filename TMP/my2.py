@@ -4,14 +4,24 @@
 TVBox M3U直播源获取工具（Cloudflare绕过版）
 优化版：按分组名过滤整个分组，最后统一放在mengyxx分组下
 """
+import contextlib
 import re
+import sys
 import time
+from urllib.parse import urlparse
 
-try:
-    import cloudscraper
-except ImportError:
-    print("安装 cloudscraper: pip install cloudscraper")
-    exit(1)
+import http_client
+from clearance_store import ClearanceStore
+from source_health import FetchAttempt, SourceHealth
+from url_index import claim_lines
+from host_blocklist import drop_blocked
+from incremental_output import write_if_changed
+from profiling import profiled
+from canonical import canonical_order
+import shards
+import epg
+import snapshots
+from run_deadline import RunDeadline, schedule, source_priority
 
 # ==================== 配置 ====================
 API_URLS = [
@@ -25,8 +35,13 @@ FIXED_GROUP = "mengyxx,#genre#"  # 最终固定分组名称
 
 
 def create_scraper():
-    """创建Cloudflare绕过的scraper"""
-    return cloudscraper.create_scraper(
+    """创建Cloudflare绕过的scraper（保留其 TLS 适配器，只调整连接池大小），cloudscraper 在首次使用时导入"""
+    try:
+        import cloudscraper
+    except ImportError:
+        print("安装 cloudscraper: pip install cloudscraper")
+        sys.exit(1)
+    scraper = cloudscraper.create_scraper(
         browser={
             'browser': 'chrome',
             'platform': 'windows',
@@ -34,43 +49,98 @@ def create_scraper():
         },
         delay=10
     )
+    return http_client.resize_pools(scraper)
 
 
-def fetch_m3u(url):
-    scraper = create_scraper()
-    
-    for attempt in range(MAX_RETRIES):
-        try:
-            print(f"  尝试 {attempt + 1}/{MAX_RETRIES}...")
-            resp = scraper.get(url, timeout=30)
-            text = resp.text.strip()
-            
-            if "Just a moment" in text or "cloudflare" in text.lower():
-                print(f"  ⚠ 仍被Cloudflare拦截，尝试更换指纹...")
-                if attempt < MAX_RETRIES - 1:
-                    time.sleep(5)
-                    scraper = create_scraper()
-                    continue
-            
-            if text.startswith("#EXTM3U") or "#EXTINF" in text[:500]:
-                print(f"  ✓ 成功获取 (大小: {len(text)} 字节)")
-                return text
-            else:
-                print(f"  前100字符: {text[:100]}")
-                return text
+# 按主机复用的scraper，同一主机的多个URL和重试共享cookie与连接
+_SCRAPERS = {}
+
+
+def get_scraper(host, store=None, fresh=False):
+    """获取主机对应的scraper，fresh=True 时丢弃旧会话（需要重新求解挑战）"""
+    if fresh or host not in _SCRAPERS:
+        scraper = create_scraper()
+        if store is not None and not fresh and store.apply(scraper, host):
+            print(f"  复用已保存的Cloudflare凭证: {host}")
+        _SCRAPERS[host] = scraper
+    return _SCRAPERS[host]
+
+
+@profiled("fetch")
+def fetch_m3u(url, health=None, deadline=None, store=None):
+    if health is not None and not health.admit(url):
+        return None
+    
+    # 熔断后的半开探测只尝试一次，不做重试等待
+    probing = health is not None and health.is_open(url)
+    # 回放快照时只读取一次录制的内容
+    retries = 1 if probing or snapshots.replaying() else MAX_RETRIES
+    timeout = health.timeout_for(url, 30) if health is not None else 30
+    deadline = deadline or RunDeadline(0)
+    
+    host = urlparse(url).hostname or url
+    replaying = snapshots.replaying()
+    scraper = None if replaying else get_scraper(host, store)
+    using_stored = not replaying and store is not None and store.get(host) is not None
+    
+    with health.guard(url) if health is not None else contextlib.nullcontext(FetchAttempt()) as outcome:
+        for attempt in range(retries):
+            try:
+                print(f"  尝试 {attempt + 1}/{retries}...")
+                if replaying:
+                    resp = snapshots.replay_response(url)
+                else:
+                    resp = scraper.get(http_client.resolve_url(url), timeout=deadline.clamp_timeout(timeout))
+                    snapshots.record_response(url, resp, kind="cloudflare")
+                http_client.record_transfer(url, resp)
+                text = resp.text.strip()
                 
-        except Exception as e:
-            print(f"  ✗ 请求失败: {e}")
-            if attempt < MAX_RETRIES - 1:
-                time.sleep(3)
-                continue
-            return None
+                blocked = "Just a moment" in text or "cloudflare" in text.lower()
+                if blocked and using_stored:
+                    # 已保存的凭证失效：立即重新求解，不等待
+                    print(f"  ⚠ 已保存的Cloudflare凭证被拒绝，重新求解挑战...")
+                    store.invalidate(host)
+                    using_stored = False
+                    scraper = get_scraper(host, store, fresh=True)
+                    if attempt < retries - 1:
+                        continue
+                elif blocked:
+                    print(f"  ⚠ 仍被Cloudflare拦截，尝试更换指纹...")
+                    if attempt < retries - 1 and deadline.allows():
+                        time.sleep(5)
+                        scraper = get_scraper(host, store, fresh=True)
+                        continue
+                if blocked:
+                    outcome.fail()
+                    return None
+                
+                # 非挑战页的错误状态码按请求失败处理（重试）
+                resp.raise_for_status()
+                if store is not None and not replaying:
+                    store.update(scraper, host)
+                
+                if text.startswith("#EXTM3U") or "#EXTINF" in text[:500]:
+                    print(f"  ✓ 成功获取 (大小: {len(text)} 字节)")
+                    return text
+                # 200 但不是 M3U（错误页、空内容）同样记为失败
+                print(f"  ✗ 返回内容不是M3U，前100字符: {text[:100]}")
+                outcome.fail()
+                return None
+                    
+            except Exception as e:
+                print(f"  ✗ 请求失败: {e}")
+                if attempt < retries - 1 and deadline.allows():
+                    time.sleep(3)
+                    continue
+                outcome.fail()
+                return None
     
     return None
 
 
-def parse_m3u_with_groups(m3u_content):
-    """解析M3U，保留分组信息用于后续过滤"""
+@profiled("parse")
+def parse_m3u_with_groups(m3u_content, tvg=None):
+    """解析M3U，保留分组信息用于后续过滤；传入 tvg 字典时记录 {频道行: (tvg-id, tvg-name)}，用于节目单"""
     if not m3u_content:
         return [], {}
     
@@ -78,6 +148,7 @@ def parse_m3u_with_groups(m3u_content):
     channels_by_group = {}  # {分组名: [频道列表]}
     current_group = "其他"
     current_name = None
+    current_tvg = ("", "")
     all_groups = []
     
     for line in lines:
@@ -92,6 +163,8 @@ def parse_m3u_with_groups(m3u_content):
             match = re.search(r',([^,]+)$', line)
             if match:
                 current_name = match.group(1).strip()
+            attrs = epg.extinf_attrs(line)
+            current_tvg = (attrs.get("tvg-id", ""), attrs.get("tvg-name", ""))
             group_match = re.search(r'group-title="([^"]*)"', line)
             if group_match:
                 current_group = group_match.group(1).strip()
@@ -103,11 +176,14 @@ def parse_m3u_with_groups(m3u_content):
             if current_group not in channels_by_group:
                 channels_by_group[current_group] = []
             channels_by_group[current_group].append(f"{current_name},{line}")
+            if tvg is not None:
+                tvg.setdefault(channels_by_group[current_group][-1], current_tvg)
             current_name = None
     
     return all_groups, channels_by_group
 
 
+@profiled("filter")
 def filter_groups(channels_by_group, exclude_keywords):
     """按分组名过滤整个分组"""
     filtered = {}
@@ -129,17 +205,27 @@ def main():
     print("=" * 50)
     
     all_channels = []
+    channel_groups = {}  # {频道行: 分组名}，用于分片输出
+    channel_tvg = {}  # {频道行: (tvg-id, tvg-name)}，用于节目单
+    epg_sources = []  # M3U 头部声明的节目单地址
+    health = SourceHealth()
+    deadline = RunDeadline()
+    store = ClearanceStore()
     
-    for url in API_URLS:
+    for _, url in schedule(API_URLS, lambda u: source_priority(health, u)):
         print(f"\n正在处理: {url}")
-        m3u = fetch_m3u(url)
+        if not deadline.allows(source_priority(health, url)):
+            print("  跳过(临近运行时限)")
+            continue
+        m3u = fetch_m3u(url, health, deadline, store)
         
         if not m3u:
             print("  ✗ 获取失败，跳过")
             continue
         
         print("  ↳ 解析分组信息...")
-        all_groups, channels_by_group = parse_m3u_with_groups(m3u)
+        all_groups, channels_by_group = parse_m3u_with_groups(m3u, channel_tvg)
+        epg_sources.extend(epg.tvg_urls(m3u))
         print(f"  ↳ 发现 {len(all_groups)} 个分组，共 {sum(len(v) for v in channels_by_group.values())} 个频道")
         
         # 按分组名过滤
@@ -153,8 +239,13 @@ def main():
         # 收集所有保留的频道
         for group_name, channels in filtered_channels.items():
             all_channels.extend(channels)
+            for channel in channels:
+                channel_groups.setdefault(channel, group_name)
         
         print(f"  ↳ 保留 {len(filtered_channels)} 个分组，{len(all_channels)} 个频道")
+    health.save()
+    store.save()
+    http_client.report()
     
     if not all_channels:
         print("\n❌ 未获取到任何有效内容，退出")
@@ -167,14 +258,29 @@ def main():
     if dedup_count > 0:
         print(f"\n  已去除 {dedup_count} 个重复频道")
     
+    # 主机黑名单 + 跨输出去重
+    unique_channels = drop_blocked(unique_channels)
+    unique_channels = claim_lines(OUTPUT_FILE, unique_channels)
+    
+    # 规范顺序（启用时）：按来源分组归类，组内按频道名
+    unique_channels = canonical_order(unique_channels, group_of=lambda channel: channel_groups.get(channel, "其他"))
+    
     # 添加固定分组在第一行
     final_content = FIXED_GROUP + "\n" + "\n".join(unique_channels)
     
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        f.write(final_content)
+    changed = write_if_changed(OUTPUT_FILE, final_content)
+    if shards.enabled():
+        grouped = {}
+        for channel in unique_channels:
+            grouped.setdefault(channel_groups.get(channel, "其他"), []).append(channel)
+        shards.write_shards(OUTPUT_FILE, list(grouped.items()))
+    
+    # 节目单（启用时）：只保留输出中的频道
+    epg.build_for_output(OUTPUT_FILE, [(channel.split(",", 1)[0], *channel_tvg.get(channel, ("", "")))
+                                       for channel in unique_channels], epg_sources)
     
     print("\n" + "=" * 50)
-    print(f"✅ 完成！已保存到 {OUTPUT_FILE}")
+    print(f"✅ 完成！已保存到 {OUTPUT_FILE}" if changed else f"✅ 完成！内容未变化，{OUTPUT_FILE} 未重写")
     print(f"  最终频道数: {len(unique_channels)}")
     print(f"  文件大小: {len(final_content.encode('utf-8'))} 字节")
     print(f"  固定分组: {FIXED_GROUP}")
@@ -0,0 +1,227 @@
+"""
+本地播放列表服务
+python TMP/cli.py serve [--port 端口] [--bind 地址] 在内存中提供生成的播放列表：
+每个文件发布时一次性计算 gzip（以及安装了 brotli 时的 br）压缩版本和强 ETag，
+请求只做查表和协商，客户端带 If-None-Match 轮询时未变化直接返回 304。
+文件内容变化后先在后台构建完整的新条目再整体替换引用，请求要么拿到旧版本要么拿到新版本，
+不会读到写了一半的文件。常驻模式（daemon --serve）在每轮任务完成后立即重新加载，
+单独运行时按修改时间定期检查输出文件。
+"""
+
+import copy
+import gzip
+import hashlib
+import os
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 对外提供的输出文件（相对仓库根目录）
+SERVED_FILES = [
+    "my.txt", "my1.txt", "my2.txt", "my3.txt", "rihou.txt", "zubo.txt", "ttest.txt", "jqcy.txt", "smt.txt",
+]
+
+# 默认监听地址与端口（环境变量 PLAYLIST_PORT 可覆盖端口）；只监听本机，对局域网提供时用 --bind 0.0.0.0
+DEFAULT_BIND = "127.0.0.1"
+try:
+    DEFAULT_PORT = int(os.environ.get("PLAYLIST_PORT", "8080"))
+except ValueError:
+    DEFAULT_PORT = 8080
+
+# 单独运行时检查输出文件是否变化的间隔（秒）
+RELOAD_INTERVAL = 5
+
+# 预压缩级别（只在发布时压缩一次）
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 9
+
+
+def content_digest(data: bytes):
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+class Playlist:
+    """一个文件的快照（内容发布后不再修改）：原文、各压缩版本及对应的强 ETag"""
+
+    def __init__(self, data: bytes, mtime: float):
+        digest = content_digest(data)
+        self.digest = digest
+        self.mtime = mtime
+        self.last_modified = formatdate(mtime, usegmt=True)
+        # {编码: (内容, ETag)}，不同编码的表示使用不同的强 ETag
+        self.variants = {"identity": (data, f'"{digest}"')}
+        self.variants["gzip"] = (gzip.compress(data, GZIP_LEVEL, mtime=0), f'"{digest}-gz"')
+        if brotli is not None:
+            self.variants["br"] = (brotli.compress(data, quality=BROTLI_QUALITY), f'"{digest}-br"')
+        self.etags = {etag for _, etag in self.variants.values()}
+
+    def with_mtime(self, mtime: float):
+        """内容相同、修改时间不同的新快照（共用已压缩的版本，不修改自身）"""
+        playlist = copy.copy(self)
+        playlist.mtime = mtime
+        playlist.last_modified = formatdate(mtime, usegmt=True)
+        return playlist
+
+    def negotiate(self, accept_encoding: str):
+        """按 Accept-Encoding 选择编码：br 优先于 gzip，q=0 视为不接受"""
+        accepted = {}
+        for part in (accept_encoding or "").split(","):
+            name, _, params = part.strip().partition(";")
+            q = 1.0
+            params = params.strip()
+            if params.startswith("q="):
+                try:
+                    q = float(params[2:])
+                except ValueError:
+                    q = 0.0
+            if name:
+                accepted[name.strip().lower()] = q
+        for encoding in ("br", "gzip"):
+            q = accepted.get(encoding, accepted.get("*", 0.0))
+            if encoding in self.variants and q > 0:
+                return encoding
+        return "identity"
+
+    def not_modified(self, if_none_match: str):
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return bool(tags & self.etags)
+
+
+class PlaylistStore:
+    def __init__(self, root: str, files=None):
+        self.root = root
+        self.files = list(files or SERVED_FILES)
+        self.playlists = {}  # {"/文件名": Playlist}，只通过整体替换更新
+        self.lock = threading.Lock()
+
+    def get(self, path: str):
+        return self.playlists.get(path)
+
+    def publish(self, name: str, data: bytes, mtime: float = None):
+        """发布一个文件的新内容：构建完成后整体替换字典引用"""
+        return self._install(name, Playlist(data, time.time() if mtime is None else mtime))
+
+    def _install(self, name: str, playlist: Playlist):
+        with self.lock:
+            playlists = dict(self.playlists)
+            playlists["/" + name] = playlist
+            self.playlists = playlists
+        return playlist
+
+    def reload(self):
+        """重新加载修改时间变化的输出文件，返回更新的文件数"""
+        updated = 0
+        for name in self.files:
+            path = os.path.join(self.root, name)
+            try:
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                continue
+            current = self.playlists.get("/" + name)
+            if current is not None and current.mtime == mtime:
+                continue
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            except OSError:
+                continue
+            # 内容未变（如只是被 touch）时沿用原快照的压缩结果，ETag 不变，只替换修改时间
+            if current is not None and content_digest(data) == current.digest:
+                self._install(name, current.with_mtime(mtime))
+                continue
+            self.publish(name, data, mtime)
+            updated += 1
+        return updated
+
+    def index(self):
+        lines = []
+        for path, playlist in sorted(self.playlists.items()):
+            sizes = ", ".join(f"{encoding} {len(data)}" for encoding, (data, _) in playlist.variants.items())
+            lines.append(f"{path}\t{playlist.variants['identity'][1]}\t{sizes}")
+        return ("\n".join(lines) + "\n").encode('utf-8')
+
+
+def make_handler(store: PlaylistStore):
+    class PlaylistHandler(BaseHTTPRequestHandler):
+        server_version = "PlaylistServer"
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, status: int, headers: dict, body: bytes = b""):
+            self.send_response(status)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.end_headers()
+            if body and self.command != "HEAD":
+                self.wfile.write(body)
+
+        def do_GET(self):
+            path = self.path.split("?", 1)[0]
+            if path == "/":
+                body = store.index()
+                self._send(200, {"Content-Type": "text/plain; charset=utf-8", "Content-Length": str(len(body))}, body)
+                return
+            playlist = store.get(path)
+            if playlist is None:
+                self._send(404, {"Content-Length": "0"})
+                return
+
+            encoding = playlist.negotiate(self.headers.get("Accept-Encoding"))
+            data, etag = playlist.variants[encoding]
+            headers = {
+                "ETag": etag,
+                "Last-Modified": playlist.last_modified,
+                "Cache-Control": "no-cache",
+                "Vary": "Accept-Encoding",
+            }
+            if playlist.not_modified(self.headers.get("If-None-Match")):
+                headers["Content-Length"] = "0"
+                self._send(304, headers)
+                return
+            headers["Content-Type"] = "text/plain; charset=utf-8"
+            headers["Content-Length"] = str(len(data))
+            if encoding != "identity":
+                headers["Content-Encoding"] = encoding
+            self._send(200, headers, data)
+
+        do_HEAD = do_GET
+
+        def log_message(self, format, *args):
+            pass
+
+    return PlaylistHandler
+
+
+def start_server(store: PlaylistStore, bind: str = DEFAULT_BIND, port: int = DEFAULT_PORT):
+    """在后台线程中启动服务，返回 server（调用 shutdown() 停止）"""
+    server = ThreadingHTTPServer((bind, port), make_handler(store))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"播放列表服务: http://{bind}:{server.server_address[1]}/（{len(store.playlists)} 个文件）")
+    return server
+
+
+def serve_forever(root: str, bind: str = DEFAULT_BIND, port: int = DEFAULT_PORT):
+    """单独运行：启动服务并定期重新加载变化的输出文件，Ctrl+C 退出"""
+    store = PlaylistStore(root)
+    store.reload()
+    server = start_server(store, bind, port)
+    try:
+        while True:
+            time.sleep(RELOAD_INTERVAL)
+            updated = store.reload()
+            if updated:
+                print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] 已更新 {updated} 个文件")
+    except KeyboardInterrupt:
+        print("\n停止播放列表服务")
+    finally:
+        server.shutdown()
@@ -0,0 +1,130 @@
+"""
+分层探测计划
+同一主机后面往往挂着几十上百个频道（如 udpxy 的 /udp/239.x 组播路径），逐条检查的代价与频道数成正比。
+这里先按主机分组：主机只做一次TCP探测（由调用方完成），可达的主机只抽样检查少量路径，
+抽样全部通过则认为该主机的其余路径可用，任一抽样失败再升级为逐条检查。
+探测次数因此随主机数而不是频道数增长。
+所有主机的路径检查共用调用方传入的一个执行器，同时进行的路径检查连接总数不超过 PATH_CHECK_WORKERS，
+调用方据此为其预留文件描述符和端口余量；同一主机同时最多 HOST_PATH_CONCURRENCY 条，低于 udpxy 的客户端上限。
+只有明确的 HTTP 错误（4xx）判为不可用；超时（组播加入慢）、连接被拒或断开（服务器客户端已满）、
+5xx、没有数据等无法说明路径不可用，记为未测量，行按未验证保留。
+"""
+
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import http_client
+from run_deadline import PRIORITY_LOW
+
+# 每个主机抽样检查的路径数，0 表示不做路径检查（环境变量 PATH_SAMPLE_SIZE 可覆盖）
+try:
+    PATH_SAMPLE_SIZE = int(os.environ.get("PATH_SAMPLE_SIZE", "3"))
+except ValueError:
+    PATH_SAMPLE_SIZE = 3
+
+# 单条路径检查超时（秒）
+PATH_CHECK_TIMEOUT = 5
+
+# 单条路径检查读取的字节数
+PATH_CHECK_BYTES = 1024
+
+# 路径检查并发数（所有主机合计）
+PATH_CHECK_WORKERS = 16
+
+# 同一主机同时进行的路径检查数：udpxy 默认最多 3 个客户端，至少留一个给正在观看的用户
+HOST_PATH_CONCURRENCY = 2
+
+# 视为暂时性失败的 HTTP 状态码（另外所有 5xx 也是）
+TRANSIENT_STATUS = (408, 429)
+
+
+def sample_paths(urls, size: int):
+    """等间距抽样（首、尾及中间），结果确定，便于复现"""
+    if len(urls) <= size:
+        return list(urls)
+    if size == 1:
+        return [urls[0]]
+    step = (len(urls) - 1) / (size - 1)
+    return [urls[round(i * step)] for i in range(size)]
+
+
+def check_path(url: str, timeout: float = PATH_CHECK_TIMEOUT):
+    """
+    请求路径并读取少量字节：收到数据返回 True，4xx 返回 False，
+    无法判断（非HTTP地址、超时、连接错误、5xx、没有数据）返回 None
+    """
+    if not url.startswith(("http://", "https://")):
+        return None
+    try:
+        response = http_client.get_session().get(url, stream=True, timeout=timeout)
+        try:
+            status = response.status_code
+            if status >= 500 or status in TRANSIENT_STATUS:
+                return None
+            if status >= 400:
+                return False
+            chunk = next(response.iter_content(PATH_CHECK_BYTES), b"")
+            return True if chunk else None
+        finally:
+            response.close()
+    except Exception:
+        return None
+
+
+def _check(url, deadline):
+    """检查单条路径，临近运行时限时不再检查（返回 None）"""
+    if deadline is None:
+        return check_path(url)
+    if not deadline.allows(PRIORITY_LOW):
+        return None
+    return check_path(url, deadline.clamp_timeout(PATH_CHECK_TIMEOUT))
+
+
+def _check_many(urls, deadline, executor):
+    """在共享执行器中检查一个主机的多条路径，同时最多 HOST_PATH_CONCURRENCY 条"""
+    verdicts = {}
+    pending = iter(urls)
+    futures = {}
+    while True:
+        for url in pending:
+            futures[executor.submit(_check, url, deadline)] = url
+            if len(futures) >= HOST_PATH_CONCURRENCY:
+                break
+        if not futures:
+            return verdicts
+        done, _ = wait(futures, return_when=FIRST_COMPLETED)
+        for future in done:
+            verdicts[futures.pop(future)] = future.result()
+
+
+def verify_host_paths(urls, deadline=None, sample_size: int = PATH_SAMPLE_SIZE, executor=None):
+    """
+    抽样检查一个主机下的路径（主机TCP探测已通过）
+
+    Args:
+        urls: 该主机下去重后的URL列表
+        deadline: RunDeadline，临近时限时不再启动路径检查
+        sample_size: 抽样数
+        executor: 共享的路径检查执行器，None 时临时创建一个
+
+    Returns:
+        (failed, checked, escalated)：确认不可用的URL列表、实际检查的路径数、是否升级为逐条检查
+    """
+    if sample_size <= 0 or not urls:
+        return [], 0, False
+    if executor is None:
+        with ThreadPoolExecutor(max_workers=PATH_CHECK_WORKERS) as executor:
+            return verify_host_paths(urls, deadline, sample_size, executor)
+
+    # 1. 抽样
+    samples = sample_paths(urls, sample_size)
+    verdicts = _check_many(samples, deadline, executor)
+    escalated = any(ok is False for ok in verdicts.values())
+
+    # 2. 抽样有失败则逐条检查其余路径
+    if escalated:
+        rest = [url for url in urls if url not in verdicts]
+        verdicts.update(_check_many(rest, deadline, executor))
+
+    failed = [url for url in urls if verdicts.get(url) is False]
+    return failed, len(verdicts), escalated
@@ -0,0 +1,170 @@
+"""
+分阶段性能剖析
+设置环境变量 PROFILE=1（或 python TMP/cli.py --profile <任务>）后，各脚本用 @profiled("阶段") 标注的
+阶段（抓取、分区排除、去重、跨输出去重、连接探测、保存等）分别用 cProfile 统计，写出
+profile/<任务>/<阶段>.pstats；同时一个采样线程定期读取所有线程的调用栈（sys._current_frames），
+按 "阶段;线程;调用栈 次数" 的折叠格式写出 profile/<任务>/stacks.collapsed，
+可直接交给 flamegraph.pl 或 speedscope 生成火焰图。cProfile 只统计主线程，
+探测线程池、Selenium 等待等由采样结果体现。PROFILE=sample 只采样，不启用 cProfile。
+未启用时 @profiled 只多一次全局变量判断，不导入 cProfile，也不启动采样线程。
+"""
+
+import atexit
+import functools
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+# 输出目录（环境变量 PROFILE_DIR 可覆盖）
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profile")
+
+# 采样间隔（秒），环境变量 PROFILE_INTERVAL 可覆盖
+try:
+    SAMPLE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL") or 0.005)
+except ValueError:
+    SAMPLE_INTERVAL = 0.005
+
+# 线程池线程名去掉序号后合并，如 ThreadPoolExecutor-0_12 -> ThreadPoolExecutor-0
+THREAD_SUFFIX = re.compile(r'_\d+$')
+
+_session = None
+
+
+def enabled():
+    return os.environ.get("PROFILE", "").lower() not in ("", "0", "false", "no")
+
+
+class ProfileSession:
+    def __init__(self, task: str, use_cprofile: bool = True):
+        self.task = task
+        self.directory = os.path.join(PROFILE_DIR, task)
+        self.use_cprofile = use_cprofile
+        self.profiles = {}        # {阶段: cProfile.Profile}
+        self.timings = Counter()  # {阶段: 累计耗时}
+        self.calls = Counter()
+        self.stack = []           # 主线程当前所在的阶段
+        self.samples = Counter()  # {折叠调用栈: 次数}
+        self.main_ident = threading.main_thread().ident
+        self.running = True
+        self.sampler = threading.Thread(target=self._sample_loop, name="profiling-sampler", daemon=True)
+        self.sampler.start()
+
+    # ---------- 阶段 ----------
+
+    def enter(self, stage: str):
+        self.stack.append(stage)
+        if self.use_cprofile and len(self.stack) == 1:
+            profile = self.profiles.get(stage)
+            if profile is None:
+                import cProfile
+                profile = self.profiles[stage] = cProfile.Profile()
+            profile.enable()
+        return time.perf_counter()
+
+    def exit(self, stage: str, start: float):
+        if self.use_cprofile and len(self.stack) == 1:
+            self.profiles[stage].disable()
+        self.stack.pop()
+        # 嵌套阶段的耗时也计入外层阶段
+        self.timings[stage] += time.perf_counter() - start
+        self.calls[stage] += 1
+
+    # ---------- 采样 ----------
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while self.running:
+            time.sleep(SAMPLE_INTERVAL)
+            names = {thread.ident: THREAD_SUFFIX.sub("", thread.name) for thread in threading.enumerate()}
+            stage = self.stack[-1] if self.stack else "-"
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                frames.append(names.get(ident, str(ident)))
+                frames.append(stage)
+                self.samples[";".join(reversed(frames))] += 1
+
+    # ---------- 输出 ----------
+
+    def finish(self):
+        self.running = False
+        self.sampler.join()
+        os.makedirs(self.directory, exist_ok=True)
+        for stage, profile in self.profiles.items():
+            profile.dump_stats(os.path.join(self.directory, f"{stage}.pstats"))
+        with open(os.path.join(self.directory, "stacks.collapsed"), 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self.samples.items()):
+                f.write(f"{stack} {count}\n")
+        self.report()
+
+    def report(self):
+        stage_samples = Counter()
+        for stack, count in self.samples.items():
+            stage_samples[stack.split(";", 1)[0]] += count
+        print(f"\n性能剖析: {self.directory}/（{sum(self.samples.values())} 个采样，间隔 {SAMPLE_INTERVAL * 1000:.0f}ms）")
+        for stage, seconds in self.timings.most_common():
+            top = ""
+            if stage in self.profiles:
+                top = "  " + ", ".join(_top_functions(self.profiles[stage]))
+            print(f"  {stage:<16}{seconds * 1000:10.1f}ms  {self.calls[stage]:>4} 次  采样 {stage_samples[stage]:>6}{top}")
+
+
+def _top_functions(profile, count: int = 3):
+    """自身耗时最多的函数"""
+    import pstats
+    stats = pstats.Stats(profile).stats
+    ranked = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:count]
+    return [f"{name}({os.path.basename(filename)}:{line}) {tt * 1000:.0f}ms"
+            for (filename, line, name), (_, _, tt, _, _) in ranked]
+
+
+def start(task: str = None):
+    """开始剖析（未启用时不做任何事），task 默认取脚本名"""
+    global _session
+    if _session is not None or not enabled():
+        return _session
+    task = task or os.path.splitext(os.path.basename(sys.argv[0]))[0] or "python"
+    _session = ProfileSession(task, use_cprofile=os.environ.get("PROFILE", "").lower() != "sample")
+    atexit.register(finish)
+    return _session
+
+
+def finish():
+    """结束剖析并写出结果"""
+    global _session
+    session, _session = _session, None
+    if session is not None:
+        session.finish()
+
+
+def profiled(stage: str):
+    """把函数标注为一个剖析阶段；只统计主线程中的调用"""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            session = _session
+            if session is None:
+                if not _requested:
+                    return func(*args, **kwargs)
+                session = start()
+            if threading.get_ident() != session.main_ident:
+                return func(*args, **kwargs)
+            started = session.enter(stage)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                session.exit(stage, started)
+        return wrapper
+    return decorate
+
+
+# 直接运行脚本（不经 cli.py）时在第一个阶段开始剖析
+_requested = enabled()
@@ -0,0 +1,141 @@
+"""
+异步DNS解析与TTL缓存
+并发解析一批主机名（安装了 aiodns 时使用 c-ares 查询并沿用记录自带的TTL，
+否则用 asyncio 的 getaddrinfo），结果按TTL缓存到 .cache/dns_cache.json，跨运行复用。
+解析失败的主机名按较短的TTL做否定缓存。
+"""
+
+import asyncio
+import ipaddress
+import json
+import os
+import socket
+import time
+
+from profiling import profiled
+
+try:
+    import aiodns
+except ImportError:
+    aiodns = None
+
+# DNS缓存文件
+DNS_CACHE_FILE = os.path.join(".cache", "dns_cache.json")
+
+# 无法获得记录TTL时使用的缓存时间（秒）
+DEFAULT_TTL = 600
+
+# 解析失败的否定缓存时间（秒）
+NEGATIVE_TTL = 120
+
+# 单个主机名解析超时（秒）
+DNS_TIMEOUT = 5
+
+# 同时进行的解析数
+DNS_CONCURRENCY = 64
+
+
+def is_ip(host: str):
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+
+class DNSCache:
+    def __init__(self, path: str = DNS_CACHE_FILE):
+        self.path = path
+        self.entries = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        now = time.time()
+        self.entries = {host: e for host, e in self.entries.items() if e["expires"] > now}
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"  DNS缓存保存失败: {e}")
+
+    def get(self, host: str):
+        """返回 (是否命中, 地址)，地址为 None 表示否定缓存"""
+        entry = self.entries.get(host)
+        if entry and entry["expires"] > time.time():
+            return True, entry["addr"]
+        return False, None
+
+    def put(self, host: str, addr, ttl: float):
+        self.entries[host] = {"addr": addr, "expires": time.time() + ttl}
+
+
+async def _resolve_one(host, semaphore, dns_resolver):
+    async with semaphore:
+        if dns_resolver is not None:
+            try:
+                answers = await asyncio.wait_for(dns_resolver.query(host, 'A'), DNS_TIMEOUT)
+                if answers:
+                    return host, answers[0].host, max(int(answers[0].ttl), 1)
+            except Exception:
+                pass
+        try:
+            loop = asyncio.get_running_loop()
+            infos = await asyncio.wait_for(
+                loop.getaddrinfo(host, None, family=socket.AF_INET, type=socket.SOCK_STREAM),
+                DNS_TIMEOUT,
+            )
+            if infos:
+                return host, infos[0][4][0], DEFAULT_TTL
+        except Exception:
+            pass
+        return host, None, NEGATIVE_TTL
+
+
+async def _resolve_many(hosts):
+    semaphore = asyncio.Semaphore(DNS_CONCURRENCY)
+    dns_resolver = aiodns.DNSResolver(timeout=DNS_TIMEOUT) if aiodns is not None else None
+    return await asyncio.gather(*(_resolve_one(host, semaphore, dns_resolver) for host in hosts))
+
+
+@profiled("dns")
+def resolve_hosts(hosts, cache: DNSCache = None):
+    """
+    解析一批主机名
+
+    Returns:
+        (addresses, stats)：addresses 为 {主机: IPv4地址或None}，
+        stats 为 {"names": 主机名数, "cached": 缓存命中数, "seconds": 解析耗时}
+    """
+    addresses = {}
+    pending = []
+    cached = 0
+    for host in hosts:
+        if is_ip(host):
+            addresses[host] = host
+            continue
+        if cache is not None:
+            hit, addr = cache.get(host)
+            if hit:
+                addresses[host] = addr
+                cached += 1
+                continue
+        pending.append(host)
+
+    start = time.time()
+    if pending:
+        for host, addr, ttl in asyncio.run(_resolve_many(pending)):
+            addresses[host] = addr
+            if cache is not None:
+                cache.put(host, addr, ttl)
+    stats = {"names": cached + len(pending), "cached": cached, "seconds": time.time() - start}
+    return addresses, stats
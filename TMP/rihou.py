@@ -1,7 +1,17 @@
 import re
 import os
 import sys
-import requests
+import http_client
+from source_health import SourceHealth
+from run_deadline import RunDeadline, fetch_in_priority_order
+from url_index import claim_lines
+from line_filter import batch_engine, batch_filter
+import stage_cache
+from host_blocklist import build_blocklist
+from incremental_output import write_if_changed
+from shards import write_grouped_output
+from profiling import profiled
+from canonical import canonical_order
 
 # 全局排除关键词定义（用于分类排除）
 EXCLUDE_KEYWORDS = [
@@ -14,44 +24,53 @@ EXCLUDE_KEYWORDS = [
 CONTENT_FILTER_KEYWORDS = [
     "盗源", "DJ", "p3p", "shorturl", "更新", "group", 
     "颜人中", "打赏", "购买", "河南网", "阜阳", "野草", "少儿", 
-    "广东体育", "\\", "iill.top","凡人修仙传","woshinibaba","cfss.cc"
+    "广东体育", "\\","凡人修仙传","woshinibaba"
 ]
 
 
 class TVSourceProcessor:
     def __init__(self):
         self.all_lines = []
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-        })
+        self.source_lines = []  # 每个源的行，按拼接顺序，用于阶段缓存
+        self.blocklist = build_blocklist()
+        self.health = SourceHealth()
+        self.deadline = RunDeadline()
 
     def fetch_url_content(self, url: str):
-        """使用 requests 获取URL内容"""
+        """使用共享HTTP客户端获取URL内容"""
+        print(f"获取: {url}")
+        if not self.health.admit(url):
+            return []
         try:
-            print(f"获取: {url}")
-            response = self.session.get(url, timeout=30)
-            response.raise_for_status()
-            response.encoding = response.apparent_encoding
+            with self.health.guard(url):
+                response = http_client.fetch(url, timeout=self.deadline.clamp_timeout(self.health.timeout_for(url, 30)))
+                response.raise_for_status()
+                response.encoding = response.apparent_encoding
             
-            content = response.text
-            lines = [line.strip() for line in content.splitlines() if line.strip()]
+                content = response.text
+                lines = [line.strip() for line in content.splitlines() if line.strip()]
             print(f"  成功: {len(lines)} 行")
             return lines
         except Exception as e:
             print(f"  失败: {e}")
             return []
 
+    @profiled("fetch")
     def fetch_multiple_urls(self, urls: list):
         """获取多个URL内容"""
         self.all_lines = []
-        for url in urls:
-            lines = self.fetch_url_content(url)
-            if lines:
-                self.all_lines.extend(lines)
+        self.source_lines = []
+        for lines in fetch_in_priority_order(urls, self.fetch_url_content, self.health, self.deadline):
+            self.all_lines.extend(lines)
+            self.source_lines.append(lines)
+        self.health.save()
+        http_client.report()
+        if self.deadline.enabled:
+            print(self.deadline.describe())
         print(f"总计: {len(self.all_lines)} 行")
         return len(self.all_lines) > 0
 
+    @profiled("exclude")
     def remove_excluded_sections(self):
         """排除指定区域"""
         if not self.all_lines:
@@ -70,6 +89,7 @@ class TVSourceProcessor:
         print(f"排除后: {len(result)} 行")
         return result
 
+    @profiled("dedupe")
     def remove_genre_lines_and_deduplicate(self, lines: list):
         """删除genre行，按URL去重，并过滤内容关键词"""
         result = []
@@ -86,6 +106,9 @@ class TVSourceProcessor:
             if any(keyword.lower() in line_lower for keyword in CONTENT_FILTER_KEYWORDS):
                 filtered_count += 1
                 continue
+            if self.blocklist.blocks_line(line):
+                filtered_count += 1
+                continue
             
             url_match = re.search(r'(https?://[^\s,]+)', line)
             if url_match:
@@ -100,14 +123,14 @@ class TVSourceProcessor:
         print(f"去重后: {len(result)} 行")
         return result
 
+    @profiled("save")
     def save_to_file(self, lines: list, filename: str, first_line: str):
         """保存到文件"""
         try:
             content = [first_line] + lines
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write('\n'.join(content))
+            changed = write_if_changed(filename, '\n'.join(content))
             file_size = os.path.getsize(filename)
-            print(f"保存: {filename} ({len(content)}行, {file_size}字节)")
+            print(f"保存: {filename} ({len(content)}行, {file_size}字节{'' if changed else '，内容未变化，未重写'})")
             return True
         except Exception as e:
             print(f"保存失败: {e}")
@@ -127,17 +150,29 @@ class TVSourceProcessor:
             print("无内容可处理")
             return False
         
-        filtered = self.remove_excluded_sections()
-        if not filtered:
-            print("排除后无内容")
-            return False
+        # 未变化的源复用缓存的过滤结果；大输入使用列式或多进程批量过滤，结果与串行路径一致
+        if stage_cache.enabled():
+            final = stage_cache.filter_sources(self.source_lines, EXCLUDE_KEYWORDS, CONTENT_FILTER_KEYWORDS, blocklist=self.blocklist)
+        elif batch_engine(len(self.all_lines)):
+            final = batch_filter(self.all_lines, EXCLUDE_KEYWORDS, CONTENT_FILTER_KEYWORDS, blocklist=self.blocklist)
+        else:
+            filtered = self.remove_excluded_sections()
+            if not filtered:
+                print("排除后无内容")
+                return False
         
-        final = self.remove_genre_lines_and_deduplicate(filtered)
+            final = self.remove_genre_lines_and_deduplicate(filtered)
         if not final:
             print("去重后无内容")
             return False
         
+        final = claim_lines("rihou.txt", final)
+
+        # 规范顺序（启用时），上游调整行序不改变输出
+        final = canonical_order(final)
+
         if self.save_to_file(final, "rihou.txt", "rihou,#genre#"):
+            write_grouped_output("rihou.txt", self.all_lines, final, "rihou")
             print("处理完成")
             return True
         return False
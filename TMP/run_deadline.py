@@ -0,0 +1,97 @@
+"""
+运行总时限与按优先级调度
+通过环境变量 RUN_DEADLINE 设置本次运行的总时限（秒），未设置或为 0 时不限时。
+临近时限时先停止启动低优先级工作，再停止普通工作，为写出结果保留时间，
+保证定时任务总能在已知时间内产出部分但有效的输出文件。
+"""
+
+import os
+import time
+
+# 优先级（数值越小越优先）
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+# 剩余时间低于该值（秒）时不再启动对应优先级的工作
+PRIORITY_RESERVE = {
+    PRIORITY_NORMAL: 60,
+    PRIORITY_LOW: 180,
+}
+
+# 为保存结果预留的时间（秒），任何单个操作的超时都不会侵占这段时间
+FLUSH_RESERVE = 10
+
+
+class RunDeadline:
+    def __init__(self, seconds: float = None):
+        if seconds is None:
+            try:
+                seconds = float(os.environ.get("RUN_DEADLINE") or 0)
+            except ValueError:
+                seconds = 0
+        self.seconds = seconds
+        self.start = time.monotonic()
+
+    @property
+    def enabled(self):
+        return self.seconds > 0
+
+    def elapsed(self):
+        return time.monotonic() - self.start
+
+    def remaining(self):
+        """剩余时间（秒），不限时返回 inf"""
+        if not self.enabled:
+            return float("inf")
+        return self.seconds - self.elapsed()
+
+    def allows(self, priority: int = PRIORITY_NORMAL):
+        """剩余时间是否足够启动该优先级的工作"""
+        return self.remaining() > PRIORITY_RESERVE.get(priority, PRIORITY_RESERVE[PRIORITY_LOW])
+
+    def clamp_timeout(self, timeout: float):
+        """把单个操作的超时限制在时限之内（至少保留 1 秒）"""
+        if not self.enabled:
+            return timeout
+        return max(1.0, min(timeout, self.remaining() - FLUSH_RESERVE))
+
+    def describe(self):
+        if not self.enabled:
+            return "运行时限: 不限"
+        return f"运行时限: {self.seconds:.0f}s，已用 {self.elapsed():.0f}s，剩余 {max(0, self.remaining()):.0f}s"
+
+
+def schedule(items, priority_of):
+    """按优先级稳定排序，返回 (原始下标, 元素) 列表，同优先级保持原始顺序"""
+    return sorted(enumerate(items), key=lambda pair: priority_of(pair[1]))
+
+
+def source_priority(health, url: str):
+    """熔断中的源排到最后，其余源保持普通优先级"""
+    if health is not None and health.is_open(url):
+        return PRIORITY_LOW
+    return PRIORITY_NORMAL
+
+
+def fetch_in_priority_order(urls, fetch, health=None, deadline=None):
+    """
+    按优先级依次抓取各源（熔断中的源排在最后），临近运行时限时跳过剩余的源
+
+    Args:
+        urls: 源地址列表
+        fetch: url -> 结果，失败时返回空值
+        health: SourceHealth，决定优先级
+        deadline: RunDeadline，None 时不限时
+
+    Returns:
+        非空结果列表，按 urls 的原始顺序
+    """
+    results = {}
+    for index, url in schedule(urls, lambda u: source_priority(health, u)):
+        if deadline is not None and not deadline.allows(source_priority(health, url)):
+            print(f"跳过(临近运行时限): {url}")
+            continue
+        result = fetch(url)
+        if result:
+            results[index] = result
+    return [results[index] for index in sorted(results)]
@@ -0,0 +1,130 @@
+"""
+按分组拆分的输出
+设置环境变量 SHARD_OUTPUTS=1 后，各脚本在写出整体文件的同时，把频道按分组（M3U 的 group-title
+或 TXT 源的 #genre# 段）拆分到 shards/<输出名>/<分组>.txt，并写出 manifest.json，
+记录每个分片的分组名、文件名、频道数、sha256 和字节数。客户端先取清单，只下载需要的分组，
+也可以按 sha256 判断分片是否变化。内容未变的分片不重写，已不存在的分组的分片会被删除。
+"""
+
+import hashlib
+import json
+import os
+import re
+
+from incremental_output import write_if_changed
+from profiling import profiled
+
+# 分片根目录（相对仓库根目录）
+SHARD_ROOT = "shards"
+
+MANIFEST_NAME = "manifest.json"
+
+# 文件名中不允许出现的字符
+UNSAFE_CHARS = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+
+def enabled():
+    return os.environ.get("SHARD_OUTPUTS", "").lower() in ("1", "true", "yes")
+
+
+def shard_dir(output: str):
+    """输出文件对应的分片目录，如 TMP/s.txt -> shards/TMP_s"""
+    stem = os.path.splitext(output.replace("\\", "/"))[0]
+    return os.path.join(SHARD_ROOT, stem.replace("/", "_"))
+
+
+def shard_filename(group: str, used: set):
+    """分组名转为文件名，清理后重名的追加短哈希"""
+    name = UNSAFE_CHARS.sub("_", group).strip(" .") or "_"
+    if name.lower() in used:
+        name = f"{name}-{hashlib.sha1(group.encode('utf-8')).hexdigest()[:8]}"
+    used.add(name.lower())
+    return name + ".txt"
+
+
+def assign_groups(source_lines, final_lines, default_group: str):
+    """
+    按原始内容的 #genre# 段给最终行分组
+
+    Args:
+        source_lines: 抓取到的原始行（含 #genre# 行）
+        final_lines: 过滤、去重后的最终行（原始行的子序列）
+        default_group: 出现在任何 #genre# 行之前的行所属的分组
+
+    Returns:
+        [(分组名, [行])]，分组按在最终结果中首次出现的顺序排列
+    """
+    line_group = {}
+    group = default_group
+    for line in source_lines:
+        if "#genre#" in line:
+            group = line.split(",", 1)[0].strip() or default_group
+        else:
+            line_group.setdefault(line.strip(), group)
+    groups = {}
+    for line in final_lines:
+        groups.setdefault(line_group.get(line.strip(), default_group), []).append(line)
+    return list(groups.items())
+
+
+@profiled("shards")
+def write_shards(output: str, groups):
+    """
+    写出分片和清单，只重写内容变化的文件
+
+    Args:
+        output: 整体输出文件名
+        groups: [(分组名, [行])]
+
+    Returns:
+        (分片数, 重写的分片数, 删除的分片数)
+    """
+    directory = shard_dir(output)
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            previous = {shard["file"] for shard in json.load(f).get("shards", [])}
+    except (OSError, ValueError, AttributeError):
+        previous = set()
+
+    used = set()
+    shards = []
+    written = 0
+    for group, lines in groups:
+        if not lines:
+            continue
+        filename = shard_filename(group, used)
+        content = "\n".join([f"{group},#genre#"] + lines)
+        data = content.encode('utf-8')
+        written += write_if_changed(os.path.join(directory, filename), content)
+        shards.append({
+            "group": group,
+            "file": filename,
+            "count": len(lines),
+            "sha256": hashlib.sha256(data).hexdigest(),
+            "size": len(data),
+        })
+
+    removed = 0
+    for filename in previous - {shard["file"] for shard in shards}:
+        try:
+            os.remove(os.path.join(directory, filename))
+            removed += 1
+        except OSError:
+            pass
+
+    manifest = {
+        "output": output,
+        "count": sum(shard["count"] for shard in shards),
+        "shards": shards,
+    }
+    write_if_changed(manifest_path, json.dumps(manifest, ensure_ascii=False, indent=1) + "\n")
+    print(f"分片输出: {directory}/ 共 {len(shards)} 个分组，重写 {written} 个，删除 {removed} 个")
+    return len(shards), written, removed
+
+
+def write_grouped_output(output: str, source_lines, final_lines, default_group: str):
+    """启用分片输出时，按原始内容的 #genre# 段拆分最终行并写出"""
+    if not enabled():
+        return None
+    return write_shards(output, assign_groups(source_lines, final_lines, default_group))
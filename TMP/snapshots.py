@@ -0,0 +1,241 @@
+"""
+抓取内容的录制与回放
+SNAPSHOT_MODE=record 时，各脚本抓取到的源内容（http_client.fetch、my2 的 Cloudflare 抓取、
+ttest 的 Selenium <pre> 文本）按内容的 sha256 存入 snapshots/objects/（zlib 压缩，相同内容只存一份，
+跨运行共享），每次运行写一份清单 snapshots/runs/<时间>-<任务>.json，记录每个URL对应的内容摘要、
+状态码和校验头。
+SNAPSHOT_MODE=replay 时不访问网络，直接把录制的内容交给流水线；SNAPSHOT_RUN 指定回放哪一次运行
+（清单文件名或路径），未指定时每个URL取最近一次录制的内容。没有录制的URL按抓取失败处理。
+回放经 cli.py 运行时在 snapshots/replay/<任务>/ 中进行（每次清空重建，已提交的输出文件复制进去），
+输出文件和 .cache 状态（源健康、URL索引、延迟样本等）都写在那里，不改动仓库中的输出和真实运行的状态。
+只覆盖源抓取：zubo 的连接探测、jsontxt 的 HLS 探测仍会访问网络（可用 jsontxt --no-probe 关闭）。
+python TMP/snapshots.py list 列出录制的运行，python TMP/snapshots.py gc [--keep N] 只保留最近 N 次运行
+并删除不再被引用的内容。
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+import zlib
+
+# 快照根目录（环境变量 SNAPSHOT_DIR 可覆盖）；取绝对路径，回放切换工作目录后仍指向同一位置
+SNAPSHOT_DIR = os.path.abspath(os.environ.get("SNAPSHOT_DIR", "snapshots"))
+
+# 回放运行的工作目录
+REPLAY_DIR = os.path.join(SNAPSHOT_DIR, "replay")
+
+# 内容压缩级别（只在首次存入时压缩一次）
+COMPRESS_LEVEL = 9
+
+# 随内容一起保存的响应头
+KEPT_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+
+class SnapshotMissing(Exception):
+    """回放时没有该URL的录制内容"""
+
+
+def mode():
+    value = os.environ.get("SNAPSHOT_MODE", "").lower()
+    return value if value in ("record", "replay") else None
+
+
+def recording():
+    return mode() == "record"
+
+
+def replaying():
+    return mode() == "replay"
+
+
+def _write_atomic(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class SnapshotStore:
+    def __init__(self, root: str = SNAPSHOT_DIR):
+        self.root = root
+        self.objects = os.path.join(root, "objects")
+        self.runs = os.path.join(root, "runs")
+
+    def object_path(self, digest: str):
+        return os.path.join(self.objects, digest[:2], digest + ".z")
+
+    def put(self, data: bytes):
+        """存入内容，返回 (摘要, 是否新内容)"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.object_path(digest)
+        if os.path.exists(path):
+            return digest, False
+        _write_atomic(path, zlib.compress(data, COMPRESS_LEVEL))
+        return digest, True
+
+    def get(self, digest: str):
+        with open(self.object_path(digest), 'rb') as f:
+            return zlib.decompress(f.read())
+
+    def manifests(self):
+        """所有运行清单的路径，按时间从新到旧"""
+        try:
+            names = [name for name in os.listdir(self.runs) if name.endswith(".json")]
+        except OSError:
+            return []
+        return [os.path.join(self.runs, name) for name in sorted(names, reverse=True)]
+
+    def load_manifest(self, path: str):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+
+class Recorder:
+    def __init__(self, store: SnapshotStore, task: str):
+        self.store = store
+        now = time.time()
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(now)) + f"{now % 1:.3f}"[1:]
+        self.path = os.path.join(store.runs, f"{stamp}-{task}.json")
+        self.manifest = {"task": task, "started": time.time(), "entries": {}}
+        self.new_objects = 0
+
+    def record(self, url: str, data: bytes, status: int = 200, headers=None, kind: str = "http"):
+        digest, new = self.store.put(data)
+        self.new_objects += new
+        self.manifest["entries"][url] = {
+            "sha256": digest,
+            "size": len(data),
+            "status": status,
+            "headers": {key: value for key, value in (headers or {}).items() if key in KEPT_HEADERS and value},
+            "kind": kind,
+        }
+        _write_atomic(self.path, json.dumps(self.manifest, ensure_ascii=False, indent=1).encode('utf-8'))
+
+
+class Replayer:
+    def __init__(self, store: SnapshotStore, run: str = None):
+        self.store = store
+        self.entries = {}
+        if run:
+            path = run if os.path.exists(run) else os.path.join(store.runs, run)
+            self.entries = self.store.load_manifest(path).get("entries", {})
+        else:
+            # 从旧到新合并，同一URL取最近一次录制
+            for path in reversed(store.manifests()):
+                self.entries.update(self.store.load_manifest(path).get("entries", {}))
+
+    def lookup(self, url: str):
+        entry = self.entries.get(url)
+        if entry is None:
+            raise SnapshotMissing(f"没有录制的内容: {url}")
+        return self.store.get(entry["sha256"]), entry
+
+
+_recorder = None
+_replayer = None
+
+
+def _task_name():
+    # 经 cli.py 运行时 argv[0] 为 "cli.py <任务>"
+    return os.path.splitext(os.path.basename(sys.argv[0].split()[-1] if sys.argv[0] else "python"))[0]
+
+
+def record(url: str, data: bytes, status: int = 200, headers=None, kind: str = "http"):
+    """录制模式下保存一次抓取的内容"""
+    global _recorder
+    if not recording():
+        return
+    if _recorder is None:
+        _recorder = Recorder(SnapshotStore(), _task_name())
+    _recorder.record(url, data, status, headers, kind)
+
+
+def finish():
+    """结束本次运行的录制，同一进程中的下一个任务写新的清单"""
+    global _recorder
+    if _recorder is not None:
+        print(f"快照: {_recorder.path}（{len(_recorder.manifest['entries'])} 个源，新内容 {_recorder.new_objects} 份）")
+        _recorder = None
+
+
+def record_response(url: str, response, kind: str = "http"):
+    if recording():
+        record(url, response.content, response.status_code, response.headers, kind)
+
+
+def replay(url: str):
+    """回放模式下返回 (内容, 清单条目)，没有录制时抛出 SnapshotMissing"""
+    global _replayer
+    if _replayer is None:
+        _replayer = Replayer(SnapshotStore(), os.environ.get("SNAPSHOT_RUN"))
+    return _replayer.lookup(url)
+
+
+def replay_response(url: str):
+    """回放为 requests.Response，调用方按正常响应处理（状态码、编码检测、json 等）"""
+    from requests import Response
+    from requests.structures import CaseInsensitiveDict
+
+    data, entry = replay(url)
+    response = Response()
+    response._content = data
+    response.status_code = entry.get("status", 200)
+    response.headers = CaseInsensitiveDict(entry.get("headers", {}))
+    response.url = url
+    response.reason = "Replayed"
+    return response
+
+
+def list_runs(store: SnapshotStore):
+    for path in store.manifests():
+        manifest = store.load_manifest(path)
+        entries = manifest.get("entries", {})
+        size = sum(entry.get("size", 0) for entry in entries.values())
+        print(f"{os.path.basename(path):<40}{len(entries):>5} 个源  {size / 1e6:8.2f} MB")
+
+
+def gc(store: SnapshotStore, keep: int = None):
+    """删除超出保留数的运行清单，以及不再被任何清单引用的内容"""
+    manifests = store.manifests()
+    removed_runs = 0
+    if keep is not None:
+        for path in manifests[keep:]:
+            os.remove(path)
+            removed_runs += 1
+        manifests = manifests[:keep]
+    referenced = set()
+    for path in manifests:
+        referenced.update(entry["sha256"] for entry in store.load_manifest(path).get("entries", {}).values())
+    removed, freed = 0, 0
+    for directory, _, files in os.walk(store.objects):
+        for name in files:
+            if name.endswith(".z") and name[:-2] not in referenced:
+                path = os.path.join(directory, name)
+                freed += os.path.getsize(path)
+                os.remove(path)
+                removed += 1
+    print(f"清理: 删除 {removed_runs} 次运行，{removed} 份内容（{freed / 1e6:.2f} MB），保留 {len(referenced)} 份")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="抓取快照管理")
+    parser.add_argument("command", choices=["list", "gc"])
+    parser.add_argument("--keep", type=int, help="gc 时只保留最近 N 次运行")
+    args = parser.parse_args()
+    store = SnapshotStore()
+    if args.command == "list":
+        list_runs(store)
+    else:
+        gc(store, args.keep)
+
+
+if __name__ == "__main__":
+    main()
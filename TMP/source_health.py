@@ -0,0 +1,155 @@
+"""
+源健康状态跟踪与熔断器
+记录每个源的连续失败次数、最近成功时间和典型延迟，并持久化到 .cache/source_health.json，
+跨运行保留。连续失败达到阈值后熔断：退避期内直接跳过该源，退避到期后用缩短的超时探测一次，
+成功则恢复，失败则退避时间翻倍。回放快照时不记录（录制内容的有无与源是否健康无关）。
+"""
+
+import json
+import os
+import time
+from contextlib import contextmanager
+
+import snapshots
+
+# 健康状态持久化文件
+HEALTH_FILE = os.path.join(".cache", "source_health.json")
+
+# 连续失败多少次后熔断
+FAILURE_THRESHOLD = 3
+
+# 熔断后的首次退避时间（秒），之后每次失败翻倍
+BASE_BACKOFF = 4 * 3600
+
+# 最大退避时间（秒）
+MAX_BACKOFF = 3 * 24 * 3600
+
+# 熔断状态下探测使用的超时（秒）
+PROBE_TIMEOUT = 8
+
+# 延迟指数滑动平均系数
+LATENCY_ALPHA = 0.3
+
+
+class FetchAttempt:
+    """guard 中的一次抓取，fail() 把没有抛出异常的结果记为失败"""
+
+    def __init__(self):
+        self.failed = False
+
+    def fail(self):
+        self.failed = True
+
+
+class SourceHealth:
+    def __init__(self, path: str = HEALTH_FILE):
+        self.path = path
+        self.state = self._load()
+
+    def _load(self):
+        """读取持久化的健康状态，文件不存在或损坏时返回空状态"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        """原子写入健康状态"""
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.state, f, ensure_ascii=False, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"  健康状态保存失败: {e}")
+
+    def _entry(self, url: str):
+        return self.state.setdefault(url, {
+            "failures": 0,
+            "last_success": None,
+            "last_failure": None,
+            "latency": None,
+        })
+
+    def is_open(self, url: str):
+        """熔断器是否处于打开状态"""
+        entry = self.state.get(url)
+        return bool(entry) and entry["failures"] >= FAILURE_THRESHOLD
+
+    def backoff(self, url: str):
+        """当前退避时间（秒）"""
+        entry = self.state.get(url)
+        if not entry or entry["failures"] < FAILURE_THRESHOLD:
+            return 0
+        exponent = entry["failures"] - FAILURE_THRESHOLD
+        return min(BASE_BACKOFF * (2 ** min(exponent, 16)), MAX_BACKOFF)
+
+    def allow(self, url: str, now: float = None):
+        """是否允许请求该源：未熔断，或熔断退避已到期（半开探测）"""
+        if not self.is_open(url):
+            return True
+        now = time.time() if now is None else now
+        last_failure = self.state[url]["last_failure"] or 0
+        return now >= last_failure + self.backoff(url)
+
+    def admit(self, url: str):
+        """允许请求时返回 True；熔断中时输出跳过提示并返回 False"""
+        if self.allow(url):
+            return True
+        print(self.describe_skip(url))
+        return False
+
+    @contextmanager
+    def guard(self, url: str):
+        """
+        包住一次源抓取：代码块正常结束记为成功（耗时计入延迟），抛出异常记为失败后继续抛出；
+        块内调用 attempt.fail() 可把没有抛出异常的结果（拦截页、内容格式不符等）记为失败
+        """
+        attempt = FetchAttempt()
+        if snapshots.replaying():
+            yield attempt
+            return
+        start = time.time()
+        try:
+            yield attempt
+        except Exception:
+            self.record_failure(url)
+            raise
+        if attempt.failed:
+            self.record_failure(url)
+        else:
+            self.record_success(url, time.time() - start)
+
+    def timeout_for(self, url: str, default: float):
+        """熔断后的探测使用缩短的超时，其余情况使用默认超时"""
+        if self.is_open(url):
+            return min(default, PROBE_TIMEOUT)
+        return default
+
+    def record_success(self, url: str, latency: float):
+        entry = self._entry(url)
+        if entry["failures"] >= FAILURE_THRESHOLD:
+            print(f"  源已恢复: {url}")
+        entry["failures"] = 0
+        entry["last_success"] = time.time()
+        if entry["latency"] is None:
+            entry["latency"] = round(latency, 3)
+        else:
+            entry["latency"] = round(LATENCY_ALPHA * latency + (1 - LATENCY_ALPHA) * entry["latency"], 3)
+
+    def record_failure(self, url: str):
+        entry = self._entry(url)
+        entry["failures"] += 1
+        entry["last_failure"] = time.time()
+        if entry["failures"] == FAILURE_THRESHOLD:
+            print(f"  源连续失败 {FAILURE_THRESHOLD} 次，已熔断: {url}")
+
+    def describe_skip(self, url: str):
+        """生成跳过源时的提示信息"""
+        entry = self.state.get(url, {})
+        retry_at = (entry.get("last_failure") or 0) + self.backoff(url)
+        wait = max(0, int(retry_at - time.time()))
+        return f"  跳过(熔断中): 连续失败 {entry.get('failures', 0)} 次，{wait // 60} 分钟后再探测"
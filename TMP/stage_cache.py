@@ -0,0 +1,172 @@
+"""
+过滤阶段结果缓存
+分区排除、genre行删除、内容关键词过滤、主机黑名单和源内去重只取决于源的内容、关键词列表、
+黑名单、开始时的分区排除状态（上一个源末尾的分区会延续到下一个源开头）和过滤代码本身。
+按源缓存这些阶段的结果（.cache/stages/，键为以上各项的摘要），内容未变化的源直接取出缓存的
+(url, 行) 列表，只有变化的源或关键词、代码变化后才重新过滤；最后按源顺序跨源去重，
+输出与 filter_chunk 串行路径一致。需要重新过滤的大源仍按 batch_engine 使用列式或多进程引擎
+（按单个源的行数判断）。
+设置环境变量 STAGE_CACHE=0 可关闭。超过 STAGE_MAX_AGE 未被使用的缓存自动删除。
+"""
+
+import hashlib
+import json
+import os
+import time
+
+from line_filter import URL_PATTERN, batch_engine, filter_chunk, merge_entries, parallel_chunks
+from profiling import profiled
+
+# 缓存目录
+STAGE_CACHE_DIR = os.path.join(".cache", "stages")
+
+# 缓存项多久未被使用后删除（秒）
+STAGE_MAX_AGE = 7 * 24 * 3600
+
+# 参与代码版本摘要的文件：过滤逻辑或缓存格式变化后旧缓存自动失效
+VERSIONED_FILES = ("line_filter.py", "columnar_filter.py", "host_blocklist.py", "stage_cache.py")
+
+_code_version = None
+
+
+def enabled():
+    return os.environ.get("STAGE_CACHE", "1").lower() not in ("0", "false", "no")
+
+
+def code_version():
+    global _code_version
+    if _code_version is None:
+        digest = hashlib.sha256()
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for name in VERSIONED_FILES:
+            with open(os.path.join(directory, name), 'rb') as f:
+                digest.update(f.read())
+        _code_version = digest.hexdigest()[:16]
+    return _code_version
+
+
+def source_digest(lines):
+    return hashlib.blake2b("\n".join(lines).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def params_digest(exclude_keywords, content_keywords, blocklist=None):
+    """关键词列表、黑名单和代码版本的摘要"""
+    params = [list(exclude_keywords), list(content_keywords), blocklist.fingerprint() if blocklist is not None else None,
+              code_version()]
+    return hashlib.blake2b(json.dumps(params, ensure_ascii=False).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _excluded_after(lines, exclude_keywords, excluded: bool):
+    """源末尾的分区排除状态，源内没有 genre 行时沿用开始时的状态"""
+    for line in reversed(lines):
+        if "#genre#" in line:
+            return any(keyword in line for keyword in exclude_keywords)
+    return excluded
+
+
+class StageCache:
+    def __init__(self, root: str = STAGE_CACHE_DIR):
+        self.root = root
+
+    def _path(self, key: str):
+        return os.path.join(self.root, key + ".json")
+
+    def get(self, key: str):
+        """读取缓存项并刷新其使用时间，不存在或损坏时返回 None"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)
+            os.utime(path)
+            return value if isinstance(value, dict) else None
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key: str, value: dict):
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            path = self._path(key)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(value, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"  阶段缓存保存失败: {e}")
+
+    def prune(self, max_age: float = STAGE_MAX_AGE):
+        """删除长期未使用的缓存项"""
+        cutoff = time.time() - max_age
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.root, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+def filter_source(lines, exclude_keywords, content_keywords, excluded: bool = False, blocklist=None):
+    """过滤单个源，返回可缓存的结果；大源按 batch_engine 使用列式内核或多进程"""
+    engine = batch_engine(len(lines))
+    if engine == "columnar":
+        from columnar_filter import filter_lines
+        result, kept, filtered_count = filter_lines(lines, exclude_keywords, content_keywords, excluded, blocklist)
+        search = URL_PATTERN.search
+        entries = [((m.group(1) if m else None), line) for line, m in ((line, search(line)) for line in result)]
+    elif engine == "process":
+        # 块之间的重复URL在最后跨源去重时去掉
+        chunk_entries, kept, filtered_count = parallel_chunks(lines, exclude_keywords, content_keywords, excluded, blocklist)
+        entries = [entry for chunk in chunk_entries for entry in chunk]
+    else:
+        entries, kept, filtered_count = filter_chunk(lines, exclude_keywords, content_keywords, excluded, blocklist)
+    return {
+        "entries": entries,
+        "kept": kept,
+        "filtered": filtered_count,
+        "excluded_after": _excluded_after(lines, exclude_keywords, excluded),
+    }
+
+
+@profiled("stage_cache")
+def filter_sources(sources, exclude_keywords, content_keywords=None, blocklist=None, cache: StageCache = None):
+    """
+    按源过滤并复用未变化源的缓存结果，返回最终行列表（与对所有源拼接后的串行过滤一致）
+
+    Args:
+        sources: 每个源的行列表，按拼接顺序
+        exclude_keywords: 分区排除关键词
+        content_keywords: 内容过滤关键词
+        blocklist: HostBlocklist
+        cache: 缓存，默认 .cache/stages/
+    """
+    cache = cache or StageCache()
+    content_keywords = [keyword.lower() for keyword in (content_keywords or [])]
+    params = params_digest(exclude_keywords, content_keywords, blocklist)
+    excluded = False
+    chunk_entries = []
+    kept = filtered_count = hits = 0
+    for lines in sources:
+        key = f"{source_digest(lines)}-{params}-{int(excluded)}"
+        value = cache.get(key)
+        if value is None:
+            value = filter_source(lines, exclude_keywords, content_keywords, excluded, blocklist)
+            cache.put(key, value)
+        else:
+            hits += 1
+        chunk_entries.append(value["entries"])
+        kept += value["kept"]
+        filtered_count += value["filtered"]
+        excluded = value["excluded_after"]
+    cache.prune()
+
+    result = merge_entries(chunk_entries)
+    print(f"阶段缓存: {hits}/{len(sources)} 个源未变化，复用过滤结果")
+    print(f"排除后: {kept} 行")
+    if content_keywords or blocklist is not None:
+        print(f"内容过滤: {filtered_count} 行被过滤")
+    print(f"去重后: {len(result)} 行")
+    return result
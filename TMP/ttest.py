@@ -1,11 +1,17 @@
 import re
 import os
 import sys
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.by import By
+from source_health import SourceHealth
+from run_deadline import RunDeadline, fetch_in_priority_order
+from url_index import claim_lines
+from line_filter import batch_engine, batch_filter
+import stage_cache
+from host_blocklist import build_blocklist
+from incremental_output import write_if_changed
+from shards import write_grouped_output
+from profiling import profiled
+from canonical import canonical_order
+import snapshots
 
 # 全局排除关键词定义（用于分类排除）
 EXCLUDE_KEYWORDS = ["移动", "联通","私密","少儿","体育","记录","听书","老年","解说","监控","DJ","加入","(内)","韩剧","专用",
@@ -14,13 +20,26 @@ EXCLUDE_KEYWORDS = ["移动", "联通","私密","少儿","体育","记录","听
 
 # 新增：行内容过滤关键词（只要行中包含任意一个关键词，该行即被过滤）
 CONTENT_FILTER_KEYWORDS = ["ottiptv","盗源","DJ","P2p","shorturl","更新","group","颜人中","打赏","购买","河南网",
-                           "阜阳","野草","少儿","广东体育","\\","iill.top","111.56.90.5","47.92.252.72","合集",
-                           "rihou.cc","huya","douyu","iptv.852851.xyz","catvod"]  # 请根据实际需求修改
+                           "阜阳","野草","少儿","广东体育","\\","合集",
+                           "huya","douyu","catvod"]  # 请根据实际需求修改
+
+# 按URL主机屏蔽（域名同时屏蔽其子域名，IP 可写成 CIDR），在共用黑名单基础上追加
+BLOCKED_HOSTS = ["111.56.90.5", "47.92.252.72", "rihou.cc", "iptv.852851.xyz"]
 
 class TVSourceProcessor:
     def __init__(self):
         self.all_lines = []
-        # 配置 Chrome 无头模式
+        self.source_lines = []  # 每个源的行，按拼接顺序，用于阶段缓存
+        self.blocklist = build_blocklist(BLOCKED_HOSTS)
+        self.health = SourceHealth()
+        self.deadline = RunDeadline()
+        self.driver = None
+        # 回放快照时不启动浏览器
+        if snapshots.replaying():
+            return
+        # 配置 Chrome 无头模式（Selenium 在创建浏览器时才导入）
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
         chrome_options = Options()
         chrome_options.add_argument("--headless=new")
         chrome_options.add_argument("--disable-gpu")
@@ -32,36 +51,60 @@ class TVSourceProcessor:
 
     def fetch_url_content(self, url: str):
         """使用 Selenium 获取URL内容"""
+        print(f"获取: {url}")
+        if not self.health.admit(url):
+            return []
         try:
-            print(f"获取: {url}")
-            self.driver.get(url)
-            
-            # 等待页面加载完成
-            WebDriverWait(self.driver, 30).until(
-                EC.presence_of_element_located((By.TAG_NAME, "pre"))
-            )
-            
-            # 获取页面内容
-            content = self.driver.find_element(By.TAG_NAME, "pre").text
-            
-            # 清理并分割行
-            lines = [line.strip() for line in content.splitlines() if line.strip()]
+            with self.health.guard(url):
+                if snapshots.replaying():
+                    content = snapshots.replay(url)[0].decode('utf-8')
+                else:
+                    content = self._fetch_pre_text(url)
+                    snapshots.record(url, content.encode('utf-8'), kind="selenium")
+                
+                # 清理并分割行
+                lines = [line.strip() for line in content.splitlines() if line.strip()]
             print(f" 成功: {len(lines)} 行")
             return lines
         except Exception as e:
             print(f" 失败: {e}")
             return []
 
+    def _fetch_pre_text(self, url: str):
+        """打开页面并读取 <pre> 中的文本"""
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.common.by import By
+        self.driver.get(url)
+        
+        # 等待页面加载完成
+        WebDriverWait(self.driver, self.deadline.clamp_timeout(self.health.timeout_for(url, 30))).until(
+            EC.presence_of_element_located((By.TAG_NAME, "pre"))
+        )
+        
+        # 获取页面内容
+        return self.driver.find_element(By.TAG_NAME, "pre").text
+
+    def close_driver(self):
+        if self.driver is not None:
+            self.driver.quit()
+            self.driver = None
+
+    @profiled("fetch")
     def fetch_multiple_urls(self, urls: list):
         """获取多个URL内容"""
         self.all_lines = []
-        for url in urls:
-            lines = self.fetch_url_content(url)
-            if lines:
-                self.all_lines.extend(lines)
+        self.source_lines = []
+        for lines in fetch_in_priority_order(urls, self.fetch_url_content, self.health, self.deadline):
+            self.all_lines.extend(lines)
+            self.source_lines.append(lines)
+        self.health.save()
+        if self.deadline.enabled:
+            print(self.deadline.describe())
         print(f"总计: {len(self.all_lines)} 行")
         return len(self.all_lines) > 0
 
+    @profiled("exclude")
     def remove_excluded_sections(self):
         """排除指定区域"""
         if not self.all_lines:
@@ -80,6 +123,7 @@ class TVSourceProcessor:
         print(f"排除后: {len(result)} 行")
         return result
 
+    @profiled("dedupe")
     def remove_genre_lines_and_deduplicate(self, lines: list):
         """
         删除genre行，并按URL去重。
@@ -99,6 +143,9 @@ class TVSourceProcessor:
             if any(keyword.lower() in line_lower for keyword in CONTENT_FILTER_KEYWORDS):
                 filtered_count += 1
                 continue  # 过滤掉该行
+            if self.blocklist.blocks_line(line):
+                filtered_count += 1
+                continue
             
             # 提取URL去重
             url_match = re.search(r'(https?://[^\s,]+)', line)
@@ -113,14 +160,14 @@ class TVSourceProcessor:
         print(f"去重后: {len(result)} 行")
         return result
 
+    @profiled("save")
     def save_to_file(self, lines: list, filename: str, first_line: str):
         """保存到文件"""
         try:
             content = [first_line] + lines
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write('\n'.join(content))
+            changed = write_if_changed(filename, '\n'.join(content))
             file_size = os.path.getsize(filename)
-            print(f"保存: {filename} ({len(content)}行, {file_size}字节)")
+            print(f"保存: {filename} ({len(content)}行, {file_size}字节{'' if changed else '，内容未变化，未重写'})")
             return True
         except Exception as e:
             print(f"保存失败: {e}")
@@ -140,30 +187,43 @@ class TVSourceProcessor:
         # 1. 获取内容
         if not self.fetch_multiple_urls(urls):
             print("无内容可处理")
-            self.driver.quit()
+            self.close_driver()
             return False
         
-        # 2. 排除处理
-        filtered = self.remove_excluded_sections()
-        if not filtered:
-            print("排除后无内容")
-            self.driver.quit()
-            return False
+        # 未变化的源复用缓存的过滤结果；大输入使用列式或多进程批量过滤，结果与串行路径一致
+        if stage_cache.enabled():
+            final = stage_cache.filter_sources(self.source_lines, EXCLUDE_KEYWORDS, CONTENT_FILTER_KEYWORDS, blocklist=self.blocklist)
+        elif batch_engine(len(self.all_lines)):
+            final = batch_filter(self.all_lines, EXCLUDE_KEYWORDS, CONTENT_FILTER_KEYWORDS, blocklist=self.blocklist)
+        else:
+            # 2. 排除处理
+            filtered = self.remove_excluded_sections()
+            if not filtered:
+                print("排除后无内容")
+                self.close_driver()
+                return False
         
-        # 3. 去重及内容过滤处理
-        final = self.remove_genre_lines_and_deduplicate(filtered)
+            # 3. 去重及内容过滤处理
+            final = self.remove_genre_lines_and_deduplicate(filtered)
         if not final:
             print("去重后无内容")
-            self.driver.quit()
+            self.close_driver()
             return False
         
-        # 4. 保存文件
+        # 4. 跨输出去重
+        final = claim_lines("ttest.txt", final)
+        
+        # 5. 保存文件
+        # 规范顺序（启用时），上游调整行序不改变输出
+        final = canonical_order(final)
+
         if self.save_to_file(final, "ttest.txt", "test,#genre#"):
+            write_grouped_output("ttest.txt", self.all_lines, final, "test")
             print("处理完成")
-            self.driver.quit()
+            self.close_driver()
             return True
         else:
-            self.driver.quit()
+            self.close_driver()
             return False
 
 def main():
@@ -0,0 +1,202 @@
+"""
+udpxy 代理服务器选择
+zubo.txt 的地址都经 udpxy 代理（http://ip:端口/udp/组播地址:端口），同一组播地址常由多台服务器转发。
+udpxy 的 /status 页面给出当前活动客户端数（部分改版还给出上限，未给出时按 udpxy 默认的 3 个）。
+每台服务器只请求一次 /status（在后台并发进行，与 TCP 连接探测重叠；路径检查等状态页全部返回后才开始，
+快照中的客户端数不含本进程的检查连接）：客户端已满的服务器整体移除。
+这只是请求那一刻的快照，客户端随时进出；状态页没有给出上限时按默认值判断，日志中分开统计。
+未启用规范顺序时，同一组播地址的行再按空闲名额从多到少、状态页响应延迟从低到高排序，把更可能撑住播放的
+代理排在前面；启用规范顺序时不排序（瞬时状态不进入排序键，输出保持逐字节稳定）。
+状态页不可用（关闭了状态页、非 udpxy 服务器）的不移除，排在状态已知的之后。
+设置环境变量 UDPXY_STATUS=0 可关闭；回放快照时不访问网络，全部按状态未知处理。
+"""
+
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import http_client
+import snapshots
+from profiling import profiled
+from run_deadline import PRIORITY_NORMAL
+
+# udpxy 地址：服务器（协议+主机+端口）与组播地址
+UDPXY_URL = re.compile(r'(https?://[^/\s,]+)/(?:udp|rtp)/([^/\s,?#]+)', re.I)
+
+# 状态页请求超时（秒）
+STATUS_TIMEOUT = 3
+
+# 状态页最多读取的字节数（把 /status 当作流返回的服务器不会被一直读下去）
+STATUS_MAX_BYTES = 64 * 1024
+
+# 并发请求状态页的线程数
+STATUS_WORKERS = 32
+
+# 状态页延迟按该粒度（秒）分档参与排序，避免抖动让输出顺序每次变化
+LATENCY_BUCKET = 0.1
+
+# 状态页没有给出上限时的最大客户端数（udpxy -c 的默认值）
+DEFAULT_MAX_CLIENTS = 3
+
+ROW = re.compile(r'<tr[^>]*>(.*?)</tr>', re.I | re.S)
+
+CELL = re.compile(r'<t[hd][^>]*>(.*?)</t[hd]>', re.I | re.S)
+
+TAG = re.compile(r'<[^>]+>')
+
+COUNT = re.compile(r'^\s*(\d+)(?:\s*/\s*(\d+))?')
+
+
+def enabled():
+    return os.environ.get("UDPXY_STATUS", "1").lower() not in ("0", "false", "no")
+
+
+def server_of(line: str):
+    """行中 udpxy 地址的 (服务器, 组播地址)，不是 udpxy 地址时返回 (None, None)"""
+    m = UDPXY_URL.search(line)
+    if not m:
+        return None, None
+    return m.group(1).lower(), m.group(2)
+
+
+def parse_status(html: str):
+    """
+    解析状态页，返回 (活动客户端数, 最大客户端数或None)，不是 udpxy 状态页时返回 None
+
+    udpxy 的状态表为表头行 + 数据行，"Active clients" 列为活动客户端数；
+    改版可能有 "Max clients" 列，或写成 "活动数/上限"。
+    """
+    rows = [[TAG.sub("", cell).strip() for cell in CELL.findall(row)] for row in ROW.findall(html)]
+    clients = limit = None
+    for header, values in zip(rows, rows[1:]):
+        for title, value in zip(header, values):
+            title = title.lower()
+            m = COUNT.match(value)
+            if not m or "client" not in title:
+                continue
+            if "active" in title and clients is None:
+                clients = int(m.group(1))
+                if m.group(2):
+                    limit = int(m.group(2))
+            elif "max" in title and limit is None:
+                limit = int(m.group(1))
+    if clients is None:
+        return None
+    return clients, limit
+
+
+def fetch_status(server: str, timeout: float = STATUS_TIMEOUT):
+    """
+    请求一台服务器的 /status
+
+    Returns:
+        {"clients": 活动客户端数或None, "max": 状态页给出的最大客户端数或None, "seconds": 响应耗时或None}
+    """
+    status = {"clients": None, "max": None, "seconds": None}
+    start = time.time()
+    try:
+        with http_client.get_session().get(server + "/status", timeout=timeout, stream=True) as response:
+            status["seconds"] = time.time() - start
+            if response.status_code != 200:
+                return status
+            data = b""
+            for block in response.iter_content(8192):
+                data += block
+                if len(data) >= STATUS_MAX_BYTES or time.time() - start > timeout:
+                    break
+    except Exception:
+        return status
+    parsed = parse_status(data.decode("utf-8", errors="ignore"))
+    if parsed is not None:
+        status["clients"], status["max"] = parsed
+    return status
+
+
+def client_limit(status):
+    return status["max"] or DEFAULT_MAX_CLIENTS
+
+
+def saturated(status):
+    """状态页快照中客户端数已达上限（未给出上限时按 udpxy 默认值）"""
+    return status is not None and status["clients"] is not None and status["clients"] >= client_limit(status)
+
+
+def server_rank(status):
+    """排序值（越小越靠前）：状态已知的在前，空闲名额多的在前，状态页响应快的在前"""
+    if status is None:
+        return (1, 0, 0)
+    latency = int((status["seconds"] or 0.0) / LATENCY_BUCKET)
+    if status["clients"] is None:
+        return (1, 0, latency)
+    return (0, status["clients"] - client_limit(status), latency)
+
+
+def limit_rank(status):
+    """规范顺序用的排序值：只看客户端上限（越大越靠前），不含客户端数、延迟等瞬时值"""
+    if status is None or status["clients"] is None:
+        return -DEFAULT_MAX_CLIENTS
+    return -client_limit(status)
+
+
+class StatusCheck:
+    """在后台并发请求各服务器的状态页（每台一次），与连接探测同时进行"""
+
+    def __init__(self, lines: list, deadline=None):
+        self.servers = list(dict.fromkeys(server for server, _ in map(server_of, lines) if server is not None))
+        self.futures = {}
+        self.executor = None
+        self.start = time.time()
+        if not enabled() or not self.servers or snapshots.replaying():
+            return
+        if deadline is not None and not deadline.allows(PRIORITY_NORMAL):
+            print("udpxy 状态: 临近运行时限，跳过")
+            return
+        timeout = deadline.clamp_timeout(STATUS_TIMEOUT) if deadline is not None else STATUS_TIMEOUT
+        self.executor = ThreadPoolExecutor(max_workers=min(STATUS_WORKERS, len(self.servers)))
+        self.futures = {server: self.executor.submit(fetch_status, server, timeout) for server in self.servers}
+
+    def wait(self):
+        """等待所有状态页请求完成；向这些服务器发起路径检查前调用"""
+        if self.futures:
+            wait(self.futures.values())
+
+    @profiled("udpxy")
+    def select(self, lines: list):
+        """
+        等待状态页结果，移除客户端已满的服务器上的行
+
+        Returns:
+            (保留的行, rank, stable_rank)：rank 为 line -> 排序值，供同一组播地址的行排序使用；
+            stable_rank 只取客户端上限，供规范顺序使用
+        """
+        if self.executor is None:
+            return lines, lambda line: (1, 0, 0), lambda line: -DEFAULT_MAX_CLIENTS
+        statuses = {server: future.result() for server, future in self.futures.items()}
+        self.executor.shutdown()
+        full = {server for server, status in statuses.items() if saturated(status)}
+        result = [line for line in lines if server_of(line)[0] not in full]
+        known = sum(1 for status in statuses.values() if status["clients"] is not None)
+        assumed = sum(1 for server in full if statuses[server]["max"] is None)
+        print(f"udpxy 状态: {len(self.servers)} 台服务器，{known} 台有状态页，{len(full)} 台在本次快照中客户端已满"
+              f"（其中 {assumed} 台未给出上限，按默认 {DEFAULT_MAX_CLIENTS} 个判断；移除 {len(lines) - len(result)} 行），"
+              f"耗时 {time.time() - self.start:.2f}s")
+        ranks = {server: server_rank(status) for server, status in statuses.items()}
+        limits = {server: limit_rank(status) for server, status in statuses.items()}
+        return (result, lambda line: ranks.get(server_of(line)[0], (1, 0, 0)),
+                lambda line: limits.get(server_of(line)[0], -DEFAULT_MAX_CLIENTS))
+
+
+def rank_within_groups(lines: list, rank):
+    """同一组播地址的行按 rank 排序，各行占用的位置不变，其余行不动"""
+    positions = {}
+    for i, line in enumerate(lines):
+        _, group = server_of(line)
+        if group is not None:
+            positions.setdefault(group, []).append(i)
+    result = list(lines)
+    for indexes in positions.values():
+        if len(indexes) > 1:
+            for i, line in zip(indexes, sorted((lines[i] for i in indexes), key=rank)):
+                result[i] = line
+    return result
@@ -0,0 +1,146 @@
+"""
+跨输出文件的URL索引
+所有流水线共用一个 SQLite 索引（.cache/url_index.sqlite），以URL哈希为主键，
+记录每个URL出现在哪些输出文件中。同一URL只保留在优先级最高的输出里，
+低优先级的流水线写文件前会去掉已被高优先级输出占用的URL。
+索引按仓库中已提交的输出文件内容同步，文件未变化时跳过，因此在全新的运行环境中也能工作。
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+
+from profiling import profiled
+
+# 索引文件
+INDEX_FILE = os.path.join(".cache", "url_index.sqlite")
+
+# 输出文件优先级（数值越小越优先）
+# my.txt、my2.txt 为手工维护的列表，不参与认领：播放器常只加载单个文件，生成的输出不因其中已有的URL而缺频道
+OUTPUT_PRIORITY = {
+    "zubo.txt": 10,
+    "rihou.txt": 20,
+    "ttest.txt": 30,
+    "my1.txt": 40,
+    "smt.txt": 45,
+    "my3.txt": 50,
+    "jqcy.txt": 60,
+    "TMP/s.txt": 70,
+    "TMP/temp.txt": 80,
+    "TMP/jsontxt.txt": 90,
+}
+
+# 批量写入的批大小
+BATCH_SIZE = 5000
+
+URL_PATTERN = re.compile(r'((?:https?|rtp|rtsp|rtmp|udp)://[^\s,]+)')
+
+
+def url_hash(url: str):
+    """URL的64位哈希（有符号，直接作为 SQLite INTEGER 主键）"""
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+
+
+def extract_url(line: str):
+    m = URL_PATTERN.search(line)
+    return m.group(1) if m else None
+
+
+def _batches(items, size=BATCH_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class UrlIndex:
+    def __init__(self, path: str = INDEX_FILE):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS urls (
+                hash INTEGER NOT NULL,
+                output TEXT NOT NULL,
+                priority INTEGER NOT NULL,
+                PRIMARY KEY (hash, output)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS outputs (
+                output TEXT PRIMARY KEY,
+                signature TEXT
+            );
+            CREATE TEMP TABLE IF NOT EXISTS lookup (hash INTEGER PRIMARY KEY);
+        """)
+
+    def close(self):
+        self.conn.close()
+
+    def replace_output(self, output: str, urls, signature: str = None):
+        """用新的URL集合替换某个输出文件的索引记录（批量写入）"""
+        priority = OUTPUT_PRIORITY.get(output, 1000)
+        hashes = list({url_hash(url) for url in urls})
+        with self.conn:
+            self.conn.execute("DELETE FROM urls WHERE output = ?", (output,))
+            for batch in _batches(hashes):
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO urls (hash, output, priority) VALUES (?, ?, ?)",
+                    [(h, output, priority) for h in batch],
+                )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO outputs (output, signature) VALUES (?, ?)",
+                (output, signature),
+            )
+
+    def sync_outputs(self, skip: str = None):
+        """按磁盘上的输出文件内容同步索引，内容未变化的文件跳过"""
+        known = dict(self.conn.execute("SELECT output, signature FROM outputs"))
+        for output in OUTPUT_PRIORITY:
+            if output == skip or not os.path.exists(output):
+                continue
+            with open(output, 'rb') as f:
+                data = f.read()
+            signature = hashlib.sha1(data).hexdigest()
+            if known.get(output) == signature:
+                continue
+            text = data.decode('utf-8', errors='ignore')
+            urls = [url for url in map(extract_url, text.splitlines()) if url]
+            self.replace_output(output, urls, signature)
+
+    def claimed_by_higher(self, output: str, urls):
+        """返回已被更高优先级输出占用的URL哈希集合"""
+        priority = OUTPUT_PRIORITY.get(output, 1000)
+        hashes = list({url_hash(url) for url in urls})
+        with self.conn:
+            self.conn.execute("DELETE FROM lookup")
+            for batch in _batches(hashes):
+                self.conn.executemany("INSERT OR IGNORE INTO lookup (hash) VALUES (?)", [(h,) for h in batch])
+        rows = self.conn.execute(
+            "SELECT DISTINCT l.hash FROM lookup l JOIN urls u ON u.hash = l.hash WHERE u.priority < ?",
+            (priority,),
+        )
+        return {row[0] for row in rows}
+
+    def claim(self, output: str, lines: list):
+        """去掉已被更高优先级输出占用的行，并把剩余行的URL登记到该输出名下"""
+        self.sync_outputs(skip=output)
+        urls = [extract_url(line) for line in lines]
+        blocked = self.claimed_by_higher(output, [url for url in urls if url])
+        result = [line for line, url in zip(lines, urls) if url is None or url_hash(url) not in blocked]
+        self.replace_output(output, [url for url in map(extract_url, result) if url])
+        return result
+
+
+@profiled("claim")
+def claim_lines(output: str, lines: list):
+    """流水线写文件前调用：跨输出去重，索引不可用时原样返回"""
+    try:
+        index = UrlIndex()
+        try:
+            result = index.claim(output, lines)
+        finally:
+            index.close()
+    except sqlite3.Error as e:
+        print(f"跨输出去重跳过（索引不可用）: {e}")
+        return lines
+    print(f"跨输出去重: {len(lines) - len(result)} 行已在更高优先级的输出中")
+    return result
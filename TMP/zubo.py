@@ -3,8 +3,27 @@ import re
 import os
 import sys
 import socket
-import requests
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
+import http_client
+from source_health import SourceHealth
+from run_deadline import RunDeadline, fetch_in_priority_order, PRIORITY_NORMAL
+from url_index import claim_lines
+from line_filter import batch_engine, batch_filter
+import stage_cache
+from host_blocklist import build_blocklist
+from resolver import DNSCache, resolve_hosts
+from concurrency import AIMDLimiter, classify_errno
+from host_timeouts import HostTimeouts
+from probe_planner import PATH_CHECK_WORKERS, verify_host_paths
+from incremental_output import OrderedLineWriter, ProbeCheckpoint, write_if_changed
+import liveness
+import udpxy
+from shards import write_grouped_output
+from profiling import profiled
+import canonical
+from canonical import canonical_order
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 # 全局排除关键词定义（用于分类排除）
 EXCLUDE_KEYWORDS = ["移动", "联通"]
@@ -12,47 +31,66 @@ EXCLUDE_KEYWORDS = ["移动", "联通"]
 # 行内容过滤关键词
 CONTENT_FILTER_KEYWORDS = ["CCTV", "CG", "卫视"]
 
-# 网络连接测试超时（秒）
+# 网络连接测试默认超时（秒），有足够历史样本的主机按其延迟分布使用更短的超时
 CONNECT_TIMEOUT = 3
 
-# 连接测试并发数
-MAX_WORKERS = 50
+# 提取行中的URL
+URL_PATTERN = re.compile(r'((?:https?|rtp|rtsp|rtmp)://[^\s,]+)')
+
+# 连接测试初始并发数（运行时按超时比例和本机资源余量自适应调整）
+INITIAL_WORKERS = 50
+
+# 因本机资源不足而失败的目标最多重新排队次数
+MAX_LOCAL_RETRIES = 3
 
 
 class TVSourceProcessor:
     def __init__(self):
         self.all_lines = []
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
+        self.source_lines = []  # 每个源的行，按拼接顺序，用于阶段缓存
+        self.blocklist = build_blocklist()
+        self.health = SourceHealth()
+        self.deadline = RunDeadline()
         self.connect_cache = {}
+        self.dns_cache = DNSCache()
+        self.host_timeouts = HostTimeouts()
+        self.stream_files = None
+        self.status_check = None  # udpxy 状态页请求，路径检查开始前等待其完成
 
     def fetch_url_content(self, url: str):
-        """使用 requests 获取URL内容"""
+        """使用共享HTTP客户端获取URL内容"""
+        print(f"获取: {url}")
+        if not self.health.admit(url):
+            return []
         try:
-            print(f"获取: {url}")
-            response = self.session.get(url, timeout=30)
-            response.raise_for_status()
-            response.encoding = response.apparent_encoding
-            content = response.text
-            lines = [line.strip() for line in content.splitlines() if line.strip()]
+            with self.health.guard(url):
+                response = http_client.fetch(url, timeout=self.deadline.clamp_timeout(self.health.timeout_for(url, 30)))
+                response.raise_for_status()
+                response.encoding = response.apparent_encoding
+                content = response.text
+                lines = [line.strip() for line in content.splitlines() if line.strip()]
             print(f"  成功: {len(lines)} 行")
             return lines
         except Exception as e:
             print(f"  失败: {e}")
             return []
 
+    @profiled("fetch")
     def fetch_multiple_urls(self, urls: list):
         """获取多个URL内容"""
         self.all_lines = []
-        for url in urls:
-            lines = self.fetch_url_content(url)
-            if lines:
-                self.all_lines.extend(lines)
+        self.source_lines = []
+        for lines in fetch_in_priority_order(urls, self.fetch_url_content, self.health, self.deadline):
+            self.all_lines.extend(lines)
+            self.source_lines.append(lines)
+        self.health.save()
+        http_client.report()
+        if self.deadline.enabled:
+            print(self.deadline.describe())
         print(f"总计: {len(self.all_lines)} 行")
         return len(self.all_lines) > 0
 
+    @profiled("exclude")
     def remove_excluded_sections(self):
         """排除指定区域"""
         if not self.all_lines:
@@ -71,6 +109,7 @@ class TVSourceProcessor:
         print(f"排除后: {len(result)} 行")
         return result
 
+    @profiled("dedupe")
     def remove_genre_lines_and_deduplicate(self, lines: list):
         """删除genre行，按URL去重，并过滤内容关键词"""
         result = []
@@ -85,6 +124,9 @@ class TVSourceProcessor:
             if any(keyword.lower() in line_lower for keyword in CONTENT_FILTER_KEYWORDS):
                 filtered_count += 1
                 continue
+            if self.blocklist.blocks_line(line):
+                filtered_count += 1
+                continue
             url_match = re.search(r'(https?://[^\s,]+)', line)
             if url_match:
                 url = url_match.group(1)
@@ -98,24 +140,47 @@ class TVSourceProcessor:
         return result
 
     def _test_single_connection(self, host: str, port: int):
-        """测试单个 ip:port 的TCP连通性"""
+        """测试单个 ip:port 的TCP连通性，返回 (key, 结果, 耗时)，结果为 ok/timeout/local/fail"""
         key = f"{host}:{port}"
+        start = time.time()
         try:
             sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(CONNECT_TIMEOUT)
-            result = sock.connect_ex((host, port))
-            sock.close()
-            return key, (result == 0)
+            try:
+                sock.settimeout(self.deadline.clamp_timeout(self.host_timeouts.timeout_for(key, CONNECT_TIMEOUT)))
+                outcome = classify_errno(sock.connect_ex((host, port)))
+            finally:
+                sock.close()
+        except socket.timeout:
+            outcome = "timeout"
+        except OSError as e:
+            outcome = classify_errno(e.errno) if e.errno else "fail"
         except Exception:
-            return key, False
-
-    def test_connections(self, lines: list):
-        """对所有行的ip:port进行连通性测试，相同ip:port只测一次"""
+            outcome = "fail"
+        return key, outcome, time.time() - start
+
+    def _probe_endpoint(self, host: str, port: int, urls: list, path_executor=None):
+        """分层探测一个目标：先TCP连接，连通后在共享的路径检查执行器中抽样检查其下的路径"""
+        key, outcome, elapsed = self._test_single_connection(host, port)
+        failed, checked, escalated = [], 0, False
+        if outcome == "ok":
+            if self.status_check is not None:
+                # 路径检查的 GET 会计入 udpxy 的客户端数，等状态页快照取完再发起
+                self.status_check.wait()
+            failed, checked, escalated = verify_host_paths(urls, self.deadline, executor=path_executor)
+        return key, outcome, elapsed, failed, checked, escalated
+
+    @profiled("probe")
+    def test_connections(self, lines: list, output: str = None, first_line: str = ""):
+        """
+        对所有行的 主机:端口 进行连通性测试，主机名先并发解析，解析到同一地址的只测一次。
+        指定 output 时，判定结果按原始顺序增量写入 <output>.part，并记录断点，
+        被终止的运行重启后不再重复探测已完成的目标。
+        """
         ip_port_map = {}
         line_to_ipport = {}
 
-        # 支持 http/rtp/rtsp/rtmp 中的 ip:port，以及裸 ip:port
-        pattern_url = re.compile(r'(?:https?|rtp|rtsp|rtmp)://(\d+\.\d+\.\d+\.\d+):(\d+)')
+        # 支持 http/rtp/rtsp/rtmp 中的 ip:port 与 主机名:port，以及裸 ip:port
+        pattern_url = re.compile(r'(?:https?|rtp|rtsp|rtmp)://([A-Za-z0-9](?:[A-Za-z0-9.-]*[A-Za-z0-9])?):(\d+)')
         pattern_raw = re.compile(r'(\d+\.\d+\.\d+\.\d+):(\d+)')
 
         for i, line in enumerate(lines):
@@ -123,65 +188,208 @@ class TVSourceProcessor:
             if not m:
                 m = pattern_raw.search(line)
             if m:
-                ip, port = m.group(1), int(m.group(2))
-                key = f"{ip}:{port}"
+                host, port = m.group(1).lower(), int(m.group(2))
+                key = f"{host}:{port}"
                 ip_port_map[key] = None
                 line_to_ipport[i] = key
 
         if not ip_port_map:
-            print("未发现任何IP:端口，跳过连接测试")
+            print("未发现任何主机:端口，跳过连接测试")
             return lines
 
-        unique_count = len(ip_port_map)
-        print(f"\n连接测试: 发现 {unique_count} 个唯一 ip:port，并发 {MAX_WORKERS}，超时 {CONNECT_TIMEOUT}s")
+        # 1. 并发解析主机名（带TTL缓存），解析失败的不探测，与因时限未测试的一样按未验证保留
+        addresses, dns_stats = resolve_hosts({key.rsplit(":", 1)[0] for key in ip_port_map}, self.dns_cache)
+        self.dns_cache.save()
+        if dns_stats["names"]:
+            print(f"\nDNS解析: {dns_stats['names']} 个主机名（缓存命中 {dns_stats['cached']}），耗时 {dns_stats['seconds']:.2f}s")
+
+        # 2. 解析到同一地址的 主机:端口 合并为一个探测目标，并收集每个目标下的路径
+        endpoint_to_probe = {}
+        for key in ip_port_map:
+            host, port = key.rsplit(":", 1)
+            addr = addresses.get(host)
+            if addr is not None:
+                endpoint_to_probe[key] = f"{addr}:{port}"
+
+        probe_map = {}
+        probe_lines = {}
+        probe_urls = {}
+        line_urls = {}
+        for i, key in line_to_ipport.items():
+            probe_key = endpoint_to_probe.get(key)
+            if probe_key is None:
+                continue
+            probe_map[probe_key] = None
+            probe_lines.setdefault(probe_key, []).append(i)
+            m = URL_PATTERN.search(lines[i])
+            if m:
+                line_urls[i] = m.group(1)
+                probe_urls.setdefault(probe_key, {})[m.group(1)] = None
+
+        unresolved = len(ip_port_map) - len(endpoint_to_probe)
+        unique_count = len(probe_map)
+        print(f"\n连接测试: 发现 {len(ip_port_map)} 个唯一 主机:端口，合并为 {unique_count} 个探测目标"
+              f"（{unresolved} 个无法解析，按未验证保留），初始并发 {INITIAL_WORKERS}，"
+              f"默认超时 {CONNECT_TIMEOUT}s（{self.host_timeouts.learned_count()} 个主机使用学习到的超时）")
+
+        # 3. 增量输出与断点
+        writer = None
+        checkpoint = None
+        failed_paths = set()
+        if output:
+            writer = OrderedLineWriter(output + ".part", first_line, lines)
+            checkpoint = ProbeCheckpoint(os.path.join(".cache", os.path.basename(output) + ".checkpoint.jsonl"))
+            self.stream_files = [writer, checkpoint]
+
+        def publish(probe_key, is_ok, failed):
+            probe_map[probe_key] = is_ok
+            failed_paths.update(failed)
+            if writer is not None:
+                for i in probe_lines[probe_key]:
+                    writer.decide(i, is_ok is not False and line_urls.get(i) not in failed_paths)
+
+        if writer is not None:
+            # 无需探测的行（无主机:端口或无法解析）立即判定为保留
+            writer.decide_many([i for i in range(len(lines)) if line_to_ipport.get(i) not in endpoint_to_probe], True)
+
+        resumed = 0
+        if checkpoint is not None:
+            for probe_key in probe_map:
+                if probe_key in checkpoint.results:
+                    is_ok, failed = checkpoint.results[probe_key]
+                    publish(probe_key, is_ok, failed)
+                    resumed += 1
+            if resumed:
+                print(f"断点恢复: {resumed} 个探测目标沿用上次未完成运行的结果")
+
+        # 常驻模式：状态稳定的端点在复用期内沿用上一轮的判定
+        liveness_cache = liveness.get_cache()
+        reused = 0
+        if liveness_cache is not None:
+            for probe_key in probe_map:
+                cached = liveness_cache.fresh(probe_key) if probe_map[probe_key] is None else None
+                if cached is not None:
+                    publish(probe_key, *cached)
+                    reused += 1
+            print(f"存活缓存: {reused} 个探测目标沿用上一轮判定，{liveness_cache.volatile_count()} 个端点为新端点或状态刚翻转，需每轮探测")
+        resumed += reused
+
+        # 按优先级调度：承载行数越多的目标越先测试；临近运行时限时停止启动新的测试
+        pending = iter(sorted((k for k in probe_map if probe_map[k] is None), key=lambda k: -len(probe_lines[k])))
 
         success_count = 0
         fail_count = 0
-        done_count = 0
-
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        done_count = resumed
+        deadline_hit = False
+        connect_start = time.time()
+        connect_latency = 0.0
+        paths_checked = 0
+        escalated_hosts = 0
+
+        # 在途探测数由 AIMD 控制器决定，天花板扣除路径检查的连接；本机资源不足导致的失败重新排队
+        limiter = AIMDLimiter(INITIAL_WORKERS, reserve=PATH_CHECK_WORKERS)
+        requeued = []
+        local_retries = Counter()
+
+        with ThreadPoolExecutor(max_workers=PATH_CHECK_WORKERS) as path_executor, \
+                ThreadPoolExecutor(max_workers=limiter.maximum) as executor:
             futures = {}
-            for key in ip_port_map:
-                parts = key.split(":")
-                host, port = parts[0], int(parts[1])
-                futures[executor.submit(self._test_single_connection, host, port)] = key
-
-            for future in as_completed(futures):
-                key, is_ok = future.result()
-                ip_port_map[key] = is_ok
-                done_count += 1
-                if is_ok:
-                    success_count += 1
-                else:
-                    fail_count += 1
-                if done_count % 50 == 0 or done_count == unique_count:
-                    print(f"  进度: {done_count}/{unique_count}  成功:{success_count}  失败:{fail_count}")
-
-        print(f"连接测试完成: 成功 {success_count}, 失败 {fail_count}")
-
-        # 过滤掉连接失败的行
+            while True:
+                while len(futures) < limiter.limit:
+                    if not self.deadline.allows(PRIORITY_NORMAL):
+                        deadline_hit = True
+                        break
+                    key = requeued.pop() if requeued else next(pending, None)
+                    if key is None:
+                        break
+                    host, port = key.rsplit(":", 1)
+                    futures[executor.submit(self._probe_endpoint, host, int(port), list(probe_urls.get(key, ())), path_executor)] = key
+                if not futures:
+                    break
+
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    del futures[future]
+                    key, outcome, elapsed, failed, checked, escalated = future.result()
+                    limiter.on_result(outcome)
+                    if outcome == "local":
+                        local_retries[key] += 1
+                        if local_retries[key] <= MAX_LOCAL_RETRIES:
+                            requeued.append(key)
+                            continue
+                    is_ok = outcome == "ok"
+                    done_count += 1
+                    paths_checked += checked
+                    escalated_hosts += escalated
+                    if is_ok:
+                        success_count += 1
+                        connect_latency += elapsed
+                        self.host_timeouts.record(key, elapsed)
+                    else:
+                        fail_count += 1
+                    # 本机资源持续不足时无法判断，按未验证处理
+                    verdict = None if outcome == "local" else is_ok
+                    publish(key, verdict, failed)
+                    if checkpoint is not None and verdict is not None:
+                        checkpoint.record(key, [verdict, failed])
+                    if liveness_cache is not None and verdict is not None:
+                        liveness_cache.record(key, verdict, failed)
+                    if done_count % 50 == 0 or done_count == unique_count:
+                        print(f"  进度: {done_count}/{unique_count}  成功:{success_count}  失败:{fail_count}")
+
+        self.host_timeouts.save()
+        average = connect_latency / success_count * 1000 if success_count else 0
+        print(f"连接测试完成: 成功 {success_count}, 失败 {fail_count}，"
+              f"耗时 {time.time() - connect_start:.2f}s（成功连接平均 {average:.0f}ms）")
+        print(f"路径检查: 检查 {paths_checked} 条，{escalated_hosts} 个主机抽样失败后逐条检查，{len(failed_paths)} 条不可用")
+        print(f"并发控制: 初始 {INITIAL_WORKERS}，峰值 {limiter.peak}，结束 {limiter.limit}，上限 {limiter.maximum}，"
+              f"本机资源错误重试 {sum(local_retries.values())} 次")
+        if deadline_hit and done_count < unique_count:
+            print(f"临近运行时限，{unique_count - done_count} 个探测目标未测试，相关行按未验证保留")
+            print(self.deadline.describe())
+
+        if writer is not None:
+            writer.close(keep_undecided=True)
+            checkpoint.close()
+
+        for key, probe_key in endpoint_to_probe.items():
+            ip_port_map[key] = probe_map[probe_key]
+
+        # 过滤掉连接失败和路径不可用的行
         result = []
         dropped = 0
+        path_dropped = 0
         for i, line in enumerate(lines):
             key = line_to_ipport.get(i)
             if key is None:
                 result.append(line)
-            elif ip_port_map.get(key, False):
-                result.append(line)
-            else:
+            elif ip_port_map.get(key) is False:
                 dropped += 1
+            elif line_urls.get(i) in failed_paths:
+                path_dropped += 1
+            else:
+                # 测试通过，或因运行时限、DNS解析失败未测试
+                result.append(line)
 
-        print(f"连通性过滤: {dropped} 行被移除，保留 {len(result)} 行")
+        print(f"连通性过滤: {dropped} 行被移除，路径检查移除 {path_dropped} 行，保留 {len(result)} 行")
         return result
 
+    def clear_stream_files(self):
+        """结果文件保存成功后删除增量中间文件和断点"""
+        writer, checkpoint = self.stream_files or (None, None)
+        if writer is not None:
+            writer.discard()
+            checkpoint.clear()
+        self.stream_files = None
+
+    @profiled("save")
     def save_to_file(self, lines: list, filename: str, first_line: str):
         """保存到文件"""
         try:
             content = [first_line] + lines
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write('\n'.join(content))
+            changed = write_if_changed(filename, '\n'.join(content))
             file_size = os.path.getsize(filename)
-            print(f"保存: {filename} ({len(content)}行, {file_size}字节)")
+            print(f"保存: {filename} ({len(content)}行, {file_size}字节{'' if changed else '，内容未变化，未重写'})")
             return True
         except Exception as e:
             print(f"保存失败: {e}")
@@ -202,23 +410,45 @@ class TVSourceProcessor:
             print("无内容可处理")
             return False
 
-        filtered = self.remove_excluded_sections()
-        if not filtered:
-            print("排除后无内容")
-            return False
-
-        final = self.remove_genre_lines_and_deduplicate(filtered)
+        # 未变化的源复用缓存的过滤结果；大输入使用列式或多进程批量过滤，结果与串行路径一致
+        if stage_cache.enabled():
+            final = stage_cache.filter_sources(self.source_lines, EXCLUDE_KEYWORDS, CONTENT_FILTER_KEYWORDS, blocklist=self.blocklist)
+        elif batch_engine(len(self.all_lines)):
+            final = batch_filter(self.all_lines, EXCLUDE_KEYWORDS, CONTENT_FILTER_KEYWORDS, blocklist=self.blocklist)
+        else:
+            filtered = self.remove_excluded_sections()
+            if not filtered:
+                print("排除后无内容")
+                return False
+
+            final = self.remove_genre_lines_and_deduplicate(filtered)
         if not final:
             print("去重后无内容")
             return False
 
-        final = self.test_connections(final)
+        # 跨输出去重只依赖URL，放在探测之前，已被更高优先级输出占用的行不再探测
+        final = claim_lines("zubo.txt", final)
+
+        # 探测的同时在后台请求各 udpxy 服务器的 /status，探测完成后移除客户端已满的服务器
+        self.status_check = udpxy.StatusCheck(final, self.deadline)
+
+        final = self.test_connections(final, "zubo.txt", "组播,#genre#")
+        final, server_rank, limit_rank = self.status_check.select(final)
 
         if not final:
             print("连通性过滤后无内容")
             return False
 
+        # 规范顺序（启用时），上游调整行序不改变输出，同名频道只按代理的客户端上限排序；
+        # 客户端数、延迟是瞬时值，只在未启用规范顺序时把同一组播地址的行按空闲名额、状态页延迟排序
+        if canonical.enabled():
+            final = canonical_order(final, rank=limit_rank)
+        else:
+            final = udpxy.rank_within_groups(final, server_rank)
+
         if self.save_to_file(final, "zubo.txt", "组播,#genre#"):
+            write_grouped_output("zubo.txt", self.all_lines, final, "组播")
+            self.clear_stream_files()
             print("处理完成")
             return True
         return False
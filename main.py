@@ -1,30 +1,49 @@
-import requests
 import re
 import os
 import sys  # 添加这行
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "TMP"))
+import http_client
+from source_health import SourceHealth
+from run_deadline import RunDeadline, fetch_in_priority_order
+from url_index import claim_lines
+from line_filter import batch_engine, batch_filter
+import stage_cache
+from host_blocklist import build_blocklist
+from incremental_output import write_if_changed
+from shards import write_grouped_output
+from profiling import profiled
+from canonical import canonical_order
+
 # 全局排除关键词定义
 EXCLUDE_KEYWORDS = ["成人", "激情", "虎牙", "体育", "熊猫", "提示","斗鱼"]
 
 class TVSourceProcessor:
     def __init__(self):
         self.all_lines = []
+        self.source_lines = []  # 每个源的行，按拼接顺序，用于阶段缓存
+        self.blocklist = build_blocklist()
+        self.health = SourceHealth()
+        self.deadline = RunDeadline()
     
     def fetch_url_content(self, url: str):
         """获取单个URL内容"""
+        print(f"获取: {url}")
+        if not self.health.admit(url):
+            return []
         try:
-            print(f"获取: {url}")
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
-            
-            # 处理编码
-            if response.encoding:
-                content = response.text
-            else:
-                content = response.content.decode('utf-8', errors='ignore')
-            
-            # 清理并分割行
-            lines = [line.strip() for line in content.splitlines() if line.strip()]
+            with self.health.guard(url):
+                response = http_client.fetch(url, timeout=self.deadline.clamp_timeout(self.health.timeout_for(url, 30)))
+                response.raise_for_status()
+                
+                # 处理编码
+                if response.encoding:
+                    content = response.text
+                else:
+                    content = response.content.decode('utf-8', errors='ignore')
+                
+                # 清理并分割行
+                lines = [line.strip() for line in content.splitlines() if line.strip()]
             print(f"  成功: {len(lines)} 行")
             return lines
             
@@ -32,17 +51,23 @@ class TVSourceProcessor:
             print(f"  失败: {e}")
             return []
     
+    @profiled("fetch")
     def fetch_multiple_urls(self, urls: list):
         """获取多个URL内容"""
         self.all_lines = []
-        for url in urls:
-            lines = self.fetch_url_content(url)
-            if lines:
-                self.all_lines.extend(lines)
+        self.source_lines = []
+        for lines in fetch_in_priority_order(urls, self.fetch_url_content, self.health, self.deadline):
+            self.all_lines.extend(lines)
+            self.source_lines.append(lines)
+        self.health.save()
+        http_client.report()
+        if self.deadline.enabled:
+            print(self.deadline.describe())
         
         print(f"总计: {len(self.all_lines)} 行")
         return len(self.all_lines) > 0
     
+    @profiled("exclude")
     def remove_excluded_sections(self):
         """排除指定区域"""
         if not self.all_lines:
@@ -64,16 +89,21 @@ class TVSourceProcessor:
         print(f"排除后: {len(result)} 行")
         return result
     
+    @profiled("dedupe")
     def remove_genre_lines_and_deduplicate(self, lines: list):
         """删除genre行并去重"""
         result = []
         seen_urls = set()
+        blocked_count = 0
         
         for line in lines:
             if "#genre#" in line:
                 continue
             if not line.strip():
                 continue
+            if self.blocklist.blocks_line(line):
+                blocked_count += 1
+                continue
             
             # 提取URL去重
             url_match = re.search(r'(https?://[^\s,]+)', line)
@@ -85,18 +115,19 @@ class TVSourceProcessor:
             else:
                 result.append(line)
         
+        if blocked_count:
+            print(f"主机屏蔽: {blocked_count} 行被过滤")
         print(f"去重后: {len(result)} 行")
         return result
     
+    @profiled("save")
     def save_to_file(self, lines: list, filename: str, first_line: str):
         """保存到文件"""
         try:
             content = [first_line] + lines
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write('\n'.join(content))
-            
+            changed = write_if_changed(filename, '\n'.join(content))
             file_size = os.path.getsize(filename)
-            print(f"保存: {filename} ({len(content)}行, {file_size}字节)")
+            print(f"保存: {filename} ({len(content)}行, {file_size}字节{'' if changed else '，内容未变化，未重写'})")
             
             return True
             
@@ -121,20 +152,33 @@ class TVSourceProcessor:
             print("无内容可处理")
             return False
         
-        # 2. 排除处理
-        filtered = self.remove_excluded_sections()
-        if not filtered:
-            print("排除后无内容")
-            return False
+        # 未变化的源复用缓存的过滤结果；大输入使用列式或多进程批量过滤，结果与串行路径一致
+        if stage_cache.enabled():
+            final = stage_cache.filter_sources(self.source_lines, EXCLUDE_KEYWORDS, [], blocklist=self.blocklist)
+        elif batch_engine(len(self.all_lines)):
+            final = batch_filter(self.all_lines, EXCLUDE_KEYWORDS, [], blocklist=self.blocklist)
+        else:
+            # 2. 排除处理
+            filtered = self.remove_excluded_sections()
+            if not filtered:
+                print("排除后无内容")
+                return False
         
-        # 3. 去重处理
-        final = self.remove_genre_lines_and_deduplicate(filtered)
+            # 3. 去重处理
+            final = self.remove_genre_lines_and_deduplicate(filtered)
         if not final:
             print("去重后无内容")
             return False
         
-        # 4. 保存文件
-        if self.save_to_file(final, "my1.txt", "smt,#genre#"):
+        # 4. 跨输出去重
+        final = claim_lines("smt.txt", final)
+        
+        # 5. 保存文件
+        # 规范顺序（启用时），上游调整行序不改变输出
+        final = canonical_order(final)
+
+        if self.save_to_file(final, "smt.txt", "smt,#genre#"):
+            write_grouped_output("smt.txt", self.all_lines, final, "smt")
             print("处理完成")
             return True
         else:
@@ -147,8 +191,8 @@ def main():
     success = processor.process()
     
     # 退出状态码
-    if success and os.path.exists("my1.txt"):
-        print(f"文件位置: {os.path.abspath('my1.txt')}")
+    if success and os.path.exists("smt.txt"):
+        print(f"文件位置: {os.path.abspath('smt.txt')}")
         sys.exit(0)
     else:
         print("处理失败")